@@ -0,0 +1,7 @@
+#-------------------------------------------------------------------------------
+# Name:        kananaskis
+# Purpose:     building blocks for the Kananaskis wildlife habitat pipeline
+#              (FinalProject.py). Geoprocessing goes through a backend so the
+#              stages can run on ArcGIS Pro (arcpy) or on a plain Python/NumPy
+#              install for testing on Linux.
+#-------------------------------------------------------------------------------
@@ -0,0 +1,11 @@
+#-------------------------------------------------------------------------------
+# Name:        __main__
+# Purpose:     python -m kananaskis runs the habitat pipeline (see pipeline.py)
+#              with the default project settings
+#-------------------------------------------------------------------------------
+import sys
+
+from .pipeline import main
+
+if __name__ == "__main__":
+    sys.exit(main())
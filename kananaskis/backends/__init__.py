@@ -0,0 +1,23 @@
+#-------------------------------------------------------------------------------
+# Name:        backends
+# Purpose:     pluggable geoprocessing backends. "arcgis" drives arcpy the same
+#              way FinalProject.py always has; "local" is a pure Python/NumPy
+#              stand-in so stages can be run and timed on Linux.
+#-------------------------------------------------------------------------------
+import importlib
+
+BACKENDS = {
+    "arcgis": ("kananaskis.backends.arcgis", "ArcGISBackend"),
+    "local": ("kananaskis.backends.local", "LocalBackend"),
+}
+
+
+def get_backend(name="arcgis", **options):
+    #backend modules are only imported when asked for, so the local backend
+    #never needs arcpy installed
+    try:
+        module_name, class_name = BACKENDS[name]
+    except KeyError:
+        raise ValueError(f"Unknown backend '{name}', expected one of {sorted(BACKENDS)}")
+    module = importlib.import_module(module_name)
+    return getattr(module, class_name)(**options)
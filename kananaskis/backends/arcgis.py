@@ -0,0 +1,424 @@
+#-------------------------------------------------------------------------------
+# Name:        arcgis
+# Purpose:     geoprocessing backend that hands everything to arcpy
+#-------------------------------------------------------------------------------
+import os
+
+import arcpy
+import numpy as np
+
+from .. import tables, terrain
+from ..lazy import TERRAIN_FACTORS
+from ..overlay import overlay_block, weight_matrix
+from ..zonal import ZonalAccumulator
+
+
+class ArcGISBackend:
+    name = "arcgis"
+    feature_ext = ".shp"
+    raster_ext = ".tif"
+    layer_ext = ".lyrx"
+
+    def __init__(self, scratch_workspace=None, spatial=True):
+        arcpy.env.overwriteOutput = True
+        if scratch_workspace:
+            #keep each worker's intermediate junk out of everyone else's way
+            arcpy.env.scratchWorkspace = scratch_workspace
+        #spatial=False leaves the extension to the caller (see pipeline.run)
+        if spatial:
+            arcpy.CheckOutExtension("Spatial")
+
+    def messages(self):
+        count = arcpy.GetMessageCount()
+        return [arcpy.GetMessage(0), arcpy.GetMessage(count - 1)]
+
+    def spatial_reference(self, epsg):
+        return arcpy.SpatialReference(epsg)
+
+    def exists(self, path):
+        return arcpy.Exists(path)
+
+    def delete(self, path):
+        arcpy.management.Delete(path)
+
+    def create_file_gdb(self, folder, name):
+        arcpy.management.CreateFileGDB(out_folder_path=folder, out_name=name)
+
+    def carry_dataset(self, in_dataset, out_dataset):
+        #one dataset into another gdb as it is (see publish.carry)
+        arcpy.management.Copy(in_dataset, out_dataset)
+
+    def list_feature_classes(self, workspace):
+        arcpy.env.workspace = workspace
+        return arcpy.ListFeatureClasses() or []
+
+    def list_rasters(self, workspace):
+        arcpy.env.workspace = workspace
+        return arcpy.ListRasters() or []
+
+    def list_tables(self, workspace):
+        arcpy.env.workspace = workspace
+        return arcpy.ListTables() or []
+
+    def rename(self, old, new):
+        #a rename inside the gdb only touches the catalog; cached handles from
+        #earlier tools would otherwise hold a lock on the raster
+        arcpy.ClearWorkspaceCache_management()
+        if arcpy.Exists(new):
+            arcpy.management.Delete(new)
+        arcpy.management.Rename(old, new)
+
+    def describe(self, path):
+        return arcpy.Describe(path)
+
+    def cell_count(self, raster):
+        raster = arcpy.Raster(raster)
+        return raster.width * raster.height
+
+    def project(self, in_fc, out_fc, epsg):
+        arcpy.management.Project(in_fc, out_fc, arcpy.SpatialReference(epsg))
+
+    def clip(self, in_fc, clip_fc, out_fc):
+        arcpy.analysis.Clip(in_fc, clip_fc, out_fc)
+
+    def project_clip(self, in_fc, clip_fc, out_fc, epsg):
+        #with an output coordinate system Clip projects as it writes, and the
+        #extent env skips features nowhere near the boundary before any work
+        extent = arcpy.Describe(clip_fc).extent
+        with arcpy.EnvManager(outputCoordinateSystem=arcpy.SpatialReference(epsg), extent=extent):
+            arcpy.analysis.PairwiseClip(in_fc, clip_fc, out_fc)
+
+    def copy_features(self, in_fc, out_fc):
+        arcpy.management.CopyFeatures(in_fc, out_fc)
+
+    def envelope(self, in_fcs, out_fc, epsg, margin=0.0):
+        sr = arcpy.SpatialReference(epsg)
+        extents = [arcpy.Describe(fc).extent.projectAs(sr) for fc in in_fcs]
+        x0, y0 = min(e.XMin for e in extents) - margin, min(e.YMin for e in extents) - margin
+        x1, y1 = max(e.XMax for e in extents) + margin, max(e.YMax for e in extents) + margin
+        ring = arcpy.Array([arcpy.Point(x0, y0), arcpy.Point(x1, y0), arcpy.Point(x1, y1), arcpy.Point(x0, y1)])
+        arcpy.management.CopyFeatures([arcpy.Polygon(ring, sr)], out_fc)
+
+    def move_features(self, in_fc, out_fc):
+        #a shapefile in scratch has to be converted into the gdb anyway
+        arcpy.management.CopyFeatures(in_fc, out_fc)
+
+    def project_raster(self, in_raster, out_raster, epsg):
+        arcpy.management.ProjectRaster(in_raster, out_raster, arcpy.SpatialReference(epsg))
+
+    def copy_raster(self, in_raster, out_raster):
+        arcpy.management.CopyRaster(in_raster, out_raster)
+
+    def extract_by_mask(self, in_raster, mask, out_raster):
+        arcpy.sa.ExtractByMask(in_raster, mask).save(out_raster)
+
+    def warp_to_boundary(self, in_raster, clip_fc, out_raster, epsg):
+        #ExtractByMask honours the output coordinate system and extent envs, so
+        #only the study area gets read, projected and masked, then saved once
+        extent = arcpy.Describe(clip_fc).extent
+        with arcpy.EnvManager(outputCoordinateSystem=arcpy.SpatialReference(epsg), extent=extent):
+            arcpy.sa.ExtractByMask(in_raster, clip_fc).save(out_raster)
+
+    def move_raster(self, in_raster, out_raster):
+        arcpy.management.CopyRaster(in_raster, out_raster)
+
+    def polygon_to_raster(self, in_fc, value_field, out_raster, cell_size):
+        arcpy.conversion.PolygonToRaster(
+            in_features=in_fc,
+            value_field=value_field,
+            out_rasterdataset=out_raster,
+            cell_assignment="MAXIMUM_COMBINED_AREA",
+            priority_field="",
+            cellsize=cell_size
+        )
+        arcpy.management.BuildRasterAttributeTable(out_raster, "OVERWRITE")
+
+    def landcover_to_raster(self, in_fc, value_field, remap, out_raster, cell_size, workers=1):
+        #the class raster only lives in memory on its way to Reclassify, so it
+        #skips the attribute table and the trip through the gdb
+        lc_raster = r"memory\LandcoverR"
+        with arcpy.EnvManager(parallelProcessingFactor=str(workers)):
+            arcpy.conversion.PolygonToRaster(
+                in_features=in_fc,
+                value_field=value_field,
+                out_rasterdataset=lc_raster,
+                cell_assignment="MAXIMUM_COMBINED_AREA",
+                priority_field="",
+                cellsize=cell_size
+            )
+            arcpy.sa.Reclassify(lc_raster, "Value", remap).save(out_raster)
+        arcpy.management.Delete(lc_raster)
+
+    def reclassify(self, in_raster, remap, out_raster):
+        arcpy.sa.Reclassify(in_raster, "Value", remap).save(out_raster)
+
+    def read_rows(self, fc, fields):
+        #like a SearchCursor, but SHAPE@ comes back as a GeoJSON-style dict
+        with arcpy.da.SearchCursor(fc, fields) as cursor:
+            for row in cursor:
+                yield tuple(value.__geo_interface__ if field == "SHAPE@" and value is not None else value
+                            for field, value in zip(fields, row))
+
+    def _null_values(self, table, fields):
+        #TableToNumPyArray needs a stand-in for nulls: NaN for doubles, "" for
+        #text, and the smallest int32 for integer fields
+        nulls = {}
+        for f in arcpy.ListFields(table):
+            if f.name in fields:
+                if f.type in ("Double", "Single"):
+                    nulls[f.name] = np.nan
+                elif f.type in ("String", "Date"):
+                    nulls[f.name] = ""
+                elif f.type in ("Integer", "SmallInteger", "BigInteger"):
+                    nulls[f.name] = -2147483648
+        return nulls
+
+    def feature_array(self, fc, fields):
+        return arcpy.da.FeatureClassToNumPyArray(fc, fields, null_value=self._null_values(fc, fields))
+
+    def read_array(self, table, fields=None):
+        if fields is None:
+            fields = [f.name for f in arcpy.ListFields(table) if f.type not in ("OID", "Geometry")]
+        return arcpy.da.TableToNumPyArray(table, fields, null_value=self._null_values(table, fields))
+
+    def write_array(self, table, array):
+        #(re)create a gdb table in one call; int64 columns that fit go in as
+        #LONG, since older arcpy can't take 64-bit integers
+        if arcpy.Exists(table):
+            arcpy.management.Delete(table)
+        dtype = [(name, np.int32 if array.dtype[name].kind == "i" and len(array) and
+                  np.iinfo(np.int32).min <= array[name].min() and array[name].max() <= np.iinfo(np.int32).max
+                  else array.dtype[name]) for name in array.dtype.names]
+        arcpy.da.NumPyArrayToTable(array.astype(dtype), table)
+
+    def write_table(self, table, fields, rows):
+        self.write_array(table, tables.from_rows(list(fields), rows))
+
+    def read_table(self, table):
+        #(fields, rows), for callers that want plain tuples
+        array = self.read_array(table)
+        return list(array.dtype.names), tables.to_rows(array)
+
+    def zonal_summary(self, zone_fc, zone_field, value_raster, class_raster, stats_table, area_table, cell_size,
+                      band_cells=4 * 1024 * 1024):
+        #ZonalStatisticsAsTable (ALL) + TabulateArea in one pass instead of two
+        #tools each scanning the zones: the zones (a numeric field) are
+        #rasterized once on the value raster's grid, then each row band of the
+        #zone, value and class rasters is read as NumPy and folded into one
+        #zonal.ZonalAccumulator; returns {class value: area} over all zones
+        zone_ids = sorted(row[0] for row in arcpy.da.SearchCursor(zone_fc, [zone_field]))
+        ids = np.asarray(zone_ids, dtype=np.float64)
+        with arcpy.EnvManager(snapRaster=value_raster, cellSize=cell_size):
+            arcpy.conversion.PolygonToRaster(zone_fc, zone_field, r"memory\zonal_zones", "CELL_CENTER",
+                                             cellsize=cell_size)
+            zones = arcpy.Raster(r"memory\zonal_zones")
+            scratch = [r"memory\zonal_zones"]
+            #float, so NoData (and cells past a raster's edge) can come back as NaN
+            rasters = [arcpy.sa.Float(zones)]
+            for raster in (value_raster, class_raster):
+                #read on the zones' cells, so they have to share their cell size
+                if abs(arcpy.Raster(raster).meanCellWidth - zones.meanCellWidth) > 1e-6:
+                    scratch.append(rf"memory\zonal_{len(rasters)}")
+                    raster = arcpy.management.Resample(raster, scratch[-1], cell_size, "NEAREST")
+                rasters.append(arcpy.sa.Float(raster))
+        cell, ncols, nrows = zones.meanCellWidth, zones.width, zones.height
+        acc = ZonalAccumulator(len(zone_ids))
+        rows = max(1, band_cells // ncols)
+        for r0 in range(0, nrows, rows):
+            n = min(rows, nrows - r0)
+            corner = arcpy.Point(zones.extent.XMin, zones.extent.YMax - (r0 + n) * cell)
+            z, values, classes = [arcpy.RasterToNumPyArray(r, corner, ncols, n, nodata_to_value=np.nan)
+                                  .astype(np.float64) for r in rasters]
+            labels = np.zeros(z.shape, dtype=np.int64)
+            inside = ~np.isnan(z)
+            labels[inside] = np.searchsorted(ids, z[inside]) + 1
+            acc.add_values(labels, values)
+            acc.add_classes(labels, classes)
+        for path in scratch:
+            arcpy.management.Delete(path)
+        cell_area = cell * cell
+        self.write_array(stats_table, acc.stats_table(zone_field, zone_ids, cell_area))
+        self.write_array(area_table, acc.area_table(zone_field, zone_ids, cell_area))
+        return acc.class_totals(cell_area)
+
+    def _terrain(self, dem, metric, size=3):
+        #the Spatial Analyst tool for each terrain.METRICS entry; TRI has no
+        #tool of its own, so it is expanded from two focal sums:
+        #sum((z_i - z)^2) = sum(z_i^2) - 2 z sum(z_i) + 9 z^2
+        dem = arcpy.Raster(dem)
+        if metric == "range":
+            return arcpy.sa.FocalStatistics(dem, arcpy.sa.NbrRectangle(size, size, "CELL"), "RANGE")
+        if metric == "slope":
+            return arcpy.sa.Slope(dem, "DEGREE")
+        if metric == "aspect":
+            return arcpy.sa.Aspect(dem)
+        if metric == "curvature":
+            return arcpy.sa.Curvature(dem)
+        if metric == "tri":
+            window = arcpy.sa.NbrRectangle(3, 3, "CELL")
+            s1 = arcpy.sa.FocalStatistics(dem, window, "SUM")
+            s2 = arcpy.sa.FocalStatistics(arcpy.sa.Square(dem), window, "SUM")
+            return arcpy.sa.SquareRoot(s2 - 2 * dem * s1 + 9 * arcpy.sa.Square(dem))
+        raise ValueError(f"Unknown terrain metric {metric!r}, expected one of {terrain.METRICS}")
+
+    def terrain_rasters(self, dem_raster, outputs, size=3, workers=1):
+        #outputs: {metric: out raster}
+        with arcpy.EnvManager(snapRaster=dem_raster, parallelProcessingFactor=str(workers)):
+            for metric, out_raster in outputs.items():
+                self._terrain(dem_raster, metric, size).save(out_raster)
+        return outputs
+
+    def rescale(self, in_raster, out_raster, function="TfLarge", from_scale=10, to_scale=1, focal_range=None):
+        #focal_range runs a FocalStatistics RANGE of that size first, kept in memory
+        raster = arcpy.Raster(in_raster)
+        if focal_range:
+            raster = arcpy.sa.FocalStatistics(raster, arcpy.sa.NbrRectangle(focal_range, focal_range, "CELL"), "RANGE")
+        arcpy.sa.RescaleByFunction(raster, function, from_scale, to_scale).save(out_raster)
+
+    def weighted_sum(self, factors, out_raster):
+        #factors: [(raster, weight), ...]
+        arcpy.sa.WeightedSum(arcpy.sa.WSTable([[r, "Value", w] for r, w in factors])).save(out_raster)
+
+    def weighted_overlay(self, factors, scenarios, outputs, band_cells=4 * 1024 * 1024):
+        #every scenario's WeightedSum from one read of each row band of the
+        #factors (see overlay.py) instead of a WeightedSum run per scenario.
+        #The surfaces are built up in NumPy and saved once each on the first
+        #factor's grid; factors is {factor: raster}, scenarios {scenario:
+        #{factor: weight}}, outputs {scenario: raster}
+        names = list(factors)
+        scenario_names, weights = weight_matrix(scenarios, names)
+        first = arcpy.Raster(factors[names[0]])
+        cell, ncols, nrows = first.meanCellWidth, first.width, first.height
+        xmin, ymax = first.extent.XMin, first.extent.YMax
+        with arcpy.EnvManager(snapRaster=first, extent=first.extent, cellSize=first):
+            #float, so NoData (and cells past a raster's edge) can come back as NaN
+            rasters = [arcpy.sa.Float(factors[n]) for n in names]
+        surfaces = np.full((len(scenario_names), nrows, ncols), np.nan, dtype=np.float32)
+        rows = max(1, band_cells // ncols)
+        for r0 in range(0, nrows, rows):
+            n = min(rows, nrows - r0)
+            corner = arcpy.Point(xmin, ymax - (r0 + n) * cell)
+            stack = np.stack([arcpy.RasterToNumPyArray(r, corner, ncols, n, nodata_to_value=np.nan).astype(np.float64)
+                              for r in rasters])
+            surfaces[:, r0:r0 + n] = overlay_block(weights, stack)
+        for name, surface in zip(scenario_names, surfaces):
+            arcpy.NumPyArrayToRaster(surface, arcpy.Point(xmin, ymax - nrows * cell), cell, cell).save(outputs[name])
+            arcpy.management.DefineProjection(outputs[name], first.spatialReference)
+
+    def habitat_model(self, workspace, landcover_remap, weights=None, names=None, keep=("LC_Reclass",)):
+        #the FinalProject.py model as one chain of in-memory rasters: only
+        #Combined_Rasters and the intermediates named in keep are saved.
+        #names (a publish.OutputManifest) gives the datasets their final names
+        name = lambda n: names(n) if names else n
+        extra = {m: w for m, w in (weights or {}).items() if m in TERRAIN_FACTORS}
+        weights = dict({"terrain": 1, "roads": 1, "landcover": 1, "hydro": 1, "trails": 1}, **(weights or {}))
+        dem = name("D_ab_dem")
+        with arcpy.EnvManager(workspace=workspace, snapRaster=os.path.join(workspace, dem)):
+            ruggedness = arcpy.sa.FocalStatistics(dem, arcpy.sa.NbrRectangle(3, 3, "CELL"), "RANGE")
+            steps = {
+                "Terrain_R": ruggedness,
+                "Terrain_Rescale": arcpy.sa.RescaleByFunction(ruggedness, "TfLarge", 10, 1),
+                "Roads_Rescale": arcpy.sa.RescaleByFunction(name("Distance_to_Roads"), "TfLarge", 10, 1),
+                "LC_Reclass": arcpy.sa.Reclassify(name("Landcover"), "Value", landcover_remap),
+                "Hydrology_Rescale": arcpy.sa.RescaleByFunction(name("Distance_to_Hydro"), "TfLarge", 10, 1),
+                "Trails_Rescale": arcpy.sa.RescaleByFunction(name("Distance_to_Trails"), "TfLarge", 10, 1),
+            }
+            factors = [(steps["Terrain_Rescale"], weights["terrain"]), (steps["Roads_Rescale"], weights["roads"]),
+                       (steps["LC_Reclass"], weights["landcover"]), (steps["Hydrology_Rescale"], weights["hydro"]),
+                       (steps["Trails_Rescale"], weights["trails"])]
+            for metric, weight in extra.items():
+                raw = TERRAIN_FACTORS[metric]
+                steps[raw] = self._terrain(dem, metric)
+                steps[f"{raw}_Rescale"] = arcpy.sa.RescaleByFunction(steps[raw], "TfLarge", 10, 1)
+                factors.append((steps[f"{raw}_Rescale"], weight))
+            for n in keep:
+                steps[n].save(name(n))
+            arcpy.sa.WeightedSum(arcpy.sa.WSTable([[r, "Value", w] for r, w in factors])).save(name("Combined_Rasters"))
+
+    def distance_rasters(self, workspace, sources, snap_raster, workers=1):
+        arcpy.env.workspace = workspace
+        arcpy.env.snapRaster = snap_raster
+        for out_raster, source in sources.items():
+            arcpy.sa.DistanceAccumulation(source).save(out_raster)
+
+    def optimal_region_connections(self, in_regions, out_fc, cost_raster, pyramid=(), buffer=3):
+        if not pyramid:
+            arcpy.sa.OptimalRegionConnections(in_regions, out_fc, in_cost_raster=cost_raster)
+            return
+        #coarse-to-fine: every coarse level is an Aggregate (MEAN) of the cost
+        #surface; the neighbour paths found there (every candidate pair, not
+        #just the network), buffered by `buffer` coarse cells and merged with
+        #the regions, mask the next finer level. Each level runs at its own
+        #cell size, or the cellSize the stages set (25 m) would resample the
+        #aggregate straight back to full resolution
+        cost = arcpy.Raster(cost_raster)
+        neighbours, previous_cell = None, None
+        for factor in sorted(set(pyramid), reverse=True) + [1]:
+            with arcpy.EnvManager(cellSize=cost.meanCellWidth * factor):
+                surface = cost if factor == 1 else arcpy.sa.Aggregate(cost, factor, "MEAN", "EXPAND", "DATA")
+                if neighbours:
+                    corridor = rf"memory\Corridor_{factor}"
+                    arcpy.analysis.PairwiseBuffer(neighbours, corridor, f"{buffer * previous_cell} Meters")
+                    mask = arcpy.management.Merge([corridor, in_regions], rf"memory\Mask_{factor}")
+                    surface = arcpy.sa.ExtractByMask(surface, mask)
+                if factor == 1:
+                    arcpy.sa.OptimalRegionConnections(in_regions, out_fc, in_cost_raster=surface)
+                else:
+                    neighbours = rf"memory\Neighbours_{factor}"
+                    arcpy.sa.OptimalRegionConnections(in_regions, rf"memory\Routes_{factor}",
+                                                      out_neighbor_paths=neighbours, in_cost_raster=surface)
+                    previous_cell = cost.meanCellWidth * factor
+
+    def scenario_routes(self, in_regions, surfaces, outputs):
+        #arcpy has no graph to carry between runs, so this is one
+        #OptimalRegionConnections per scenario
+        for name, raster in surfaces.items():
+            arcpy.sa.OptimalRegionConnections(in_regions, outputs[name], in_cost_raster=raster)
+
+    #--- map layouts ----------------------------------------------------------
+
+    def layer_definition(self, fc, out_file):
+        layer = arcpy.management.MakeFeatureLayer(fc, os.path.basename(fc))[0]
+        arcpy.management.SaveToLayerFile(layer, out_file)
+        arcpy.management.Delete(layer)
+
+    def render_layout(self, job, layers):
+        #one page from the template (opened fresh in this process, never
+        #saved over); layers is [(layer file, workspace it was made from)]
+        aprx = arcpy.mp.ArcGISProject(job.template)
+        m = aprx.listMaps(job.map_name)[0]
+        if job.base_raster:
+            m.addDataFromPath(os.path.join(job.gdb, job.base_raster))
+        for layer_file, source in layers:
+            for lyr in m.addLayer(arcpy.mp.LayerFile(layer_file)):
+                if os.path.normcase(source) != os.path.normcase(job.gdb):
+                    lyr.updateConnectionProperties(source, job.gdb)
+
+        lyt = aprx.listLayouts()[0]
+        for elem in lyt.listElements("TEXT_ELEMENT"):
+            if elem.name == "Map Title":
+                elem.text = job.title
+        for elem in lyt.listElements("LEGEND_ELEMENT"):
+            if elem.name == "Legend":
+                elem.title = job.legend_title
+                leg_cim = elem.getDefinition("V2")
+                leg_cim.titleSymbol.symbol.height = 30
+                leg_cim.titleSymbol.symbol.horizontalAlignment = "Center"
+                leg_cim.titleSymbol.symbol.fontStyleName = "Bold"
+                leg_cim.titleSymbol.symbol.symbol.symbolLayers[0].color.values = [255, 0, 0, 100]
+                for itm in leg_cim.items:
+                    itm.patchWidth = 50
+                elem.setDefinition(leg_cim)
+                #bottom-right of the 11 x 17 page
+                elem.elementPositionX = 0.8522
+                elem.elementPositionY = 4.3543
+
+        map_frame = lyt.listElements("MAPFRAME_ELEMENT")[0]
+        if job.extent_fc:
+            map_frame.camera.setExtent(arcpy.Describe(os.path.join(job.gdb, job.extent_fc)).extent)
+        map_frame.camera.scale = job.scale
+        lyt.exportToPDF(job.out_file)
+        if job.aprx_copy:
+            aprx.saveACopy(job.aprx_copy)
+        del aprx
+        return job.out_file
@@ -0,0 +1,665 @@
+#-------------------------------------------------------------------------------
+# Name:        local
+# Purpose:     pure Python/NumPy stand-in for the arcpy tools the pipeline
+#              uses. Feature classes are .geojson files and rasters are
+#              .npy + .json pairs (see features.py / grid.py); a "file gdb" is
+#              just a folder. Good enough to run and time the pipeline on
+#              Linux, not a replacement for ArcGIS cartography.
+#-------------------------------------------------------------------------------
+import math
+import os
+import shutil
+import json
+import struct
+import time
+import zlib
+from types import SimpleNamespace
+
+import numpy as np
+
+from .. import blocks, crs, geometry, kernels, lazy, overlay, rasterize, routing, tables, terrain, zonal
+from ..distance import _burn_lines, write_distance_rasters
+from ..features import FEATURE_EXT, feature, read_features, write_features
+from ..grid import (RASTER_EXT, Grid, default_nodata, delete_raster, read_meta, read_raster,
+                    valid_mask, write_raster)
+from ..kernels import parse_remap
+from ..store import RasterStore
+
+TABLE_EXT = ".npz"
+
+KNOWN_EXTS = (".shp", ".tif", ".img", FEATURE_EXT, RASTER_EXT, TABLE_EXT)
+
+PIXEL_TYPES = {"uint8": "U8", "uint16": "U16", "uint32": "U32", "int8": "S8", "int16": "S16",
+               "int32": "S32", "int64": "S64", "float32": "F32", "float64": "F64"}
+
+
+def strip_ext(path):
+    root, ext = os.path.splitext(path)
+    return root if ext.lower() in KNOWN_EXTS else path
+
+
+def feature_path(path):
+    return strip_ext(path) + FEATURE_EXT
+
+
+def raster_path(path):
+    return strip_ext(path) + RASTER_EXT
+
+
+def table_path(path):
+    return strip_ext(path) + TABLE_EXT
+
+
+def _footprint(grid, fn, n=64):
+    #the grid's outline, densified, pushed through a transformer
+    xmin, ymin, xmax, ymax = grid.extent
+    t = np.linspace(0, 1, n)
+    ex = np.concatenate([xmin + t * (xmax - xmin), np.full(n, xmax), xmax - t * (xmax - xmin), np.full(n, xmin)])
+    ey = np.concatenate([np.full(n, ymax), ymax - t * (ymax - ymin), np.full(n, ymin), ymin + t * (ymax - ymin)])
+    return fn(ex, ey)
+
+
+def _footprint_cell(grid, tx, ty):
+    #cell size that keeps the cell count when the footprint is regridded
+    footprint = abs(geometry.ring_area(np.column_stack([tx, ty]).tolist()))
+    return math.sqrt(footprint / (grid.nrows * grid.ncols))
+
+
+def _write_png(path, rgb):
+    #8-bit RGB, no filtering; enough for a preview without an imaging library
+    def chunk(tag, data):
+        return struct.pack(">I", len(data)) + tag + data + struct.pack(">I", zlib.crc32(tag + data))
+    rows = np.concatenate([np.zeros((rgb.shape[0], 1), dtype=np.uint8), rgb.reshape(rgb.shape[0], -1)], axis=1)
+    with open(path, "wb") as f:
+        f.write(b"\x89PNG\r\n\x1a\n")
+        f.write(chunk(b"IHDR", struct.pack(">IIBBBBB", rgb.shape[1], rgb.shape[0], 8, 2, 0, 0, 0)))
+        f.write(chunk(b"IDAT", zlib.compress(rows.tobytes(), 6)))
+        f.write(chunk(b"IEND", b""))
+
+
+class LocalBackend:
+    name = "local"
+    feature_ext = FEATURE_EXT
+    raster_ext = RASTER_EXT
+    layer_ext = ".json"
+
+    def __init__(self, scratch_workspace=None):
+        self.scratch_workspace = scratch_workspace
+        self._last = ("", 0.0)
+        #(cost raster path, mtime, grid) -> its weighted CostGraph, see optimal_region_connections
+        self._cost_graph = (None, None)
+
+    def _done(self, tool, start):
+        self._last = (tool, time.perf_counter() - start)
+
+    def messages(self):
+        tool, elapsed = self._last
+        return [f"Executing: {tool}", f"Succeeded ({elapsed:.2f} seconds)"]
+
+    def spatial_reference(self, epsg):
+        return crs.spatial_reference(epsg)
+
+    #--- workspace management -------------------------------------------------
+
+    def exists(self, path):
+        return os.path.isdir(path) or os.path.exists(feature_path(path)) \
+            or os.path.exists(strip_ext(path) + ".json") or os.path.exists(table_path(path))
+
+    def delete(self, path):
+        if os.path.isdir(path):
+            shutil.rmtree(path, ignore_errors=True)
+        elif os.path.exists(feature_path(path)):
+            os.remove(feature_path(path))
+        elif os.path.exists(table_path(path)):
+            os.remove(table_path(path))
+        else:
+            delete_raster(raster_path(path))
+
+    def create_file_gdb(self, folder, name):
+        os.makedirs(os.path.join(folder, name), exist_ok=True)
+
+    def carry_dataset(self, in_dataset, out_dataset):
+        #every file of the dataset (data, sidecar, overviews, packed tiles)
+        #hard-linked into the other gdb, so nothing is copied on the same disk.
+        #The links only share files with the gdb being replaced, which is
+        #deleted once the swap is done (see publish.publish)
+        start = time.perf_counter()
+        folder, name = os.path.split(in_dataset)
+        out_folder, out_name = os.path.split(out_dataset)
+        for f in os.listdir(folder):
+            stem, dot, rest = f.partition(".")
+            if stem != name or not dot:
+                continue
+            target = os.path.join(out_folder, out_name + dot + rest)
+            try:
+                os.link(os.path.join(folder, f), target)
+            except OSError:
+                shutil.copy2(os.path.join(folder, f), target)
+        self._done("Copy", start)
+
+    def list_feature_classes(self, workspace):
+        return sorted(f for f in os.listdir(workspace) if f.endswith(FEATURE_EXT))
+
+    def list_rasters(self, workspace):
+        return [name + RASTER_EXT for name in RasterStore(workspace).names()]
+
+    def list_tables(self, workspace):
+        return sorted(f for f in os.listdir(workspace) if f.endswith(TABLE_EXT))
+
+    def rename(self, old, new):
+        #rasters move with their overviews/tiles; all of it is file renames
+        start = time.perf_counter()
+        if self.exists(new):
+            self.delete(new)
+        if os.path.isdir(old):
+            os.replace(old, new)
+        elif os.path.exists(feature_path(old)):
+            os.replace(feature_path(old), feature_path(new))
+        elif os.path.exists(table_path(old)):
+            os.replace(table_path(old), table_path(new))
+        else:
+            store, name = RasterStore.of(strip_ext(old))
+            store.move(name, *RasterStore.of(strip_ext(new)))
+        self._done("Rename", start)
+
+    def cell_count(self, raster):
+        grid = read_meta(raster_path(raster))["grid"]
+        return grid["nrows"] * grid["ncols"]
+
+    def describe(self, path):
+        if os.path.exists(feature_path(path)):
+            feats, epsg = read_features(feature_path(path))
+            geoms = [f["geometry"] for f in feats if f.get("geometry")]
+            return SimpleNamespace(
+                datasetType="FeatureClass",
+                shapeType=geometry.shape_type(geoms[0]) if geoms else "Null",
+                spatialReference=crs.spatial_reference(epsg),
+                extent=geometry.union_bounds(geometry.bounds(g) for g in geoms),
+                featureCount=len(feats),
+            )
+        data, grid, nodata = read_raster(raster_path(path))
+        return SimpleNamespace(
+            datasetType="RasterDataset",
+            format="NPY",
+            pixelType=PIXEL_TYPES.get(data.dtype.name, data.dtype.name),
+            spatialReference=crs.spatial_reference(grid.epsg),
+            meanCellWidth=grid.cell,
+            meanCellHeight=grid.cell,
+            extent=grid.extent,
+            height=grid.nrows,
+            width=grid.ncols,
+            noDataValue=nodata,
+        )
+
+    #--- vector tools ---------------------------------------------------------
+
+    def project(self, in_fc, out_fc, epsg):
+        start = time.perf_counter()
+        feats, src_epsg = read_features(feature_path(in_fc))
+        fn = crs.transformer(src_epsg, epsg)
+        out = [dict(f, geometry=geometry.transform(f["geometry"], fn)) if f.get("geometry") else f
+               for f in feats]
+        write_features(feature_path(out_fc), out, epsg)
+        self._done("Project", start)
+
+    def load_boundary(self, clip_fc, epsg):
+        #dissolve the clip features into one prepared Boundary in `epsg`
+        feats, src_epsg = read_features(feature_path(clip_fc))
+        fn = crs.transformer(src_epsg, epsg)
+        polys = []
+        for f in feats:
+            if f.get("geometry"):
+                polys.extend(geometry.polygons(geometry.transform(f["geometry"], fn)))
+        return geometry.Boundary({"type": "MultiPolygon", "coordinates": polys})
+
+    def clip(self, in_fc, clip_fc, out_fc):
+        start = time.perf_counter()
+        feats, epsg = read_features(feature_path(in_fc))
+        boundary = self.load_boundary(clip_fc, epsg)
+        out = []
+        for f in feats:
+            clipped = boundary.clip(f.get("geometry"))
+            if clipped is not None:
+                out.append(dict(f, geometry=clipped))
+        write_features(feature_path(out_fc), out, epsg)
+        self._done("Clip", start)
+
+    def project_clip(self, in_fc, clip_fc, out_fc, epsg):
+        #Project + Clip in one pass. The boundary's bbox is taken into the
+        #source system first, so features nowhere near it are dropped before
+        #anything gets reprojected, and only the survivors are written
+        start = time.perf_counter()
+        feats, src_epsg = read_features(feature_path(in_fc))
+        boundary = self.load_boundary(clip_fc, epsg)
+        window = crs.transform_bounds(boundary.bounds, epsg, src_epsg)
+        fn = crs.transformer(src_epsg, epsg)
+        out = []
+        for f in feats:
+            geom = f.get("geometry")
+            box = geometry.bounds(geom) if geom else None
+            if box is None or not geometry.bbox_intersects(box, window):
+                continue
+            clipped = boundary.clip(geometry.transform(geom, fn))
+            if clipped is not None:
+                out.append(dict(f, geometry=clipped))
+        write_features(feature_path(out_fc), out, epsg)
+        self._done("ProjectClip", start)
+
+    def envelope(self, in_fcs, out_fc, epsg, margin=0.0):
+        #one rectangle in `epsg` around every input, grown by margin: the clip
+        #boundary for work shared by several study areas
+        start = time.perf_counter()
+        boxes = []
+        for fc in in_fcs:
+            feats, src_epsg = read_features(feature_path(fc))
+            box = geometry.union_bounds(geometry.bounds(f["geometry"]) for f in feats if f.get("geometry"))
+            if box is not None:
+                boxes.append(crs.transform_bounds(box, src_epsg, epsg))
+        x0, y0, x1, y1 = geometry.union_bounds(boxes)
+        x0, y0, x1, y1 = x0 - margin, y0 - margin, x1 + margin, y1 + margin
+        ring = [[x0, y0], [x1, y0], [x1, y1], [x0, y1], [x0, y0]]
+        write_features(feature_path(out_fc), [feature({"type": "Polygon", "coordinates": [ring]}, OBJECTID=1)], epsg)
+        self._done("Envelope", start)
+
+    def move_features(self, in_fc, out_fc):
+        #same disk, so this is a rename rather than another full write
+        start = time.perf_counter()
+        os.replace(feature_path(in_fc), feature_path(out_fc))
+        self._done("MoveFeatures", start)
+
+    def copy_features(self, in_fc, out_fc):
+        start = time.perf_counter()
+        shutil.copyfile(feature_path(in_fc), feature_path(out_fc))
+        self._done("CopyFeatures", start)
+
+    def read_rows(self, fc, fields):
+        #SearchCursor stand-in; SHAPE@ is the GeoJSON geometry
+        feats, _ = read_features(feature_path(fc))
+        for oid, f in enumerate(feats, start=1):
+            geom = f.get("geometry")
+            row = []
+            for field in fields:
+                if field == "SHAPE@":
+                    row.append(geom)
+                elif field == "SHAPE@LENGTH":
+                    row.append(geometry.length(geom) if geom else 0.0)
+                elif field == "SHAPE@AREA":
+                    row.append(geometry.area(geom) if geom else 0.0)
+                elif field in ("OID@", "OBJECTID"):
+                    row.append(f["properties"].get("OBJECTID", oid))
+                else:
+                    row.append(f["properties"].get(field))
+            yield tuple(row)
+
+    def feature_array(self, fc, fields):
+        #FeatureClassToNumPyArray stand-in: attributes plus SHAPE@LENGTH /
+        #SHAPE@AREA / OID@ as columns (geometry objects don't fit in an array)
+        if "SHAPE@" in fields:
+            raise ValueError("SHAPE@ can't go into an array; read it with read_rows")
+        return tables.from_rows(list(fields), list(self.read_rows(fc, fields)))
+
+    def read_array(self, table, fields=None):
+        return tables.load(table_path(table), fields)
+
+    def write_array(self, table, array):
+        start = time.perf_counter()
+        tables.save(table_path(table), array)
+        self._done("NumPyArrayToTable", start)
+
+    def write_table(self, table, fields, rows):
+        self.write_array(table, tables.from_rows(list(fields), rows))
+
+    def read_table(self, table):
+        #(fields, rows), for callers that want plain tuples
+        array = self.read_array(table)
+        return list(array.dtype.names), tables.to_rows(array)
+
+    #--- raster tools ---------------------------------------------------------
+
+    def project_raster(self, in_raster, out_raster, epsg):
+        start = time.perf_counter()
+        data, src, nodata = read_raster(raster_path(in_raster))
+        fwd = crs.transformer(src.epsg, epsg)
+        inv = crs.transformer(epsg, src.epsg)
+
+        #footprint of the source edges in the target system
+        tx, ty = _footprint(src, fwd)
+        extent = (tx.min(), ty.min(), tx.max(), ty.max())
+        dst = Grid.from_extent(extent, _footprint_cell(src, tx, ty), epsg)
+
+        if nodata is None:
+            nodata = default_nodata(data.dtype)
+        out = np.full(dst.shape, nodata, dtype=data.dtype)
+        step = max(1, 1_000_000 // dst.ncols)
+        for r0 in range(0, dst.nrows, step):
+            rows = np.arange(r0, min(r0 + step, dst.nrows))
+            xs, ys = dst.cell_centers(rows=rows)
+            gx, gy = np.meshgrid(xs, ys)
+            sx, sy = inv(gx, gy)
+            fr, fc = src.index(sx, sy)
+            ir, ic = np.floor(fr).astype(np.int64), np.floor(fc).astype(np.int64)
+            ok = (ir >= 0) & (ir < src.nrows) & (ic >= 0) & (ic < src.ncols)
+            block = out[rows[0]:rows[-1] + 1]
+            block[ok] = data[ir[ok], ic[ok]]
+        write_raster(raster_path(out_raster), out, dst, nodata)
+        self._done("ProjectRaster", start)
+
+    def warp_to_boundary(self, in_raster, clip_fc, out_raster, epsg, margin=2):
+        #ProjectRaster + ExtractByMask in one step that only reads the part of
+        #the source under the boundary: the boundary's bbox is taken into source
+        #coordinates, that window (plus a margin for resampling) is read off the
+        #memmap, warped by nearest neighbour onto a grid covering the boundary,
+        #masked, and written once
+        start = time.perf_counter()
+        data, src, nodata = read_raster(raster_path(in_raster))
+        if nodata is None:
+            nodata = default_nodata(data.dtype)
+        boundary = self.load_boundary(clip_fc, epsg)
+        sx0, sy0, sx1, sy1 = crs.transform_bounds(boundary.bounds, epsg, src.epsg)
+        c0 = max(0, int(math.floor((sx0 - src.xmin) / src.cell)) - margin)
+        c1 = min(src.ncols, int(math.ceil((sx1 - src.xmin) / src.cell)) + margin)
+        r0 = max(0, int(math.floor((src.ymax - sy1) / src.cell)) - margin)
+        r1 = min(src.nrows, int(math.ceil((src.ymax - sy0) / src.cell)) + margin)
+        if r1 <= r0 or c1 <= c0:
+            raise ValueError(f"{in_raster} doesn't overlap {clip_fc}")
+        window = src.window(r0, c0, r1 - r0, c1 - c0)
+        block = np.asarray(data[r0:r1, c0:c1])
+
+        if src.epsg == epsg:
+            #same system: keep the source cells, just cut them out
+            dst = Grid.from_extent(boundary.bounds, src.cell, epsg, snap=src)
+        else:
+            #keep the cell count of the window, like ProjectRaster's default cell size
+            tx, ty = _footprint(window, crs.transformer(src.epsg, epsg))
+            dst = Grid.from_extent(boundary.bounds, _footprint_cell(window, tx, ty), epsg)
+
+        inv = crs.transformer(epsg, src.epsg)
+        out = np.full(dst.shape, nodata, dtype=data.dtype)
+        step = max(1, 1_000_000 // dst.ncols)
+        for d0 in range(0, dst.nrows, step):
+            d1 = min(d0 + step, dst.nrows)
+            part = dst.window(d0, 0, d1 - d0, dst.ncols)
+            xs, ys = part.cell_centers()
+            gx, gy = np.meshgrid(xs, ys)
+            fr, fc = window.index(*inv(gx, gy))
+            ir, ic = np.floor(fr).astype(np.int64), np.floor(fc).astype(np.int64)
+            ok = (ir >= 0) & (ir < window.nrows) & (ic >= 0) & (ic < window.ncols)
+            ok &= rasterize.polygon_mask(boundary.geom, part)
+            rows = out[d0:d1]
+            rows[ok] = block[ir[ok], ic[ok]]
+        write_raster(raster_path(out_raster), out, dst, nodata)
+        self._done("WarpToBoundary", start)
+
+    def move_raster(self, in_raster, out_raster):
+        start = time.perf_counter()
+        store, name = RasterStore.of(strip_ext(in_raster))
+        store.move(name, *RasterStore.of(strip_ext(out_raster)))
+        self._done("MoveRaster", start)
+
+    def copy_raster(self, in_raster, out_raster):
+        start = time.perf_counter()
+        src = strip_ext(in_raster)
+        dst = strip_ext(out_raster)
+        #like a move, the copy replaces the target whole, overviews included
+        delete_raster(dst)
+        shutil.copyfile(src + RASTER_EXT, dst + RASTER_EXT)
+        shutil.copyfile(src + ".json", dst + ".json")
+        self._done("CopyRaster", start)
+
+    def extract_by_mask(self, in_raster, mask, out_raster):
+        start = time.perf_counter()
+        data, grid, nodata = read_raster(raster_path(in_raster))
+        boundary = self.load_boundary(mask, grid.epsg)
+        bx0, by0, bx1, by1 = boundary.bounds
+        c0 = max(0, int(math.floor((bx0 - grid.xmin) / grid.cell)))
+        c1 = min(grid.ncols, int(math.ceil((bx1 - grid.xmin) / grid.cell)))
+        r0 = max(0, int(math.floor((grid.ymax - by1) / grid.cell)))
+        r1 = min(grid.nrows, int(math.ceil((grid.ymax - by0) / grid.cell)))
+        if nodata is None:
+            nodata = default_nodata(data.dtype)
+        window = grid.window(r0, c0, max(0, r1 - r0), max(0, c1 - c0))
+        out = np.array(data[r0:r1, c0:c1])
+        out[~rasterize.polygon_mask(boundary.geom, window)] = nodata
+        write_raster(raster_path(out_raster), out, window, nodata)
+        self._done("ExtractByMask", start)
+
+    def polygon_to_raster(self, in_fc, value_field, out_raster, cell_size):
+        start = time.perf_counter()
+        feats, epsg = read_features(feature_path(in_fc))
+        shapes = [(f["geometry"], f["properties"][value_field]) for f in feats
+                  if f.get("geometry") and f["properties"].get(value_field) is not None]
+        extent = geometry.union_bounds(geometry.bounds(g) for g, _ in shapes)
+        grid = Grid.from_extent(extent, cell_size, epsg)
+        is_int = all(float(v).is_integer() for _, v in shapes)
+        dtype = np.int32 if is_int else np.float32
+        nodata = default_nodata(dtype)
+        out = rasterize.rasterize(shapes, grid, dtype, nodata)
+        write_raster(raster_path(out_raster), out, grid, nodata)
+        self._done("PolygonToRaster", start)
+
+    def landcover_to_raster(self, in_fc, value_field, remap, out_raster, cell_size, workers=1):
+        #PolygonToRaster (MAXIMUM_COMBINED_AREA) and Reclassify in one pass:
+        #the remap becomes a lookup table applied to each cell's winning class
+        start = time.perf_counter()
+        feats, epsg = read_features(feature_path(in_fc))
+        shapes = [(f["geometry"], f["properties"][value_field]) for f in feats
+                  if f.get("geometry") and f["properties"].get(value_field) is not None]
+        extent = geometry.union_bounds(geometry.bounds(g) for g, _ in shapes)
+        grid = Grid.from_extent(extent, cell_size, epsg)
+        rules = parse_remap(remap)
+        lut = {}
+        for value in {v for _, v in shapes}:
+            #the first rule covering a value wins, as in Reclassify
+            for low, high, new in rules:
+                if low <= value <= high:
+                    lut[value] = None if new is None else int(new)
+                    break
+        out = rasterize.rasterize_majority(shapes, grid, lut, -2147483648, workers=workers)
+        write_raster(raster_path(out_raster), out, grid, -2147483648)
+        self._done("LandcoverToRaster", start)
+
+    def reclassify(self, in_raster, remap, out_raster):
+        #values not named in the remap keep their value, like arcpy's "DATA" default
+        start = time.perf_counter()
+        data, grid, nodata = read_raster(raster_path(in_raster))
+        out = kernels.reclassify(data, remap, np.int32)
+        out[~valid_mask(data, nodata)] = -2147483648
+        write_raster(raster_path(out_raster), out, grid, -2147483648)
+        self._done("Reclassify", start)
+
+    def _cost_surface(self, cost_raster):
+        #(float64 cost array with NaN for NoData, grid)
+        cost, grid, nodata = read_raster(raster_path(cost_raster))
+        return np.where(valid_mask(cost, nodata), cost, np.nan).astype(np.float64), grid
+
+    def _regions(self, in_regions, grid):
+        feats, epsg = read_features(feature_path(in_regions))
+        if epsg != grid.epsg:
+            raise ValueError(f"{in_regions} is EPSG:{epsg}, cost raster is EPSG:{grid.epsg}")
+        return routing.region_labels([f.get("geometry") for f in feats], grid)
+
+    def _write_connections(self, connections, out_fc, grid):
+        lines = [feature(geom, **props) for geom, props in routing.connection_lines(connections, grid)]
+        write_features(feature_path(out_fc), lines, grid.epsg)
+
+    def optimal_region_connections(self, in_regions, out_fc, cost_raster, pyramid=(), buffer=3):
+        #the weighted cost graph is kept for the next call on the same cost
+        #raster (path, mtime and grid), e.g. another habitat set; a changed or
+        #different raster builds a new one. pyramid (e.g. (4, 16): 100 m and
+        #400 m over a 25 m surface) routes coarse-to-fine instead (see
+        #routing.coarse_to_fine), with the coarse levels read from the cost
+        #raster's overviews, built on first use
+        start = time.perf_counter()
+        cost, grid = self._cost_surface(cost_raster)
+        regions = self._regions(in_regions, grid)
+        if pyramid:
+            store, name = RasterStore.of(raster_path(cost_raster))
+            meta = read_meta(store.path(name))
+            nodata = meta.get("nodata")
+            if not set(pyramid) <= set(meta.get("overviews", [])):
+                store.build_overviews(name, tuple(pyramid))
+            levels = {}
+            for factor in pyramid:
+                overview, _, _ = store.overview(name, factor)
+                levels[factor] = np.where(valid_mask(overview, nodata), overview, np.nan).astype(np.float64)
+            connections = routing.coarse_to_fine(cost, regions, grid.cell, pyramid, buffer, levels)
+        else:
+            path = os.path.abspath(raster_path(cost_raster))
+            key = (path, os.stat(path).st_mtime_ns, grid)
+            if self._cost_graph[0] != key:
+                self._cost_graph = (key, routing.CostGraph.from_surface(cost, grid.cell))
+            connections = routing.connect_regions(self._cost_graph[1], regions)
+        self._write_connections(connections, out_fc, grid)
+        self._done("OptimalRegionConnections", start)
+
+    def scenario_routes(self, in_regions, surfaces, outputs):
+        #OptimalRegionConnections over every weight scenario's cost surface
+        #({scenario: raster}) into outputs ({scenario: feature class}). The
+        #scenarios share a NoData footprint, so the cost graph is built once
+        #and only re-weighted for each (see routing.scenario_connections)
+        start = time.perf_counter()
+        _, grid, _ = read_raster(raster_path(next(iter(surfaces.values()))))
+        regions = self._regions(in_regions, grid)
+
+        def costs():
+            for name, raster in surfaces.items():
+                cost, other = self._cost_surface(raster)
+                if other != grid:
+                    raise ValueError(f"{raster} isn't on the same grid as the other scenarios")
+                yield name, cost
+        for name, connections in routing.scenario_connections(costs(), regions, grid.cell).items():
+            self._write_connections(connections, outputs[name], grid)
+        self._done("ScenarioRoutes", start)
+
+    def zonal_summary(self, zone_fc, zone_field, value_raster, class_raster, stats_table, area_table, cell_size):
+        #ZonalStatisticsAsTable (ALL) + TabulateArea from one pass; returns
+        #{class value: area} over all zones for the summary table
+        start = time.perf_counter()
+        _, snap, _ = read_raster(raster_path(value_raster))
+        zones = list(self.read_rows(zone_fc, [zone_field, "SHAPE@"]))
+        box = geometry.union_bounds([geometry.bounds(g) for _, g in zones if g])
+        grid = Grid.from_extent(box, cell_size, snap.epsg, snap=snap) if box else snap
+        zone_ids, acc = zonal.zonal_summary(zones, grid, raster_path(value_raster), raster_path(class_raster))
+        cell_area = grid.cell * grid.cell
+        self.write_array(stats_table, acc.stats_table(zone_field, zone_ids, cell_area))
+        self.write_array(area_table, acc.area_table(zone_field, zone_ids, cell_area))
+        self._done("ZonalSummary", start)
+        return acc.class_totals(cell_area)
+
+    def rescale(self, in_raster, out_raster, function="TfLarge", from_scale=10, to_scale=1, focal_range=None):
+        #RescaleByFunction as a tile pass (see lazy.py); focal_range runs a
+        #FocalStatistics RANGE of that size first, without saving it
+        start = time.perf_counter()
+        _, grid, _ = read_raster(raster_path(in_raster))
+        expr = lazy.load(raster_path(in_raster))
+        if focal_range:
+            expr = expr.focal_range(focal_range)
+        g = lazy.Graph(grid)
+        g.save(expr.rescale(getattr(kernels, function)(), from_scale, to_scale), raster_path(out_raster), keep=True)
+        g.compute()
+        self._done("RescaleByFunction", start)
+
+    def weighted_sum(self, factors, out_raster):
+        #WeightedSum over [(raster, weight), ...] on the first raster's grid
+        start = time.perf_counter()
+        _, grid, _ = read_raster(raster_path(factors[0][0]))
+        g = lazy.Graph(grid)
+        g.save(lazy.weighted_sum([(lazy.load(raster_path(r)), w) for r, w in factors]), raster_path(out_raster),
+               keep=True)
+        g.compute()
+        self._done("WeightedSum", start)
+
+    def weighted_overlay(self, factors, scenarios, outputs):
+        #one WeightedSum per scenario from a single pass over the factors (see
+        #overlay.py), on the first factor's grid; factors is {factor: raster},
+        #scenarios {scenario: {factor: weight}}, outputs {scenario: raster}
+        start = time.perf_counter()
+        _, grid, _ = read_raster(raster_path(next(iter(factors.values()))))
+        overlay.weighted_overlay({f: raster_path(r) for f, r in factors.items()}, scenarios, grid,
+                                 {name: raster_path(r) for name, r in outputs.items()})
+        self._done("WeightedOverlay", start)
+
+    def habitat_model(self, workspace, landcover_remap, weights=None, names=None, keep=("LC_Reclass",)):
+        #ruggedness, rescales, landcover reclass and the weighted sum in the
+        #workspace, as one fused pass (see lazy.py) on the DEM's grid; writes
+        #Combined_Rasters and the intermediates named in keep, nothing else
+        start = time.perf_counter()
+        path = lambda name: os.path.join(workspace, names(name) if names else name)
+        _, grid, _ = read_raster(raster_path(path("D_ab_dem")))
+        g = lazy.habitat_graph(workspace, grid, landcover_remap, weights, names=names)
+        g.compute(g.plan() + [path(name) for name in keep])
+        self._done("HabitatModel", start)
+
+    def terrain_rasters(self, dem_raster, outputs, size=3, workers=1):
+        #Slope / Aspect / Curvature / FocalStatistics RANGE and TRI from one
+        #banded read of the DEM; outputs is {metric: out raster}
+        start = time.perf_counter()
+        terrain.terrain_rasters(raster_path(dem_raster), {m: raster_path(r) for m, r in outputs.items()}, size, workers)
+        self._done("TerrainDerivatives", start)
+        return outputs
+
+    def distance_rasters(self, workspace, sources, snap_raster, workers=1):
+        #DistanceAccumulation for several sources at once on the snap raster's
+        #grid: sources is {out raster name: source feature class name}
+        start = time.perf_counter()
+        _, grid, _ = read_raster(raster_path(snap_raster))
+        write_distance_rasters(workspace, sources, grid, workers)
+        self._done("DistanceAccumulation", start)
+
+    #--- map layouts ----------------------------------------------------------
+
+    def layer_definition(self, fc, out_file):
+        #a colour per layer, stable across runs (picked from the name)
+        name = os.path.basename(strip_ext(fc))
+        hue = zlib.crc32(name.encode()) % 360 / 60.0
+        x = 1 - abs(hue % 2 - 1)
+        rgb = [(1, x, 0), (x, 1, 0), (0, 1, x), (0, x, 1), (x, 0, 1), (1, 0, x)][int(hue)]
+        with open(out_file, "w") as f:
+            json.dump({"name": name, "shapeType": self.describe(fc).shapeType,
+                       "color": [int(40 + 180 * c) for c in rgb]}, f, indent=2)
+
+    def render_layout(self, job, layers, dpi=96):
+        #a PNG preview of the map frame: the base raster in grey, polygons
+        #tinted with their outlines drawn, lines drawn, at the job's scale
+        start = time.perf_counter()
+        styles = []
+        for layer_file, _ in layers:
+            with open(layer_file) as f:
+                style = json.load(f)
+            feats, epsg = read_features(feature_path(os.path.join(job.gdb, style["name"])))
+            styles.append((style, [f["geometry"] for f in feats if f.get("geometry")], epsg))
+        if job.extent_fc:
+            feats, epsg = read_features(feature_path(os.path.join(job.gdb, job.extent_fc)))
+            extent = geometry.union_bounds(geometry.bounds(f["geometry"]) for f in feats if f.get("geometry"))
+        elif job.base_raster:
+            _, base_grid, _ = read_raster(raster_path(os.path.join(job.gdb, job.base_raster)))
+            extent, epsg = base_grid.extent, base_grid.epsg
+        else:
+            extent = geometry.union_bounds(geometry.bounds(g) for _, geoms, _ in styles for g in geoms)
+        page = Grid.from_extent(extent, job.scale * 0.0254 / dpi, epsg)
+        rgb = np.full(page.shape + (3,), 255, dtype=np.uint8)
+
+        if job.base_raster:
+            source = blocks.Source(raster_path(os.path.join(job.gdb, job.base_raster)))
+            values = source.read(page)
+            valid = ~np.isnan(values)
+            if valid.any():
+                vals = values[valid]
+                lo, hi = vals.min(), vals.max()
+                rgb[valid] = (255 - 200 * (vals - lo) / ((hi - lo) or 1)).astype(np.uint8)[:, None]
+        for style, geoms, _ in styles:
+            color = np.array(style["color"], dtype=np.uint8)
+            outline = np.zeros(page.shape, dtype=np.uint8)
+            for geom in geoms:
+                polys = geometry.polygons(geom)
+                if polys:
+                    inside = rasterize.polygon_mask(geom, page)
+                    rgb[inside] = (rgb[inside] * 0.75 + color * 0.25).astype(np.uint8)
+                    _burn_lines(outline, [ring for poly in polys for ring in poly], page, 1)
+                else:
+                    _burn_lines(outline, geometry.lines(geom) or [[p] for p in geometry.points(geom)], page, 1)
+            rgb[outline > 0] = color
+        out_file = os.path.splitext(job.out_file)[0] + ".png"
+        _write_png(out_file, rgb)
+        self._done("ExportLayout", start)
+        return out_file
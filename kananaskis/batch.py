@@ -0,0 +1,295 @@
+#-------------------------------------------------------------------------------
+# Name:        batch
+# Purpose:     the pipeline for many study areas (parks, wildlife management
+#              units) in one go. The work that doesn't depend on the region is
+#              done once, over an envelope around every region: reprojecting
+#              and clipping the provincial inputs, rasterizing landcover and
+#              the distance surfaces. Each region then only clips its piece out
+#              of that shared gdb and runs the model, routes and summaries, and
+#              regions are spread over a process pool. The shared stages and
+#              every region are cached (see cache.py): a region added inside
+#              the shared extent only runs that region, one that widens the
+#              extent redoes the shared stages too. Distances are measured on
+#              the shared grid, so a road just outside a region still counts.
+#
+#              python -m kananaskis.batch --data C:\GEOS456\FinalProject --out C:\GEOS456\Batch
+#                  --boundary parks\Bow_Valley.shp --boundary wmu\WMU_410.shp
+#-------------------------------------------------------------------------------
+import argparse
+import os
+import shutil
+import sys
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from dataclasses import dataclass, field
+
+import numpy as np
+
+from . import tables, zonal
+from .backends import get_backend
+from .cache import StageCache
+from .config import FOLDERS
+from .ingest import IngestSettings, clean_name, run_ingest
+from .maps import LayoutJob, MapQueue, run_queue
+from .overlay import MODEL_REMAP
+from .profiling import Profiler
+from .projcache import DEFAULT_MAX_MB, ProjectionCache
+from .townships import OVERLAY_FIELDS, nts_township_pairs
+
+#rasters every region cuts out of the shared gdb
+SHARED_RASTERS = ["D_ab_dem", "Landcover", "Distance_to_Roads", "Distance_to_Trails", "Distance_to_Hydro"]
+
+DISTANCE_SOURCES = {"Distance_to_Roads": "K_Road", "Distance_to_Trails": "K_Trails", "Distance_to_Hydro": "K_Hydro"}
+
+#the region's own boundary takes the place of the Kananaskis one
+BOUNDARY = "K_KCountry_Bo"
+
+REGION_OUTPUTS = ["Combined_Rasters", "Paths", "ElevationStats", "Landcover_Area_by_Class", "NTS_Township_Overlay"]
+
+
+@dataclass(frozen=True)
+class Region:
+    name: str
+    boundary: str
+
+
+@dataclass(frozen=True)
+class BatchSettings:
+    backend: str
+    out_folder: str
+    target_epsg: int = 26911
+    cell_size: int = 25
+    #how far past the regions the shared inputs reach (m), so distances near
+    #a region's edge see the features just outside it
+    margin: float = 5000.0
+    landcover_remap: str = MODEL_REMAP
+    weights: dict = field(default_factory=dict)
+    #coarse factors to route coarse-to-fine through (e.g. (4, 16)); empty routes at full resolution
+    route_pyramid: tuple = ()
+    #folder of projected and clipped inputs kept between batches (see projcache.py); None turns it off
+    projection_cache: str = None
+    projection_cache_mb: float = DEFAULT_MAX_MB
+
+
+@dataclass
+class RegionResult:
+    region: Region
+    gdb: str
+    route_km: float = 0.0
+    class_areas: dict = field(default_factory=dict)
+    timings: list = field(default_factory=list)
+
+
+def regions_from(paths):
+    #one region per boundary file, named after it (made unique if need be)
+    regions, seen = [], set()
+    for path in paths:
+        name = clean_name(os.path.basename(path))
+        base, n = name, 2
+        while name in seen:
+            name = f"{base}_{n}"
+            n += 1
+        seen.add(name)
+        regions.append(Region(name, path))
+    return regions
+
+
+def region_gdb(settings, region):
+    return os.path.join(settings.out_folder, region.name, "KananaskisWildlife.gdb")
+
+
+def prepare_shared(folders, folder_prefixes, regions, settings, cache, profiler, workers=None):
+    #the region-independent stages; returns (shared gdb, keys every region depends on)
+    backend = get_backend(settings.backend)
+    root = os.path.join(settings.out_folder, "shared")
+    temp = os.path.join(root, "temp")
+    shutil.rmtree(temp, ignore_errors=True)
+    os.makedirs(temp)
+    gdb = os.path.join(root, "Shared.gdb")
+    if not backend.exists(gdb):
+        backend.create_file_gdb(root, "Shared.gdb")
+
+    #outside the gdb so the cache can hash it like any input file
+    extent = os.path.join(root, "Shared_Extent" + backend.feature_ext)
+    with profiler.stage("shared:envelope", inputs=[r.boundary for r in regions]):
+        backend.envelope([r.boundary for r in regions], extent, settings.target_epsg, settings.margin)
+
+    ingest_settings = IngestSettings(settings.backend, temp, extent, settings.target_epsg, settings.cell_size)
+    projections = (ProjectionCache(settings.projection_cache, settings.projection_cache_mb)
+                   if settings.projection_cache else None)
+    keys = run_ingest(folders, folder_prefixes, gdb, ingest_settings, workers=workers, cache=cache,
+                      profiler=profiler, projections=projections)
+
+    distance_key = cache.key("shared:distance", {"cell_size": settings.cell_size},
+                             [keys[source] for source in DISTANCE_SOURCES.values()])
+    outputs = [os.path.join(gdb, name) for name in DISTANCE_SOURCES]
+    if cache.stale("shared:distance", distance_key, outputs):
+        with profiler.stage("shared:distance", inputs=[os.path.join(gdb, s) for s in DISTANCE_SOURCES.values()]):
+            backend.distance_rasters(gdb, DISTANCE_SOURCES, os.path.join(gdb, "D_ab_dem"))
+        cache.record("shared:distance", distance_key, outputs)
+    return gdb, [keys[name] for name in sorted(keys)] + [distance_key]
+
+
+def region_summary(backend, gdb):
+    #(route length in km, {landcover class: area}) from a finished region gdb
+    path = lambda name: os.path.join(gdb, name)
+    route_km = tables.total(backend.feature_array(path("Paths"), ["SHAPE@LENGTH"]), "SHAPE@LENGTH") / 1000
+    return route_km, zonal.class_areas(backend.read_array(path("Landcover_Area_by_Class")))
+
+
+def run_region(region, shared_gdb, settings):
+    #runs in a worker process and only writes inside the region's own gdb
+    backend = get_backend(settings.backend)
+    profiler = Profiler()
+    gdb = region_gdb(settings, region)
+    if backend.exists(gdb):
+        backend.delete(gdb)
+    backend.create_file_gdb(*os.path.split(gdb))
+    path = lambda name: os.path.join(gdb, name)
+    shared = lambda name: os.path.join(shared_gdb, name)
+
+    def step(name, **extra):
+        return profiler.stage(f"region:{region.name}:{name}", **extra)
+
+    with step("clip"):
+        backend.project(region.boundary, path(BOUNDARY), settings.target_epsg)
+        #everything in the shared gdb is already in the target system, so this is a plain clip
+        for fc in backend.list_feature_classes(shared_gdb):
+            name = os.path.splitext(fc)[0]
+            if name != BOUNDARY:
+                backend.clip(shared(name), path(BOUNDARY), path(name))
+        for name in SHARED_RASTERS:
+            backend.extract_by_mask(shared(name), path(BOUNDARY), path(name))
+
+    with step("nts_overlay"):
+        pairs = nts_township_pairs(backend, path("N_NTS50"), path("A_AB_Township"))
+        backend.write_table(path("NTS_Township_Overlay"), OVERLAY_FIELDS, pairs)
+    with step("model"):
+        backend.habitat_model(gdb, settings.landcover_remap, settings.weights)
+    with step("optimal_routes"):
+        backend.optimal_region_connections(path("W_Bear_Habita"), path("Paths"), path("Combined_Rasters"),
+                                           settings.route_pyramid)
+    with step("zonal_summary"):
+        backend.zonal_summary(path(BOUNDARY), "OBJECTID", path("D_ab_dem"), path("LC_Reclass"),
+                              path("ElevationStats"), path("Landcover_Area_by_Class"), settings.cell_size)
+    route_km, areas = region_summary(backend, gdb)
+    return RegionResult(region, gdb, route_km, areas, profiler.records)
+
+
+def run_batch(folders, folder_prefixes, regions, settings, workers=None, cache=None, profiler=None):
+    #shared stages once, then every stale region through the pool; returns
+    #{region name: RegionResult} for every region, skipped ones included
+    backend = get_backend(settings.backend)
+    profiler = profiler or Profiler()
+    cache = cache or StageCache(os.path.join(settings.out_folder, "batch_cache.json"), exists=backend.exists)
+    shared_gdb, upstream = prepare_shared(folders, folder_prefixes, regions, settings, cache, profiler, workers)
+
+    params = {"target_epsg": settings.target_epsg, "cell_size": settings.cell_size,
+              "remap": settings.landcover_remap, "weights": settings.weights, "pyramid": list(settings.route_pyramid)}
+    keys, results, todo = {}, {}, []
+    for region in regions:
+        keys[region.name] = cache.key(f"region:{region.name}", params, upstream, datasets=[region.boundary])
+        gdb = region_gdb(settings, region)
+        if cache.stale(f"region:{region.name}", keys[region.name], [os.path.join(gdb, n) for n in REGION_OUTPUTS]):
+            todo.append(region)
+        else:
+            results[region.name] = RegionResult(region, gdb, *region_summary(backend, gdb))
+
+    workers = max(1, min(workers or os.cpu_count() or 1, len(todo) or 1))
+    print(f"Running {len(todo)} of {len(regions)} regions with {workers} worker(s).")
+
+    def report(result):
+        for record in result.timings:
+            profiler.add(record)
+        gdb = result.gdb
+        cache.record(f"region:{result.region.name}", keys[result.region.name],
+                     [os.path.join(gdb, n) for n in REGION_OUTPUTS])
+        results[result.region.name] = result
+        print(f"Region {result.region.name} done: {result.route_km:.2f} km of optimal routes -> {gdb}")
+
+    if workers == 1:
+        for region in todo:
+            report(run_region(region, shared_gdb, settings))
+    else:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            futures = [pool.submit(run_region, region, shared_gdb, settings) for region in todo]
+            for future in as_completed(futures):
+                report(future.result())
+    return {r.name: results[r.name] for r in regions}
+
+
+def queue_maps(results, settings, queue, template=None):
+    #one layout per region, zoomed to its boundary; returns the tickets
+    return [queue.submit(LayoutJob(name, r.gdb, os.path.join(settings.out_folder, name, f"{name}.pdf"),
+                                   backend=settings.backend, template=template, title=f"Bear Habitat, {name}",
+                                   extent_fc=BOUNDARY))
+            for name, r in results.items()]
+
+
+def summary_table(results):
+    #one row per region: route km, then hectares per landcover class
+    classes = sorted({c for r in results.values() for c in r.class_areas})
+    km = np.array([r.route_km for r in results.values()], dtype=np.float64)
+    ha = np.array([[r.class_areas.get(c, 0.0) for c in classes] for r in results.values()],
+                  dtype=np.float64).reshape(len(results), len(classes)) / 10000
+    fields = ["Region", "Route_km"] + [f"Class_{c}_ha" for c in classes]
+    return tables.from_columns(fields, [list(results), km.round(3)] + list(ha.round(2).T))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Run the habitat pipeline for many study areas.")
+    parser.add_argument("--data", required=True, help="folder holding ATS, dem, Kananaskis, Landcover, NTS, Wildlife")
+    parser.add_argument("--out", required=True, help="output folder: shared/ plus one folder per region")
+    parser.add_argument("--boundary", action="append", default=[], help="study area boundary (repeatable)")
+    parser.add_argument("--list", help="text file with one boundary path per line")
+    parser.add_argument("--backend", default="arcgis", choices=["arcgis", "local"])
+    parser.add_argument("--workers", type=int, help="processes for ingest and for regions (default: CPU count)")
+    parser.add_argument("--margin", type=float, default=5000.0, help="metres the shared inputs reach past the regions")
+    parser.add_argument("--force", action="store_true", help="ignore the cache and rebuild everything")
+    parser.add_argument("--pyramid", type=int, action="append", metavar="FACTOR",
+                        help="route coarse-to-fine through this coarser level, e.g. --pyramid 4 --pyramid 16 "
+                             "(100 m and 400 m over 25 m cells)")
+    parser.add_argument("--projection-cache", metavar="FOLDER",
+                        help="keep projected and clipped inputs here for later batches (default: <out>/projection_cache)")
+    parser.add_argument("--projection-cache-mb", type=float, default=DEFAULT_MAX_MB,
+                        help="size cap of the projection cache; least recently used entries go first (0 turns it off)")
+    parser.add_argument("--maps", choices=["off", "queue", "now"], default="off",
+                        help="queue a layout per region in <out>/map_queue, and optionally render them now")
+    parser.add_argument("--template", help="layout template (.aprx) for the arcgis backend's maps")
+    args = parser.parse_args(argv)
+
+    boundaries = list(args.boundary)
+    if args.list:
+        with open(args.list) as f:
+            boundaries += [line.strip() for line in f if line.strip() and not line.startswith("#")]
+    if not boundaries:
+        parser.error("no boundaries given (use --boundary or --list)")
+
+    os.makedirs(args.out, exist_ok=True)
+    projection_cache = args.projection_cache or os.path.join(args.out, "projection_cache")
+    settings = BatchSettings(args.backend, args.out, margin=args.margin, route_pyramid=tuple(args.pyramid or ()),
+                             projection_cache=projection_cache if args.projection_cache_mb > 0 else None,
+                             projection_cache_mb=args.projection_cache_mb)
+    backend = get_backend(args.backend)
+    folders = [os.path.join(args.data, name) for name in FOLDERS.values()]
+    prefixes = {os.path.join(args.data, name): key for key, name in FOLDERS.items()}
+    cache = StageCache(os.path.join(args.out, "batch_cache.json"), force=args.force, exists=backend.exists)
+    profiler = Profiler(os.path.join(args.out, "batch_profile.jsonl"))
+
+    results = run_batch(folders, prefixes, regions_from(boundaries), settings, args.workers, cache, profiler)
+    summary = summary_table(results)
+    backend.write_array(os.path.join(args.out, "Batch_Summary"), summary)
+    print(f"\n{len(summary)} regions summarised in {os.path.join(args.out, 'Batch_Summary')}")
+    if args.maps != "off":
+        queue = MapQueue(os.path.join(args.out, "map_queue"))
+        queue_maps(results, settings, queue, args.template)
+        if args.maps == "now":
+            run_queue(queue, workers=args.workers, profiler=profiler)
+        else:
+            print(f"{len(results)} map layouts queued; render them with python -m kananaskis.maps --queue {queue.folder}")
+    print(f"\nStage timings for run {profiler.run_id}, most expensive first:")
+    print(profiler.summary(top=20))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,196 @@
+#-------------------------------------------------------------------------------
+# Name:        bench
+# Purpose:     benchmark suite for the pipeline on synthetic data (see
+#              synthetic.py), run through the local backend so it works
+#              anywhere NumPy does. Every stage is timed with the profiler and
+#              reported as throughput (cells/s or features/s); running several
+#              sizes gives a scaling curve per stage. Results can be saved and
+#              compared against an earlier run, and stages falling under a
+#              floor rate or slowing down past a tolerance fail the run.
+#
+#              python -m kananaskis.bench --cells 1e6 --cells 1e7 --out bench.json
+#              python -m kananaskis.bench --cells 1e6 --baseline bench.json
+#-------------------------------------------------------------------------------
+import argparse
+import json
+import os
+import shutil
+import sys
+import tempfile
+
+from . import lazy, synthetic
+from .config import FOLDERS
+from .backends import get_backend
+from .grid import read_grid
+from .ingest import IngestSettings, clean_name, run_ingest
+from .overlay import MODEL_REMAP
+from .profiling import Profiler
+from .townships import nts_township_pairs
+
+STAGES = ["ingest", "nts_overlay", "distance", "model", "optimal_routes", "optimal_routes_pyramid", "zonal_summary"]
+
+#floor throughput per stage (units/s) below which a run is flagged, whatever
+#the baseline says. Deliberately loose: they catch accidental O(n^2), not noise
+MIN_RATES = {
+    "ingest:vector": 200,
+    "ingest:raster": 1e5,
+    "nts_overlay": 200,
+    "distance": 2e5,
+    "model": 5e5,
+    "optimal_routes": 2e4,
+    "optimal_routes_pyramid": 1e5,
+    "zonal_summary": 1e6,
+}
+
+
+def _units(name, amount, units):
+    return {"stage": name, "count": int(amount), "units": units}
+
+
+def run_size(cells, workdir, stages=STAGES, workers=1, seed=456):
+    #generate one dataset and time the selected stages on it; returns result rows
+    root = os.path.join(workdir, f"cells_{cells}")
+    shutil.rmtree(root, ignore_errors=True)
+    profiler = Profiler()
+    with profiler.stage("generate"):
+        manifest = synthetic.generate(root, synthetic.SyntheticSpec(cells=cells, seed=seed))
+    datasets = manifest["datasets"]
+    backend = get_backend("local")
+    gdb = os.path.join(root, "KananaskisWildlife.gdb")
+    backend.create_file_gdb(root, "KananaskisWildlife.gdb")
+    folders = [os.path.join(root, name) for name in FOLDERS.values()]
+    prefixes = dict(zip(folders, FOLDERS))
+    path = lambda name: os.path.join(gdb, name)
+    rows = []
+
+    def timed(name, amount, units):
+        #distance and model feed later stages so they always run, but only
+        #selected stages make it into the results
+        if name in stages:
+            rows.append(_units(name, amount, units))
+        return profiler.stage(name, cells=amount if units == "cells" else None)
+
+    #ingest is needed by everything else, so it always runs; only reported if asked for
+    temp = os.path.join(root, "temp")
+    os.makedirs(temp, exist_ok=True)
+    settings = IngestSettings("local", temp, os.path.join(datasets["KCountry_Bound"]["folder"], "KCountry_Bound.shp"))
+    ingest_profiler = Profiler(run_id=profiler.run_id)
+    run_ingest(folders, prefixes, gdb, settings, workers=workers, profiler=ingest_profiler)
+    if "ingest" in stages:
+        for name, info in datasets.items():
+            out = "Landcover" if info["prefix"] == "L" else clean_name(f"{info['prefix']}_{name}")
+            records = [r for r in ingest_profiler.records if r["stage"].startswith(f"ingest:{out}:")]
+            wall = sum(r["wall_s"] for r in records)
+            peak = max((r["peak_rss_mb"] for r in records if r.get("peak_rss_mb") is not None), default=None)
+            kind = "raster" if "cells" in info else "vector"
+            amount = info.get("cells", info.get("features"))
+            row = dict(_units(f"ingest:{out}", amount, "cells" if kind == "raster" else "features"),
+                       wall_s=wall, peak_rss_mb=peak, floor=MIN_RATES[f"ingest:{kind}"])
+            rows.append(row)
+
+    grid, _ = read_grid(path("D_ab_dem"))
+    if "nts_overlay" in stages:
+        amount = datasets["NTS50"]["features"] + datasets["AB_Township"]["features"]
+        with timed("nts_overlay", amount, "features"):
+            nts_township_pairs(backend, path("N_NTS50"), path("A_AB_Township"))
+
+    sources = {"Distance_to_Roads": "K_Road", "Distance_to_Trails": "K_Trails", "Distance_to_Hydro": "K_Hydro"}
+    with timed("distance", grid.nrows * grid.ncols * len(sources), "cells"):
+        backend.distance_rasters(gdb, sources, path("D_ab_dem"))
+
+    with timed("model", grid.nrows * grid.ncols, "cells"):
+        g = lazy.habitat_graph(gdb, grid, MODEL_REMAP)
+        g.compute(g.plan() + [path("LC_Reclass")])
+
+    if "optimal_routes" in stages:
+        with timed("optimal_routes", grid.nrows * grid.ncols, "cells"):
+            backend.optimal_region_connections(path("W_Bear_Habita"), path("Paths"), path("Combined_Rasters"))
+    if "optimal_routes_pyramid" in stages:
+        with timed("optimal_routes_pyramid", grid.nrows * grid.ncols, "cells"):
+            backend.optimal_region_connections(path("W_Bear_Habita"), path("Paths_Pyramid"), path("Combined_Rasters"),
+                                               (4, 16))
+    if "zonal_summary" in stages:
+        with timed("zonal_summary", grid.nrows * grid.ncols, "cells"):
+            backend.zonal_summary(path("K_KCountry_Bo"), "OBJECTID", path("D_ab_dem"), path("LC_Reclass"),
+                                  path("ElevationStats"), path("Landcover_Area_by_Class"), grid.cell)
+
+    walls = {r["stage"]: r for r in profiler.records}
+    for row in rows:
+        record = walls.get(row["stage"], {})
+        row.setdefault("wall_s", record.get("wall_s", 0.0))
+        row.setdefault("peak_rss_mb", record.get("peak_rss_mb"))
+        row["rate"] = row["count"] / row["wall_s"] if row["wall_s"] else float("inf")
+        row.setdefault("floor", MIN_RATES.get(row["stage"]))
+        row["size"] = cells
+    return rows
+
+
+def check(rows, baseline=None, tolerance=0.25, min_wall=0.25):
+    #problems found: rates under their floor, or slower than the baseline run
+    #of the same stage and size by more than `tolerance`. Stages quicker than
+    #min_wall are all fixed overhead and timer noise, so they're left alone
+    problems = []
+    before = {(r["stage"], r["size"]): r for r in baseline or []}
+    for row in rows:
+        if row["wall_s"] < min_wall:
+            continue
+        if row.get("floor") and row["rate"] < row["floor"]:
+            problems.append(f"{row['stage']} @ {row['size']:,} cells: {row['rate']:,.0f} {row['units']}/s "
+                            f"is under the floor of {row['floor']:,.0f}")
+        old = before.get((row["stage"], row["size"]))
+        if old and row["rate"] < old["rate"] * (1 - tolerance):
+            problems.append(f"{row['stage']} @ {row['size']:,} cells: {row['rate']:,.0f} {row['units']}/s "
+                            f"vs {old['rate']:,.0f} in the baseline ({row['rate'] / old['rate'] - 1:+.0%})")
+    return problems
+
+
+def report(rows):
+    #one line per stage and size, so the scaling curve reads straight down
+    lines = [f"{'stage':<28} {'size':>14} {'count':>14} {'wall s':>9} {'rate /s':>14} {'units':<9} {'peak MB':>8}"]
+    for row in sorted(rows, key=lambda r: (r["stage"], r["size"])):
+        peak = row.get("peak_rss_mb")
+        lines.append(f"{row['stage'][:28]:<28} {row['size']:>14,} {row['count']:>14,} {row['wall_s']:>9.2f} "
+                     f"{row['rate']:>14,.0f} {row['units']:<9} {'' if peak is None else f'{peak:.0f}':>8}")
+    return "\n".join(lines)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the pipeline stages on synthetic data.")
+    parser.add_argument("--cells", action="append", type=float,
+                        help="model grid size in cells, repeat for a scaling curve (default 1e6)")
+    parser.add_argument("--stage", action="append", choices=STAGES, help="only report these stages")
+    parser.add_argument("--workdir", help="where the synthetic data goes (default: a temp folder)")
+    parser.add_argument("--workers", type=int, default=1, help="ingest worker processes")
+    parser.add_argument("--seed", type=int, default=456)
+    parser.add_argument("--out", help="save the results as JSON")
+    parser.add_argument("--baseline", help="results JSON from an earlier run to compare against")
+    parser.add_argument("--tolerance", type=float, default=0.25, help="allowed slowdown vs the baseline")
+    parser.add_argument("--keep", action="store_true", help="keep the synthetic data afterwards")
+    args = parser.parse_args(argv)
+
+    workdir = args.workdir or tempfile.mkdtemp(prefix="kananaskis_bench_")
+    rows = []
+    try:
+        for cells in args.cells or [1e6]:
+            print(f"Benchmarking {int(cells):,} cells...")
+            rows.extend(run_size(int(cells), workdir, args.stage or STAGES, args.workers, args.seed))
+    finally:
+        if not args.keep:
+            shutil.rmtree(workdir, ignore_errors=True)
+
+    print(report(rows))
+    if args.out:
+        with open(args.out, "w") as f:
+            json.dump(rows, f, indent=2)
+    baseline = None
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+    problems = check(rows, baseline, args.tolerance)
+    for problem in problems:
+        print(f"REGRESSION: {problem}")
+    return 1 if problems else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,110 @@
+#-------------------------------------------------------------------------------
+# Name:        blocks
+# Purpose:     the tile-level pieces of the suitability (cost surface) model:
+#              tiling a grid, sampling memory-mapped rasters onto any window of
+#              it, and the per-tile steps (FocalStatistics, RescaleByFunction,
+#              Reclassify, terrain derivatives). Each step declares the halo
+#              its window needs. lazy.Graph strings them together and is the
+#              one evaluator that walks the tiles.
+#-------------------------------------------------------------------------------
+from dataclasses import dataclass
+
+import numpy as np
+
+from . import kernels, terrain
+from .grid import read_raster, valid_mask
+
+
+def tiles(shape, tile):
+    #(row0, row1, col0, col1) for every tile covering a raster of `shape`
+    nrows, ncols = shape
+    for r0 in range(0, nrows, tile):
+        for c0 in range(0, ncols, tile):
+            yield r0, min(r0 + tile, nrows), c0, min(c0 + tile, ncols)
+
+
+class Source:
+    #a raster opened once (memory-mapped) and sampled onto any window of the
+    #output grid; cells outside the raster or NoData come back as NaN
+    def __init__(self, path):
+        self.path = path
+        self.data, self.grid, self.nodata = read_raster(path)
+
+    def read(self, window):
+        if window.epsg != self.grid.epsg:
+            raise ValueError(f"{self.path} is EPSG:{self.grid.epsg}, output grid is EPSG:{window.epsg}")
+        g = self.grid
+        xs, ys = window.cell_centers()
+        rows = np.floor((g.ymax - ys) / g.cell).astype(np.int64)
+        cols = np.floor((xs - g.xmin) / g.cell).astype(np.int64)
+        rok = (rows >= 0) & (rows < g.nrows)
+        cok = (cols >= 0) & (cols < g.ncols)
+        out = np.full(window.shape, np.nan)
+        if not rok.any() or not cok.any():
+            return out
+        r, c = rows[rok], cols[cok]
+        #aligned grids (the usual case) read a plain slice straight off the memmap
+        if np.all(np.diff(r) == 1) and np.all(np.diff(c) == 1):
+            block = np.asarray(self.data[r[0]:r[-1] + 1, c[0]:c[-1] + 1])
+        else:
+            block = np.asarray(self.data[np.ix_(r, c)])
+        vals = block.astype(np.float64)
+        vals[~valid_mask(block, self.nodata)] = np.nan
+        out[np.ix_(rok, cok)] = vals
+        return out
+
+
+#model steps; lazy.Apply runs one on its child's (haloed) tile
+
+@dataclass(frozen=True)
+class FocalRange:
+    size: int = 3
+
+    @property
+    def halo(self):
+        return self.size // 2
+
+    def apply(self, block, stats=None):
+        #RANGE over a size x size rectangle; NoData neighbours are ignored.
+        #the block carries a halo which is trimmed off the result
+        return terrain.focal_range(block, self.size)
+
+
+@dataclass(frozen=True)
+class Terrain:
+    #one terrain derivative (see terrain.py); several of these on the same
+    #DEM share its haloed tile, so each extra one is arithmetic only
+    metric: str
+    cell: float
+    size: int = 3
+
+    @property
+    def halo(self):
+        return max(1, self.size // 2)
+
+    def apply(self, block, stats=None):
+        return terrain.derivatives(block, self.cell, (self.metric,), self.size)[self.metric]
+
+
+@dataclass(frozen=True)
+class Rescale:
+    #float32 out: plenty for a 10..1 scale and half the bytes per tile
+    function: object
+    from_scale: float
+    to_scale: float
+    dtype: object = np.float32
+    halo = 0
+
+    def apply(self, block, stats):
+        #not in place on the input: lazy.py memoises tiles that other nodes share
+        return kernels.Rescaler(self.function, stats, self.from_scale, self.to_scale, self.dtype)(block)
+
+
+@dataclass(frozen=True)
+class Reclass:
+    remap: str
+    dtype: object = np.float32
+    halo = 0
+
+    def apply(self, block, stats=None):
+        return kernels.reclassify(block, self.remap, self.dtype)
@@ -0,0 +1,110 @@
+#-------------------------------------------------------------------------------
+# Name:        cache
+# Purpose:     incremental rebuilds. Every stage gets a key made from its
+#              parameters, the keys of the stages it reads from and a content
+#              hash of any raw input files. If the key matches what the last
+#              run recorded and the outputs are still there, the stage is
+#              skipped. State lives in a small JSON file next to the gdb.
+#-------------------------------------------------------------------------------
+import fnmatch
+import glob
+import hashlib
+import json
+import os
+
+
+def _hash_files(paths, memo):
+    #sha1 over file contents, memoised on (size, mtime) so big unchanged
+    #inputs are only read once
+    digest = hashlib.sha1()
+    for path in sorted(paths):
+        st = os.stat(path)
+        seen = memo.get(path)
+        if seen and seen[0] == st.st_size and seen[1] == st.st_mtime_ns:
+            sha = seen[2]
+        else:
+            h = hashlib.sha1()
+            with open(path, "rb") as f:
+                for chunk in iter(lambda: f.read(1 << 20), b""):
+                    h.update(chunk)
+            sha = h.hexdigest()
+            memo[path] = [st.st_size, st.st_mtime_ns, sha]
+        digest.update(os.path.basename(path).encode())
+        digest.update(sha.encode())
+    return digest.hexdigest()
+
+
+def dataset_files(path):
+    #all the files making up a dataset: a folder (esri grid, gdb) is walked,
+    #a shapefile-style path picks up every sidecar sharing its stem
+    if os.path.isdir(path):
+        return [os.path.join(root, f) for root, _, files in os.walk(path) for f in files]
+    stem = os.path.splitext(path)[0]
+    files = [f for f in glob.glob(glob.escape(stem) + ".*") if os.path.isfile(f)]
+    if os.path.isfile(path) and path not in files:
+        files.append(path)
+    return files
+
+
+class StageCache:
+    def __init__(self, state_path, force=False, only=None, exists=os.path.exists):
+        #only: stage name patterns (fnmatch style, e.g. "rescale:*") to rebuild;
+        #everything else is reused whenever its outputs exist
+        self.state_path = state_path
+        self.force = force
+        self.only = list(only or [])
+        self.exists = exists
+        self.state = {"stages": {}, "files": {}}
+        if os.path.exists(state_path) and not force:
+            with open(state_path) as f:
+                self.state = json.load(f)
+
+    def hash_dataset(self, path):
+        files = dataset_files(path)
+        if not files:
+            raise FileNotFoundError(f"No files found for dataset {path}")
+        return _hash_files(files, self.state["files"])
+
+    def key(self, name, params=None, upstream=(), datasets=()):
+        payload = {
+            "stage": name,
+            "params": params,
+            "upstream": list(upstream),
+            "datasets": [self.hash_dataset(d) for d in datasets],
+        }
+        return hashlib.sha1(json.dumps(payload, sort_keys=True, default=str).encode()).hexdigest()
+
+    def selected(self, name):
+        return any(fnmatch.fnmatchcase(name, pattern) for pattern in self.only)
+
+    def is_fresh(self, name, key, outputs):
+        if not all(self.exists(out) for out in outputs):
+            return False
+        if self.only:
+            return not self.selected(name)
+        if self.force:
+            return False
+        return self.state["stages"].get(name, {}).get("key") == key
+
+    def recorded(self, prefix):
+        #{name after the prefix: key} of the stages the last runs recorded,
+        #e.g. recorded("ingest:") for chaining onto an ingest that isn't rerun
+        return {name[len(prefix):]: entry["key"] for name, entry in self.state["stages"].items()
+                if name.startswith(prefix)}
+
+    def record(self, name, key, outputs):
+        self.state["stages"][name] = {"key": key, "outputs": list(outputs)}
+        self.save()
+
+    def save(self):
+        tmp = self.state_path + ".part"
+        with open(tmp, "w") as f:
+            json.dump(self.state, f, indent=1, sort_keys=True)
+        os.replace(tmp, self.state_path)
+
+    def stale(self, name, key, outputs):
+        #True when the stage has to run; says so when it can be skipped
+        if self.is_fresh(name, key, outputs):
+            print(f"[cache] {name} is up to date, skipping.")
+            return False
+        return True
@@ -0,0 +1,31 @@
+#-------------------------------------------------------------------------------
+# Name:        config
+# Purpose:     the project's fixed input layout, shared by the pipeline, batch
+#              runs and the synthetic benchmark data: the input folders under
+#              the project folder, keyed by the prefix their datasets get in
+#              the gdb (D_ab_dem, K_Road, ...), and the final names the
+#              deliverable publishes some of them under.
+#-------------------------------------------------------------------------------
+import os
+
+FOLDERS = {"A": "ATS", "D": "dem", "K": "Kananaskis", "L": "Landcover", "N": os.path.join("NTS", "NTS-50"),
+           "W": "Wildlife"}
+
+#final names for the deliverable; every stage writes straight to these (see publish.py)
+RASTER_RENAMES = [
+    ("Combined_Rasters", "OptimalRoutes"),
+    ("D_ab_dem", "DEM")
+]
+
+FEATURE_RENAMES = [
+    ("K_KCountry_Bo", "KPBoundary"),
+    ("K_Road", "Roads"),
+    ("K_Trails", "Trails"),
+    ("K_Hydro", "Hydrology"),
+    ("W_Bear_Habita", "Habitats"),
+    ("W_ESA", "ESA"),
+    ("A_Ab_Township", "Townships"),
+    ("N_NTS50", "NTS")
+]
+
+RENAMES = tuple(RASTER_RENAMES + FEATURE_RENAMES)
@@ -0,0 +1,140 @@
+#-------------------------------------------------------------------------------
+# Name:        crs
+# Purpose:     the handful of coordinate systems the local backend understands
+#              (NAD83/WGS84 geographic, UTM north zones and Alberta 10TM), with
+#              transverse mercator math done in NumPy so whole coordinate
+#              arrays can be projected at once.
+#-------------------------------------------------------------------------------
+import math
+from types import SimpleNamespace
+
+import numpy as np
+
+#GRS80 ellipsoid (NAD83). WGS84 differs by a fraction of a mm, so it's shared
+A = 6378137.0
+F = 1 / 298.257222101
+E2 = F * (2 - F)
+EP2 = E2 / (1 - E2)
+
+GEOGRAPHIC = {
+    4269: "GCS_North_American_1983",
+    4326: "GCS_WGS_1984",
+}
+
+#Alberta 10TM (Forest and Resource flavours only differ in false northing)
+TEN_TM = {
+    3400: ("NAD_1983_10TM_AEP_Forest", -115.0, 0.9992, 500000.0, 0.0),
+    3401: ("NAD_1983_10TM_AEP_Resource", -115.0, 0.9992, 0.0, 0.0),
+}
+
+
+class UnsupportedCRS(ValueError):
+    pass
+
+
+def _tm_params(epsg):
+    #return (name, central meridian, scale factor, false easting, false northing)
+    if epsg in TEN_TM:
+        return TEN_TM[epsg]
+    if 26901 <= epsg <= 26923:
+        zone = epsg - 26900
+        return (f"NAD_1983_UTM_Zone_{zone}N", zone * 6 - 183.0, 0.9996, 500000.0, 0.0)
+    if 32601 <= epsg <= 32660:
+        zone = epsg - 32600
+        return (f"WGS_1984_UTM_Zone_{zone}N", zone * 6 - 183.0, 0.9996, 500000.0, 0.0)
+    raise UnsupportedCRS(f"EPSG:{epsg} is not supported by the local backend")
+
+
+def is_geographic(epsg):
+    return epsg in GEOGRAPHIC
+
+
+def spatial_reference(epsg):
+    #mimics the bits of arcpy.SpatialReference the pipeline looks at
+    if epsg in GEOGRAPHIC:
+        return SimpleNamespace(name=GEOGRAPHIC[epsg], type="Geographic", factoryCode=epsg)
+    name = _tm_params(epsg)[0]
+    return SimpleNamespace(name=name, type="Projected", factoryCode=epsg)
+
+
+def _meridian_arc(phi):
+    e4 = E2 * E2
+    e6 = e4 * E2
+    return A * ((1 - E2 / 4 - 3 * e4 / 64 - 5 * e6 / 256) * phi
+                - (3 * E2 / 8 + 3 * e4 / 32 + 45 * e6 / 1024) * np.sin(2 * phi)
+                + (15 * e4 / 256 + 45 * e6 / 1024) * np.sin(4 * phi)
+                - (35 * e6 / 3072) * np.sin(6 * phi))
+
+
+def tm_forward(lon, lat, lon0, k0, fe, fn):
+    #Snyder (1987) transverse mercator, degrees in, metres out
+    phi = np.radians(lat)
+    lam = np.radians(lon) - math.radians(lon0)
+    sin_phi = np.sin(phi)
+    cos_phi = np.cos(phi)
+    n = A / np.sqrt(1 - E2 * sin_phi ** 2)
+    t = np.tan(phi) ** 2
+    c = EP2 * cos_phi ** 2
+    a = lam * cos_phi
+    m = _meridian_arc(phi)
+    x = k0 * n * (a + (1 - t + c) * a ** 3 / 6
+                  + (5 - 18 * t + t ** 2 + 72 * c - 58 * EP2) * a ** 5 / 120) + fe
+    y = k0 * (m + n * np.tan(phi) * (a ** 2 / 2 + (5 - t + 9 * c + 4 * c ** 2) * a ** 4 / 24
+                                     + (61 - 58 * t + t ** 2 + 600 * c - 330 * EP2) * a ** 6 / 720)) + fn
+    return x, y
+
+
+def tm_inverse(x, y, lon0, k0, fe, fn):
+    m = (np.asarray(y, dtype=float) - fn) / k0
+    e4 = E2 * E2
+    e6 = e4 * E2
+    mu = m / (A * (1 - E2 / 4 - 3 * e4 / 64 - 5 * e6 / 256))
+    e1 = (1 - math.sqrt(1 - E2)) / (1 + math.sqrt(1 - E2))
+    phi1 = (mu + (3 * e1 / 2 - 27 * e1 ** 3 / 32) * np.sin(2 * mu)
+            + (21 * e1 ** 2 / 16 - 55 * e1 ** 4 / 32) * np.sin(4 * mu)
+            + (151 * e1 ** 3 / 96) * np.sin(6 * mu)
+            + (1097 * e1 ** 4 / 512) * np.sin(8 * mu))
+    sin1 = np.sin(phi1)
+    cos1 = np.cos(phi1)
+    c1 = EP2 * cos1 ** 2
+    t1 = np.tan(phi1) ** 2
+    n1 = A / np.sqrt(1 - E2 * sin1 ** 2)
+    r1 = A * (1 - E2) / (1 - E2 * sin1 ** 2) ** 1.5
+    d = (np.asarray(x, dtype=float) - fe) / (n1 * k0)
+    phi = phi1 - (n1 * np.tan(phi1) / r1) * (
+        d ** 2 / 2 - (5 + 3 * t1 + 10 * c1 - 4 * c1 ** 2 - 9 * EP2) * d ** 4 / 24
+        + (61 + 90 * t1 + 298 * c1 + 45 * t1 ** 2 - 252 * EP2 - 3 * c1 ** 2) * d ** 6 / 720)
+    lam = (d - (1 + 2 * t1 + c1) * d ** 3 / 6
+           + (5 - 2 * c1 + 28 * t1 - 3 * c1 ** 2 + 8 * EP2 + 24 * t1 ** 2) * d ** 5 / 120) / cos1
+    return lon0 + np.degrees(lam), np.degrees(phi)
+
+
+def transformer(src_epsg, dst_epsg):
+    #returns fn(x, y) -> (x, y) working on scalars or NumPy arrays
+    if src_epsg == dst_epsg or (is_geographic(src_epsg) and is_geographic(dst_epsg)):
+        return lambda x, y: (np.asarray(x, dtype=float), np.asarray(y, dtype=float))
+
+    if is_geographic(src_epsg):
+        to_geo = lambda x, y: (np.asarray(x, dtype=float), np.asarray(y, dtype=float))
+    else:
+        src = _tm_params(src_epsg)[1:]
+        to_geo = lambda x, y: tm_inverse(x, y, *src)
+
+    if is_geographic(dst_epsg):
+        return to_geo
+    dst = _tm_params(dst_epsg)[1:]
+
+    def fn(x, y):
+        lon, lat = to_geo(x, y)
+        return tm_forward(lon, lat, *dst)
+    return fn
+
+
+def transform_bounds(box, src_epsg, dst_epsg, n=64):
+    #bbox in dst of a src bbox, edges densified so curved sides are covered
+    xmin, ymin, xmax, ymax = box
+    t = np.linspace(0, 1, n)
+    xs = np.concatenate([xmin + t * (xmax - xmin), np.full(n, xmax), xmax - t * (xmax - xmin), np.full(n, xmin)])
+    ys = np.concatenate([np.full(n, ymax), ymax - t * (ymax - ymin), np.full(n, ymin), ymin + t * (ymax - ymin)])
+    tx, ty = transformer(src_epsg, dst_epsg)(xs, ys)
+    return (float(tx.min()), float(ty.min()), float(tx.max()), float(ty.max()))
@@ -0,0 +1,249 @@
+#-------------------------------------------------------------------------------
+# Name:        dag
+# Purpose:     the pipeline as a graph of named stages. Every Stage declares
+#              the datasets it reads and writes, and a stage is ready as soon
+#              as the stages producing its inputs are done, so independent work
+#              (the three distance surfaces, ruggedness, the landcover reclass,
+#              the NTS overlay) runs side by side instead of in script order.
+#              CPU-bound stages go to a process pool and I/O-bound ones to a
+#              thread pool, never more than `workers` at once. Cache keys chain
+#              along the edges (a stage's key covers its parameters and the keys
+#              of its inputs), and plan() prints the waves and the critical
+#              path of a run without running anything.
+#-------------------------------------------------------------------------------
+import fnmatch
+import json
+import os
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, ThreadPoolExecutor, wait
+from dataclasses import dataclass
+
+from .profiling import Profiler
+
+KINDS = ("process", "thread")
+
+
+@dataclass(frozen=True)
+class Stage:
+    name: str
+    #called as fn(*args); in a worker process for "process" stages, so it has
+    #to be a module level function and the args picklable
+    fn: object
+    inputs: tuple = ()
+    outputs: tuple = ()
+    kind: str = "process"
+    args: tuple = ()
+    #hashed into the cache key along with the input keys
+    params: dict = None
+    #raw files hashed into the key as well (e.g. a boundary shapefile)
+    datasets: tuple = ()
+    #fn also gets record=, its profile record, to fill in what only it knows
+    #(e.g. the cells it wrote)
+    record: bool = False
+
+
+def _call(name, fn, args, inputs=(), record=False):
+    #runs wherever the stage was sent; the records travel back to the parent.
+    #inputs are the paths of the datasets the stage reads, for input_bytes
+    profiler = Profiler()
+    with profiler.stage(name, inputs) as entry:
+        result = fn(*args, record=entry) if record else fn(*args)
+    return result, profiler.records
+
+
+def stage_costs(log_path):
+    #{stage: mean wall seconds} over the successful runs in a profile log, for
+    #the critical path; missing or unreadable logs just give no estimates
+    totals = {}
+    try:
+        with open(log_path) as f:
+            for line in f:
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    continue
+                if record.get("status") == "ok" and record.get("wall_s") is not None:
+                    totals.setdefault(record["stage"], []).append(record["wall_s"])
+    except OSError:
+        return {}
+    return {name: sum(walls) / len(walls) for name, walls in totals.items()}
+
+
+class Pipeline:
+    #dataset names are matched case-insensitively, like arcpy's
+    def __init__(self, stages=()):
+        self.stages = {}
+        self.producers = {}
+        for stage in stages:
+            self.add(stage)
+
+    def add(self, stage):
+        if stage.kind not in KINDS:
+            raise ValueError(f"Stage {stage.name} has kind {stage.kind!r}, expected one of {KINDS}")
+        if stage.name in self.stages:
+            raise ValueError(f"Duplicate stage {stage.name}")
+        for out in stage.outputs:
+            other = self.producers.get(out.lower())
+            if other:
+                raise ValueError(f"{out} is written by both {other} and {stage.name}")
+        self.stages[stage.name] = stage
+        self.producers.update({out.lower(): stage.name for out in stage.outputs})
+        return stage
+
+    def upstream(self, name):
+        stage = self.stages[name]
+        found = [self.producers.get(i.lower()) for i in stage.inputs]
+        return sorted({p for p in found if p and p != name})
+
+    def matching(self, patterns):
+        #stage names matching any of the fnmatch patterns (e.g. "rescale:*"), in order
+        return [name for name in self.order() if any(fnmatch.fnmatchcase(name, p) for p in patterns)]
+
+    def sources(self):
+        #inputs no stage makes: they have to exist before the run
+        found = {i.lower(): i for s in self.stages.values() for i in s.inputs if i.lower() not in self.producers}
+        return sorted(found.values())
+
+    def order(self):
+        #topological order, ties kept in the order the stages were added
+        remaining = {name: set(self.upstream(name)) for name in self.stages}
+        order = []
+        while remaining:
+            ready = [name for name, deps in remaining.items() if not deps]
+            if not ready:
+                raise ValueError(f"Stages depend on each other in a cycle: {sorted(remaining)}")
+            for name in ready:
+                del remaining[name]
+                for deps in remaining.values():
+                    deps.discard(name)
+            order.extend(ready)
+        return order
+
+    def waves(self):
+        #[[stage, ...], ...]: each wave only needs the ones before it
+        level = {}
+        for name in self.order():
+            level[name] = 1 + max((level[u] for u in self.upstream(name)), default=-1)
+        out = [[] for _ in range(max(level.values(), default=-1) + 1)]
+        for name, n in level.items():
+            out[n].append(name)
+        return out
+
+    def critical_path(self, costs=None):
+        #(seconds, [stage, ...]) of the longest chain; stages without a cost
+        #count as one second
+        costs = costs or {}
+        best = {}
+        for name in self.order():
+            cost = costs.get(name, 1.0)
+            prev = max(((best[u][0], u) for u in self.upstream(name)), default=(0.0, None))
+            best[name] = (prev[0] + cost, prev[1])
+        if not best:
+            return 0.0, []
+        name = max(best, key=lambda n: best[n][0])
+        total, path = best[name][0], []
+        while name:
+            path.append(name)
+            name = best[name][1]
+        return total, path[::-1]
+
+    def plan(self, costs=None, workers=None):
+        #what a run would do, as text: the waves, then the critical path
+        costs = costs or {}
+        cost = lambda name: costs.get(name, 1.0)
+        lines = [f"{len(self.stages)} stages from {len(self.sources())} inputs"
+                 + (f", at most {workers} at once" if workers else "")]
+        for n, wave in enumerate(self.waves(), 1):
+            lines.append(f"wave {n}: " + ", ".join(f"{s} ({self.stages[s].kind})" for s in wave))
+        total, path = self.critical_path(costs)
+        serial = sum(cost(name) for name in self.stages)
+        lines.append(f"critical path: {total:.1f} s of {serial:.1f} s of stage time"
+                     + ("" if costs else " (no timings yet, every stage counted as 1 s)"))
+        for name in path:
+            lines.append(f"  {name:<36} {cost(name):>9.1f} s")
+        return "\n".join(lines)
+
+    def keys(self, cache, sources=None):
+        #{stage: cache key}, chained through the inputs; sources gives the keys
+        #of datasets made before the run (e.g. by ingest)
+        sources = {k.lower(): v for k, v in (sources or {}).items()}
+        keys = {}
+        for name in self.order():
+            stage = self.stages[name]
+            upstream = [keys[self.producers[i.lower()]] if i.lower() in self.producers else sources.get(i.lower())
+                        for i in stage.inputs]
+            keys[name] = cache.key(name, stage.params, upstream, datasets=stage.datasets)
+        return keys
+
+    def run(self, workers=None, cache=None, profiler=None, sources=None, resolve=None, select=None):
+        #run every stage that isn't fresh in the cache, as many at once as
+        #`workers` allows; returns {stage: what its fn returned} for the ones
+        #that ran. resolve turns a dataset name into its path, for the cache and the profile.
+        #select (stage name patterns) runs only the matching stages and takes
+        #the outputs of the rest as already there. After a failure nothing new
+        #is started, what is running is let finish, and the first error is raised
+        profiler = profiler or Profiler()
+        resolve = resolve or (lambda name: name)
+        workers = max(1, workers or os.cpu_count() or 1)
+        keys = self.keys(cache, sources) if cache else {}
+        outputs = lambda stage: [resolve(out) for out in stage.outputs]
+        call = lambda stage: (stage.name, stage.fn, stage.args, [resolve(i) for i in stage.inputs], stage.record)
+        pending = self.order() if select is None else self.matching(select)
+        results, done, errors = {}, set(self.stages) - set(pending), []
+        running = {}
+        pools = {}
+
+        def finish(name, outcome):
+            result, records = outcome
+            for record in records:
+                profiler.add(record)
+            if cache:
+                cache.record(name, keys[name], outputs(self.stages[name]))
+            results[name] = result
+            done.add(name)
+
+        def launch():
+            #start ready stages until the budget is used; fresh ones complete
+            #on the spot and may make more stages ready, so go round again
+            started = True
+            while started and not errors:
+                started = False
+                for name in list(pending):
+                    if len(running) >= workers:
+                        return
+                    if not all(u in done for u in self.upstream(name)):
+                        continue
+                    stage = self.stages[name]
+                    pending.remove(name)
+                    started = True
+                    if cache and not cache.stale(name, keys[name], outputs(stage)):
+                        done.add(name)
+                    elif workers == 1:
+                        try:
+                            finish(name, _call(*call(stage)))
+                        except Exception as e:
+                            errors.append((name, e))
+                            return
+                    else:
+                        if stage.kind not in pools:
+                            pools[stage.kind] = (ProcessPoolExecutor if stage.kind == "process"
+                                                 else ThreadPoolExecutor)(max_workers=workers)
+                        running[pools[stage.kind].submit(_call, *call(stage))] = name
+
+        try:
+            launch()
+            while running:
+                finished, _ = wait(running, return_when=FIRST_COMPLETED)
+                for future in finished:
+                    name = running.pop(future)
+                    try:
+                        finish(name, future.result())
+                    except Exception as e:
+                        print(f"Stage {name} failed: {e}")
+                        errors.append((name, e))
+                launch()
+        finally:
+            for pool in pools.values():
+                pool.shutdown()
+        if errors:
+            raise errors[0][1]
+        return results
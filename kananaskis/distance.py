@@ -0,0 +1,173 @@
+#-------------------------------------------------------------------------------
+# Name:        distance
+# Purpose:     Euclidean distance surfaces for the proximity factors (roads,
+#              trails, hydrology, ...). All source layers are burned once into
+#              a single bit-packed grid (one bit per layer), then each layer
+#              gets an exact linear-time distance transform (Meijster column
+#              scan + Felzenszwalb/Huttenlocher lower envelope per row),
+#              vectorised across rows/columns in NumPy. Layers can run in
+#              parallel worker processes.
+#-------------------------------------------------------------------------------
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+from . import geometry, rasterize
+from .features import read_features
+from .grid import write_raster
+
+MAX_LAYERS = 64
+
+
+def _burn_lines(mask, parts, grid, value):
+    #mark every cell a line passes through (sampled at a quarter cell)
+    for part in parts:
+        pts = np.asarray(part, dtype=float)
+        if len(pts) == 0:
+            continue
+        if len(pts) == 1:
+            pts = np.vstack([pts, pts])
+        seg = np.diff(pts, axis=0)
+        steps = np.maximum(1, np.ceil(np.hypot(seg[:, 0], seg[:, 1]) / (grid.cell / 4)).astype(np.int64))
+        idx = np.repeat(np.arange(len(seg)), steps)
+        t = (np.arange(steps.sum()) - np.repeat(np.cumsum(steps) - steps, steps)) / np.repeat(steps, steps)
+        xs = np.concatenate([pts[idx, 0] + t * seg[idx, 0], pts[-1:, 0]])
+        ys = np.concatenate([pts[idx, 1] + t * seg[idx, 1], pts[-1:, 1]])
+        rows = np.floor((grid.ymax - ys) / grid.cell).astype(np.int64)
+        cols = np.floor((xs - grid.xmin) / grid.cell).astype(np.int64)
+        ok = (rows >= 0) & (rows < grid.nrows) & (cols >= 0) & (cols < grid.ncols)
+        mask[rows[ok], cols[ok]] |= value
+
+
+def burn_sources(layers, grid):
+    #layers: {name: [geometry, ...]} -> (uint64 bit grid, {name: bit})
+    if len(layers) > MAX_LAYERS:
+        raise ValueError(f"At most {MAX_LAYERS} source layers can share one grid")
+    dtype = np.uint8 if len(layers) <= 8 else np.uint64
+    bits = np.zeros(grid.shape, dtype=dtype)
+    index = {}
+    for i, (name, geoms) in enumerate(layers.items()):
+        bit = dtype(1 << i)
+        index[name] = bit
+        for geom in geoms:
+            if geom is None:
+                continue
+            polys = geometry.polygons(geom)
+            if polys:
+                bits[rasterize.polygon_mask(geom, grid)] |= bit
+                _burn_lines(bits, [ring for poly in polys for ring in poly], grid, bit)
+            else:
+                _burn_lines(bits, geometry.lines(geom) or [[p] for p in geometry.points(geom)], grid, bit)
+    return bits, index
+
+
+def _column_pass(mask):
+    #squared distance (in cells) to the nearest source in the same column
+    nrows, ncols = mask.shape
+    big = float(nrows + ncols) ** 2 * 2 + 1
+    g = np.full(mask.shape, np.inf)
+    run = np.full(ncols, np.inf)
+    for r in range(nrows):
+        run = np.where(mask[r], 0.0, run + 1)
+        g[r] = run
+    run = np.full(ncols, np.inf)
+    for r in range(nrows - 1, -1, -1):
+        run = np.where(mask[r], 0.0, run + 1)
+        np.minimum(g[r], run, out=g[r])
+    g = g ** 2
+    g[~np.isfinite(g)] = big
+    return g, big
+
+
+def _row_pass(f):
+    #Felzenszwalb/Huttenlocher lower envelope of parabolas, run for every
+    #row at once: each row keeps its own stack (v, h = f[v] + v^2, z) and
+    #pointer k. Stacks live in flat arrays so lookups are 1-d gathers
+    nrows, n = f.shape
+    base = np.arange(nrows, dtype=np.int64) * n
+    zbase = np.arange(nrows, dtype=np.int64) * (n + 1)
+    v = np.zeros(nrows * n, dtype=np.int64)
+    h = np.empty(nrows * n)
+    z = np.empty(nrows * (n + 1))
+    h[base] = f[:, 0]
+    z[zbase] = -np.inf
+    z[zbase + 1] = np.inf
+    k = np.zeros(nrows, dtype=np.int64)
+    for q in range(1, n):
+        fq = f[:, q] + q * q
+        active = np.arange(nrows)
+        while len(active):
+            ka = k[active]
+            at = base[active] + ka
+            s = (fq[active] - h[at]) / (2.0 * (q - v[at]))
+            pop = s <= z[zbase[active] + ka]
+            if pop.any():
+                k[active[pop]] -= 1
+                keep = ~pop
+                done, sd = active[keep], s[keep]
+                active = active[pop]
+            else:
+                done, sd = active, s
+                active = active[:0]
+            kd = k[done] + 1
+            k[done] = kd
+            v[base[done] + kd] = q
+            h[base[done] + kd] = fq[done]
+            z[zbase[done] + kd] = sd
+            z[zbase[done] + kd + 1] = np.inf
+    d = np.empty_like(f)
+    k[:] = 0
+    for q in range(n):
+        behind = z[zbase + k + 1] < q
+        while behind.any():
+            k[behind] += 1
+            behind = z[zbase + k + 1] < q
+        at = base + k
+        d[:, q] = (q - v[at]) ** 2 + h[at] - v[at] ** 2
+    return d
+
+
+def edt(mask, cell=1.0):
+    #exact Euclidean distance from every cell centre to the nearest True cell
+    if not mask.any():
+        return np.full(mask.shape, np.inf)
+    g, big = _column_pass(mask)
+    d = _row_pass(g)
+    out = np.sqrt(d) * cell
+    out[d >= big] = np.inf
+    return out
+
+
+def _layer_distance(mask, cell):
+    return edt(mask, cell).astype(np.float32)
+
+
+def distance_surfaces(layers, grid, workers=1):
+    #{name: geometries} -> {name: float32 distance array}; one burn, one EDT
+    #per layer, spread over `workers` processes when asked
+    bits, index = burn_sources(layers, grid)
+    masks = {name: (bits & bit) != 0 for name, bit in index.items()}
+    del bits
+    if workers is None:
+        workers = min(len(masks), os.cpu_count() or 1)
+    if workers <= 1 or len(masks) <= 1:
+        return {name: _layer_distance(mask, grid.cell) for name, mask in masks.items()}
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        futures = {name: pool.submit(_layer_distance, mask, grid.cell) for name, mask in masks.items()}
+        return {name: future.result() for name, future in futures.items()}
+
+
+def write_distance_rasters(workspace, sources, grid, workers=1):
+    #sources: {out raster name: source feature class name}, all in workspace
+    layers = {}
+    for out_name, fc in sources.items():
+        feats, epsg = read_features(os.path.join(workspace, fc + ".geojson"))
+        if epsg != grid.epsg:
+            raise ValueError(f"{fc} is EPSG:{epsg}, distance grid is EPSG:{grid.epsg}")
+        layers[out_name] = [f.get("geometry") for f in feats]
+    for out_name, dist in distance_surfaces(layers, grid, workers).items():
+        dist[np.isinf(dist)] = np.nan
+        write_raster(os.path.join(workspace, out_name), dist, grid, float("nan"))
+    return list(layers)
+
@@ -0,0 +1,36 @@
+#-------------------------------------------------------------------------------
+# Name:        features
+# Purpose:     local vector storage for the NumPy backend: one GeoJSON
+#              FeatureCollection per feature class, with the EPSG code kept in
+#              the (old style) "crs" member so datasets don't need to be in
+#              WGS84 like RFC 7946 wants.
+#-------------------------------------------------------------------------------
+import json
+import os
+
+FEATURE_EXT = ".geojson"
+
+
+def read_features(path):
+    #returns (features, epsg) where features are GeoJSON feature dicts
+    with open(path) as f:
+        data = json.load(f)
+    name = data.get("crs", {}).get("properties", {}).get("name", "EPSG:4326")
+    epsg = int(name.split(":")[-1])
+    return data.get("features", []), epsg
+
+
+def write_features(path, features, epsg):
+    data = {
+        "type": "FeatureCollection",
+        "crs": {"type": "name", "properties": {"name": f"EPSG:{epsg}"}},
+        "features": list(features),
+    }
+    tmp = path + ".part"
+    with open(tmp, "w") as f:
+        json.dump(data, f)
+    os.replace(tmp, path)
+
+
+def feature(geometry, **properties):
+    return {"type": "Feature", "geometry": geometry, "properties": properties}
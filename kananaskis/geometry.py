@@ -0,0 +1,441 @@
+#-------------------------------------------------------------------------------
+# Name:        geometry
+# Purpose:     small pure-Python/NumPy geometry toolkit used by the local
+#              backend. Geometries are GeoJSON-style dicts, e.g.
+#              {"type": "Polygon", "coordinates": [[[x, y], ...], ...]}.
+#-------------------------------------------------------------------------------
+import numpy as np
+
+
+def polygons(geom):
+    #every polygon in the geometry as a list of rings
+    if geom is None:
+        return []
+    if geom["type"] == "Polygon":
+        return [geom["coordinates"]]
+    if geom["type"] == "MultiPolygon":
+        return list(geom["coordinates"])
+    return []
+
+
+def lines(geom):
+    if geom is None:
+        return []
+    if geom["type"] == "LineString":
+        return [geom["coordinates"]]
+    if geom["type"] == "MultiLineString":
+        return list(geom["coordinates"])
+    return []
+
+
+def points(geom):
+    if geom is None:
+        return []
+    if geom["type"] == "Point":
+        return [geom["coordinates"]]
+    if geom["type"] == "MultiPoint":
+        return list(geom["coordinates"])
+    return []
+
+
+def shape_type(geom):
+    #arcpy-style shape type names
+    kind = geom["type"].replace("Multi", "") if geom else ""
+    return {"Point": "Point", "LineString": "Polyline", "Polygon": "Polygon"}.get(kind, "Null")
+
+
+def _coords(geom):
+    if geom["type"] in ("Point",):
+        return [geom["coordinates"]]
+    if geom["type"] in ("MultiPoint", "LineString"):
+        return geom["coordinates"]
+    if geom["type"] in ("MultiLineString", "Polygon"):
+        return [c for part in geom["coordinates"] for c in part]
+    return [c for poly in geom["coordinates"] for ring in poly for c in ring]
+
+
+def bounds(geom):
+    coords = _coords(geom)
+    if not len(coords):
+        return None
+    if len(coords) < 256:
+        #plain Python beats NumPy's array setup on township-sized rings
+        xs = [c[0] for c in coords]
+        ys = [c[1] for c in coords]
+        return (float(min(xs)), float(min(ys)), float(max(xs)), float(max(ys)))
+    pts = np.asarray(coords, dtype=float)
+    return (float(pts[:, 0].min()), float(pts[:, 1].min()),
+            float(pts[:, 0].max()), float(pts[:, 1].max()))
+
+
+def union_bounds(boxes):
+    boxes = [b for b in boxes if b is not None]
+    if not boxes:
+        return None
+    return (min(b[0] for b in boxes), min(b[1] for b in boxes),
+            max(b[2] for b in boxes), max(b[3] for b in boxes))
+
+
+def bbox_intersects(a, b):
+    return not (a[2] < b[0] or b[2] < a[0] or a[3] < b[1] or b[3] < a[1])
+
+
+def transform(geom, fn):
+    #apply fn(xs, ys) -> (xs, ys) to every vertex of the geometry
+    def _apply(seq):
+        arr = np.asarray(seq, dtype=float)
+        if arr.size == 0:
+            return []
+        x, y = fn(arr[:, 0], arr[:, 1])
+        return np.column_stack([x, y]).tolist()
+
+    kind = geom["type"]
+    coords = geom["coordinates"]
+    if kind == "Point":
+        out = _apply([coords])[0]
+    elif kind in ("MultiPoint", "LineString"):
+        out = _apply(coords)
+    elif kind in ("MultiLineString", "Polygon"):
+        out = [_apply(part) for part in coords]
+    else:
+        out = [[_apply(ring) for ring in poly] for poly in coords]
+    return {"type": kind, "coordinates": out}
+
+
+def ring_area(ring):
+    #signed shoelace area, positive when counter-clockwise
+    pts = np.asarray(ring, dtype=float)
+    if len(pts) < 3:
+        return 0.0
+    x, y = pts[:, 0], pts[:, 1]
+    return 0.5 * float(np.dot(x, np.roll(y, -1)) - np.dot(np.roll(x, -1), y))
+
+
+def area(geom):
+    total = 0.0
+    for poly in polygons(geom):
+        total += abs(ring_area(poly[0])) - sum(abs(ring_area(r)) for r in poly[1:])
+    return total
+
+
+def length(geom):
+    total = 0.0
+    parts = lines(geom) or [ring for poly in polygons(geom) for ring in poly]
+    for part in parts:
+        pts = np.asarray(part, dtype=float)
+        if len(pts) > 1:
+            total += float(np.hypot(*np.diff(pts, axis=0).T).sum())
+    return total
+
+
+def _edges(rings):
+    segs = []
+    for ring in rings:
+        pts = np.asarray(ring, dtype=float)
+        if len(pts) < 2:
+            continue
+        if not np.array_equal(pts[0], pts[-1]):
+            pts = np.vstack([pts, pts[:1]])
+        segs.append(np.hstack([pts[:-1], pts[1:]]))
+    if not segs:
+        return np.empty((0, 4))
+    return np.vstack(segs)
+
+
+def _open_ring(ring):
+    pts = [tuple(p[:2]) for p in ring]
+    if len(pts) > 1 and pts[0] == pts[-1]:
+        pts = pts[:-1]
+    return pts
+
+
+def _close(ring):
+    ring = [list(p) for p in ring]
+    return ring + [ring[0]] if ring and ring[0] != ring[-1] else ring
+
+
+def _cross(o, a, b):
+    return (a[0] - o[0]) * (b[1] - o[1]) - (a[1] - o[1]) * (b[0] - o[0])
+
+
+def triangulate(ring):
+    #ear clipping of a simple ring into counter-clockwise triangles
+    pts = _open_ring(ring)
+    if ring_area(pts) < 0:
+        pts = pts[::-1]
+    idx = list(range(len(pts)))
+    triangles = []
+    guard = 0
+    while len(idx) > 3 and guard < 4 * len(pts) ** 2:
+        guard += 1
+        n = len(idx)
+        found = False
+        reflex = [i for k, i in enumerate(idx)
+                  if _cross(pts[idx[k - 1]], pts[i], pts[idx[(k + 1) % n]]) <= 0]
+        for k in range(n):
+            a, b, c = pts[idx[k - 1]], pts[idx[k]], pts[idx[(k + 1) % n]]
+            turn = _cross(a, b, c)
+            if turn == 0:
+                #collinear vertex, just drop it
+                idx.pop(k)
+                found = True
+                break
+            if turn < 0:
+                continue
+            inside = False
+            for r in reflex:
+                p = pts[r]
+                if r in (idx[k - 1], idx[k], idx[(k + 1) % n]):
+                    continue
+                if _cross(a, b, p) >= 0 and _cross(b, c, p) >= 0 and _cross(c, a, p) >= 0:
+                    inside = True
+                    break
+            if not inside:
+                triangles.append([a, b, c])
+                idx.pop(k)
+                found = True
+                break
+        if not found:
+            #degenerate input, cut the first vertex rather than spin forever
+            triangles.append([pts[idx[-1]], pts[idx[0]], pts[idx[1]]])
+            idx.pop(0)
+    if len(idx) == 3 and _cross(*[pts[i] for i in idx]) != 0:
+        triangles.append([pts[i] for i in idx])
+    return triangles
+
+
+def clip_ring_convex(ring, convex):
+    #Sutherland-Hodgman clip of a ring against a counter-clockwise convex ring
+    out = _open_ring(ring)
+    clip = _open_ring(convex)
+    for i in range(len(clip)):
+        if not out:
+            break
+        a, b = clip[i - 1], clip[i]
+        src, out = out, []
+        for j in range(len(src)):
+            p, q = src[j - 1], src[j]
+            p_in = _cross(a, b, p) >= 0
+            q_in = _cross(a, b, q) >= 0
+            if q_in:
+                if not p_in:
+                    out.append(_intersect(p, q, a, b))
+                out.append(q)
+            elif p_in:
+                out.append(_intersect(p, q, a, b))
+    return out
+
+
+def _intersect(p, q, a, b):
+    dx, dy = q[0] - p[0], q[1] - p[1]
+    ex, ey = b[0] - a[0], b[1] - a[1]
+    denom = dx * ey - dy * ex
+    if denom == 0:
+        return q
+    t = ((a[0] - p[0]) * ey - (a[1] - p[1]) * ex) / denom
+    return (p[0] + t * dx, p[1] + t * dy)
+
+
+class Boundary:
+    #a clip/mask polygon prepared for repeated point, line and polygon tests.
+    #holes in the boundary are respected for points and lines; polygon clipping
+    #uses the outer rings only (fine for park-style boundaries)
+    def __init__(self, geom):
+        self.geom = geom
+        self.polygons = polygons(geom)
+        self.bounds = bounds(geom)
+        self.edges = _edges([ring for poly in self.polygons for ring in poly])
+        self._triangles = None
+
+    @property
+    def triangles(self):
+        if self._triangles is None:
+            tris = []
+            for poly in self.polygons:
+                tris.extend(triangulate(poly[0]))
+            self._triangles = [(t, bounds({"type": "LineString", "coordinates": t})) for t in tris]
+        return self._triangles
+
+    def contains_many(self, xs, ys):
+        #even-odd crossing test, vectorised over points and edges together
+        #(in chunks, so a few points don't pay one NumPy call per edge)
+        xs = np.asarray(xs, dtype=float)
+        ys = np.asarray(ys, dtype=float)
+        shape = xs.shape
+        xs, ys = xs.ravel(), ys.ravel()
+        inside = np.zeros(xs.shape, dtype=bool)
+        e = self.edges[self.edges[:, 1] != self.edges[:, 3]] if len(self.edges) else self.edges
+        if len(e) == 0:
+            return inside.reshape(shape)
+        x1, y1, y2 = e[:, 0], e[:, 1], e[:, 3]
+        slope = (e[:, 2] - x1) / (y2 - y1)
+        step = max(1, 4_000_000 // len(e))
+        for i in range(0, len(xs), step):
+            x, y = xs[i:i + step, None], ys[i:i + step, None]
+            hits = ((y1 > y) != (y2 > y)) & (x < x1 + (y - y1) * slope)
+            inside[i:i + step] = np.count_nonzero(hits, axis=1) & 1
+        return inside.reshape(shape)
+
+    def contains(self, x, y):
+        return bool(self.contains_many([x], [y])[0])
+
+    def _crossings(self, p, q):
+        #parameters along p->q where the segment crosses a boundary edge
+        e = self.edges
+        if len(e) == 0:
+            return np.empty(0)
+        rx, ry = q[0] - p[0], q[1] - p[1]
+        sx, sy = e[:, 2] - e[:, 0], e[:, 3] - e[:, 1]
+        denom = rx * sy - ry * sx
+        ok = denom != 0
+        qpx, qpy = e[:, 0] - p[0], e[:, 1] - p[1]
+        with np.errstate(divide="ignore", invalid="ignore"):
+            t = (qpx * sy - qpy * sx) / denom
+            u = (qpx * ry - qpy * rx) / denom
+        hit = ok & (t > 0) & (t < 1) & (u >= 0) & (u <= 1)
+        return t[hit]
+
+    def _crossings_many(self, p, q):
+        #every (segment index, t) where segments p[i]->q[i] cross an edge
+        e = self.edges
+        if len(e) == 0 or len(p) == 0:
+            return np.empty(0, dtype=np.int64), np.empty(0)
+        sx, sy = e[:, 2] - e[:, 0], e[:, 3] - e[:, 1]
+        segs, ts = [], []
+        step = max(1, 4_000_000 // len(e))
+        for i in range(0, len(p), step):
+            pp, qq = p[i:i + step], q[i:i + step]
+            rx, ry = qq[:, 0:1] - pp[:, 0:1], qq[:, 1:2] - pp[:, 1:2]
+            qpx, qpy = e[None, :, 0] - pp[:, 0:1], e[None, :, 1] - pp[:, 1:2]
+            denom = rx * sy - ry * sx
+            with np.errstate(divide="ignore", invalid="ignore"):
+                t = (qpx * sy - qpy * sx) / denom
+                u = (qpx * ry - qpy * rx) / denom
+            r, c = np.nonzero((denom != 0) & (t > 0) & (t < 1) & (u >= 0) & (u <= 1))
+            segs.append(r + i)
+            ts.append(t[r, c])
+        return np.concatenate(segs), np.concatenate(ts)
+
+    def _segment_crosses(self, ring):
+        pts = _close(_open_ring(ring))
+        for p, q in zip(pts[:-1], pts[1:]):
+            if len(self._crossings(p, q)):
+                return True
+        return False
+
+    def clip(self, geom):
+        #clip any geometry to the boundary, None when nothing is left
+        if geom is None:
+            return None
+        box = bounds(geom)
+        if box is None or not bbox_intersects(box, self.bounds):
+            return None
+        kind = geom["type"]
+        if kind in ("Point", "MultiPoint"):
+            pts = np.asarray(points(geom), dtype=float)
+            keep = pts[self.contains_many(pts[:, 0], pts[:, 1])].tolist()
+            if not keep:
+                return None
+            return {"type": "Point", "coordinates": keep[0]} if kind == "Point" and len(keep) == 1 \
+                else {"type": "MultiPoint", "coordinates": keep}
+        if kind in ("LineString", "MultiLineString"):
+            parts = []
+            for line in lines(geom):
+                parts.extend(self._clip_line(line))
+            if not parts:
+                return None
+            return {"type": "LineString", "coordinates": parts[0]} if len(parts) == 1 \
+                else {"type": "MultiLineString", "coordinates": parts}
+        return self._clip_polygons(geom)
+
+    def _clip_line(self, line):
+        #cut every segment at its boundary crossings, test all the pieces'
+        #midpoints at once, then stitch runs of inside pieces back together
+        pts = np.asarray(line, dtype=float)
+        if len(pts) < 2:
+            return []
+        p, q = pts[:-1], pts[1:]
+        cross_seg, cross_t = self._crossings_many(p, q)
+        n = len(p)
+        seg = np.concatenate([np.arange(n), np.arange(n), cross_seg])
+        t = np.concatenate([np.zeros(n), np.ones(n), cross_t])
+        order = np.lexsort((t, seg))
+        seg, t = seg[order], t[order]
+        keep = (seg[1:] == seg[:-1]) & (t[1:] - t[:-1] > 1e-12)
+        s, t0, t1 = seg[:-1][keep], t[:-1][keep], t[1:][keep]
+        d = q[s] - p[s]
+        a = p[s] + t0[:, None] * d
+        b = p[s] + t1[:, None] * d
+        mid = (a + b) / 2
+        inside = self.contains_many(mid[:, 0], mid[:, 1])
+
+        out, current = [], []
+        for start, end, ok in zip(a.tolist(), b.tolist(), inside.tolist()):
+            if ok:
+                if not current:
+                    current = [start]
+                current.append(end)
+            elif current:
+                out.append(current)
+                current = []
+        if current:
+            out.append(current)
+        return [part for part in out if len(part) > 1]
+
+    def _clip_polygons(self, geom):
+        pieces = []
+        for poly in polygons(geom):
+            outer = np.asarray(poly[0], dtype=float)
+            fully_inside = self.contains_many(outer[:, 0], outer[:, 1]).all() \
+                and not self._segment_crosses(poly[0])
+            if fully_inside:
+                pieces.append(poly)
+                continue
+            pbox = bounds({"type": "Polygon", "coordinates": poly})
+            for tri, tbox in self.triangles:
+                if not bbox_intersects(pbox, tbox):
+                    continue
+                ext = clip_ring_convex(poly[0], tri)
+                if len(ext) < 3 or abs(ring_area(ext)) <= 1e-9:
+                    continue
+                holes = []
+                for hole in poly[1:]:
+                    h = clip_ring_convex(hole, tri)
+                    if len(h) >= 3 and abs(ring_area(h)) > 1e-9:
+                        holes.append(_close(h))
+                pieces.append([_close(ext)] + holes)
+        if not pieces:
+            return None
+        if len(pieces) == 1:
+            return {"type": "Polygon", "coordinates": pieces[0]}
+        return {"type": "MultiPolygon", "coordinates": pieces}
+
+
+def _segments_cross(a, b):
+    #does any segment in a (n, 4) cross any segment in b (m, 4)
+    if len(a) == 0 or len(b) == 0:
+        return False
+    px, py = a[:, 0:1], a[:, 1:2]
+    rx, ry = a[:, 2:3] - px, a[:, 3:4] - py
+    qx, qy = b[None, :, 0], b[None, :, 1]
+    sx, sy = b[None, :, 2] - qx, b[None, :, 3] - qy
+    denom = rx * sy - ry * sx
+    with np.errstate(divide="ignore", invalid="ignore"):
+        t = ((qx - px) * sy - (qy - py) * sx) / denom
+        u = ((qx - px) * ry - (qy - py) * rx) / denom
+    return bool(np.any((denom != 0) & (t >= 0) & (t <= 1) & (u >= 0) & (u <= 1)))
+
+
+def intersects(a, b):
+    #polygon/polygon intersection test (touching counts, like arcpy INTERSECT)
+    box_a, box_b = bounds(a), bounds(b)
+    if box_a is None or box_b is None or not bbox_intersects(box_a, box_b):
+        return False
+    ring_a = [r for poly in polygons(a) for r in poly]
+    ring_b = [r for poly in polygons(b) for r in poly]
+    if _segments_cross(_edges(ring_a), _edges(ring_b)):
+        return True
+    #no edges cross, so either one is inside the other or they're apart
+    pa = np.asarray(ring_a[0][0], dtype=float)
+    pb = np.asarray(ring_b[0][0], dtype=float)
+    return Boundary(b).contains(pa[0], pa[1]) or Boundary(a).contains(pb[0], pb[1])
@@ -0,0 +1,287 @@
+#-------------------------------------------------------------------------------
+# Name:        grid
+# Purpose:     local raster storage for the NumPy backend. A raster is a .npy
+#              array (rows run north to south) plus a .json sidecar holding the
+#              grid georeference, so big rasters can be memory-mapped. A raster
+#              can also carry decimated overviews (<name>.ovr<factor>.npy) and
+#              be packed into zlib-compressed tiles (<name>.tiles) while it's
+#              not in use; a packed raster is unpacked again on first read.
+#-------------------------------------------------------------------------------
+import glob
+import json
+import math
+import os
+import zlib
+from dataclasses import dataclass
+
+import numpy as np
+
+RASTER_EXT = ".npy"
+
+
+@dataclass(frozen=True)
+class Grid:
+    xmin: float
+    ymax: float
+    cell: float
+    nrows: int
+    ncols: int
+    epsg: int
+
+    @property
+    def shape(self):
+        return (self.nrows, self.ncols)
+
+    @property
+    def xmax(self):
+        return self.xmin + self.ncols * self.cell
+
+    @property
+    def ymin(self):
+        return self.ymax - self.nrows * self.cell
+
+    @property
+    def extent(self):
+        return (self.xmin, self.ymin, self.xmax, self.ymax)
+
+    @classmethod
+    def from_extent(cls, extent, cell, epsg, snap=None):
+        #smallest grid of `cell` sized cells covering extent, optionally
+        #aligned to another grid's origin (like arcpy.env.snapRaster)
+        xmin, ymin, xmax, ymax = extent
+        if snap is not None:
+            xmin = snap.xmin + math.floor((xmin - snap.xmin) / cell) * cell
+            ymax = snap.ymax - math.floor((snap.ymax - ymax) / cell) * cell
+        ncols = max(1, int(math.ceil((xmax - xmin) / cell - 1e-9)))
+        nrows = max(1, int(math.ceil((ymax - ymin) / cell - 1e-9)))
+        return cls(xmin, ymax, cell, nrows, ncols, epsg)
+
+    def cell_centers(self, rows=None, cols=None):
+        rows = np.arange(self.nrows) if rows is None else np.asarray(rows)
+        cols = np.arange(self.ncols) if cols is None else np.asarray(cols)
+        return self.xmin + (cols + 0.5) * self.cell, self.ymax - (rows + 0.5) * self.cell
+
+    def index(self, x, y):
+        #fractional (row, col) of map coordinates
+        return (self.ymax - np.asarray(y)) / self.cell, (np.asarray(x) - self.xmin) / self.cell
+
+    def window(self, row0, col0, nrows, ncols):
+        return Grid(self.xmin + col0 * self.cell, self.ymax - row0 * self.cell,
+                    self.cell, nrows, ncols, self.epsg)
+
+    def to_json(self):
+        return {"xmin": self.xmin, "ymax": self.ymax, "cell": self.cell,
+                "nrows": self.nrows, "ncols": self.ncols, "epsg": self.epsg}
+
+
+def _base(path):
+    return path[:-len(RASTER_EXT)] if path.endswith(RASTER_EXT) else path
+
+
+def _grid(meta):
+    g = meta["grid"]
+    return Grid(g["xmin"], g["ymax"], g["cell"], g["nrows"], g["ncols"], g["epsg"])
+
+
+def read_meta(path):
+    with open(_base(path) + ".json") as f:
+        return json.load(f)
+
+
+def _write_meta(base, meta):
+    with open(base + ".part.json", "w") as f:
+        json.dump(meta, f)
+    os.replace(base + ".part.json", base + ".json")
+
+
+def raster_files(path):
+    #every file belonging to a raster: data, sidecar, packed tiles, overviews
+    base = _base(path)
+    files = [base + ext for ext in (RASTER_EXT, ".json", ".tiles") if os.path.exists(base + ext)]
+    return files + sorted(glob.glob(glob.escape(base) + ".ovr*" + RASTER_EXT))
+
+
+def _clear_derived(base):
+    #overviews and packed tiles of whatever used to be stored under this name
+    for f in raster_files(base):
+        if f.endswith(".tiles") or ".ovr" in os.path.basename(f):
+            os.remove(f)
+
+
+def read_raster(path, mmap=True):
+    #returns (array, grid, nodata); the array is memory-mapped by default
+    base = _base(path)
+    meta = read_meta(base)
+    if meta.get("packed"):
+        meta = unpack_raster(base)
+    data = np.load(base + RASTER_EXT, mmap_mode="r" if mmap else None)
+    return data, _grid(meta), meta.get("nodata")
+
+
+def read_grid(path):
+    meta = read_meta(path)
+    return _grid(meta), meta.get("nodata")
+
+
+def write_raster(path, array, grid, nodata=None):
+    base = _base(path)
+    _clear_derived(base)
+    np.save(base + ".part" + RASTER_EXT, np.asarray(array))
+    os.replace(base + ".part" + RASTER_EXT, base + RASTER_EXT)
+    _write_meta(base, {"grid": grid.to_json(), "nodata": nodata})
+
+
+def create_raster(path, grid, dtype, nodata=None, fill=None):
+    #allocate an on-disk raster and hand back a writable memmap for block writes
+    base = _base(path)
+    _clear_derived(base)
+    arr = np.lib.format.open_memmap(base + RASTER_EXT, mode="w+", dtype=dtype, shape=grid.shape)
+    if fill is not None:
+        arr[:] = fill
+    _write_meta(base, {"grid": grid.to_json(), "nodata": nodata})
+    return arr
+
+
+def delete_raster(path):
+    for f in raster_files(path):
+        os.remove(f)
+
+
+def overview_grid(grid, factor):
+    return Grid(grid.xmin, grid.ymax, grid.cell * factor, -(-grid.nrows // factor), -(-grid.ncols // factor),
+                grid.epsg)
+
+
+def build_overviews(path, factors=(4, 16), rows_per_block=1024):
+    #one decimated copy per factor: floats get the mean of the valid cells they
+    #cover, integer (class) rasters the cell nearest the centre
+    base = _base(path)
+    data, grid, nodata = read_raster(base)
+    float_data = data.dtype.kind == "f"
+    for factor in factors:
+        ov = overview_grid(grid, factor)
+        out = np.lib.format.open_memmap(f"{base}.ovr{factor}{RASTER_EXT}", mode="w+", dtype=data.dtype,
+                                        shape=ov.shape)
+        step = max(1, rows_per_block // factor) * factor
+        for r0 in range(0, grid.nrows, step):
+            r1 = min(r0 + step, grid.nrows)
+            block = data[r0:r1]
+            o0, nr, nc = r0 // factor, -(-(r1 - r0) // factor), ov.ncols
+            if not float_data:
+                rows = np.minimum(np.arange(nr) * factor + factor // 2, r1 - r0 - 1)
+                cols = np.minimum(np.arange(nc) * factor + factor // 2, grid.ncols - 1)
+                out[o0:o0 + nr] = block[np.ix_(rows, cols)]
+                continue
+            padded = np.full((nr * factor, nc * factor), np.nan)
+            padded[:r1 - r0, :grid.ncols] = block
+            padded[:r1 - r0, :grid.ncols][~valid_mask(block, nodata)] = np.nan
+            tiles = padded.reshape(nr, factor, nc, factor)
+            count = (~np.isnan(tiles)).sum(axis=(1, 3))
+            total = np.nansum(tiles, axis=(1, 3))
+            fill = np.nan if nodata is None else nodata
+            out[o0:o0 + nr] = np.where(count > 0, total / np.maximum(count, 1), fill)
+        out.flush()
+        del out
+    meta = read_meta(base)
+    meta["overviews"] = sorted(set(meta.get("overviews", [])) | set(factors))
+    _write_meta(base, meta)
+    return meta["overviews"]
+
+
+def read_overview(path, factor):
+    #(memmapped array, grid, nodata) of the overview with the given factor
+    base = _base(path)
+    meta = read_meta(base)
+    if factor not in meta.get("overviews", []):
+        raise ValueError(f"{base} has no x{factor} overview (has {meta.get('overviews', [])})")
+    data = np.load(f"{base}.ovr{factor}{RASTER_EXT}", mmap_mode="r")
+    return data, overview_grid(_grid(meta), factor), meta.get("nodata")
+
+
+def pack_raster(path, tile=256, level=6):
+    #compress a raster into zlib tiles and drop the .npy; overviews stay as
+    #they are so previews don't need the full raster back
+    base = _base(path)
+    data, grid, nodata = read_raster(base)
+    offsets = [0]
+    with open(base + ".tiles.part", "wb") as f:
+        for r0 in range(0, grid.nrows, tile):
+            for c0 in range(0, grid.ncols, tile):
+                chunk = zlib.compress(np.ascontiguousarray(data[r0:r0 + tile, c0:c0 + tile]).tobytes(), level)
+                f.write(chunk)
+                offsets.append(offsets[-1] + len(chunk))
+    os.replace(base + ".tiles.part", base + ".tiles")
+    meta = read_meta(base)
+    meta["packed"] = {"tile": tile, "dtype": data.dtype.str, "offsets": offsets}
+    _write_meta(base, meta)
+    del data
+    os.remove(base + RASTER_EXT)
+    return offsets[-1]
+
+
+def _packed_tiles(base, meta, r0=0, r1=None, c0=0, c1=None):
+    #(row0, col0, array) for every packed tile touching the window
+    packed = meta["packed"]
+    grid, tile, dtype = _grid(meta), packed["tile"], np.dtype(packed["dtype"])
+    r1 = grid.nrows if r1 is None else r1
+    c1 = grid.ncols if c1 is None else c1
+    per_row = -(-grid.ncols // tile)
+    offsets = packed["offsets"]
+    with open(base + ".tiles", "rb") as f:
+        for tr in range(r0 // tile, -(-r1 // tile)):
+            for tc in range(c0 // tile, -(-c1 // tile)):
+                i = tr * per_row + tc
+                f.seek(offsets[i])
+                raw = zlib.decompress(f.read(offsets[i + 1] - offsets[i]))
+                rows, cols = min(tile, grid.nrows - tr * tile), min(tile, grid.ncols - tc * tile)
+                yield tr * tile, tc * tile, np.frombuffer(raw, dtype=dtype).reshape(rows, cols)
+
+
+def unpack_raster(path):
+    #back to a plain, memory-mappable .npy; returns the updated sidecar
+    base = _base(path)
+    meta = read_meta(base)
+    grid = _grid(meta)
+    out = np.lib.format.open_memmap(base + ".part" + RASTER_EXT, mode="w+",
+                                    dtype=np.dtype(meta["packed"]["dtype"]), shape=grid.shape)
+    for r0, c0, block in _packed_tiles(base, meta):
+        out[r0:r0 + block.shape[0], c0:c0 + block.shape[1]] = block
+    out.flush()
+    del out
+    os.replace(base + ".part" + RASTER_EXT, base + RASTER_EXT)
+    del meta["packed"]
+    _write_meta(base, meta)
+    os.remove(base + ".tiles")
+    return meta
+
+
+def read_window(path, r0, r1, c0, c1):
+    #rows r0:r1, cols c0:c1. A plain raster hands back a view of the memmap (no
+    #copy); a packed one only decompresses the tiles the window touches
+    base = _base(path)
+    meta = read_meta(base)
+    if not meta.get("packed"):
+        return np.load(base + RASTER_EXT, mmap_mode="r")[r0:r1, c0:c1]
+    out = np.empty((r1 - r0, c1 - c0), dtype=np.dtype(meta["packed"]["dtype"]))
+    for t0, u0, block in _packed_tiles(base, meta, r0, r1, c0, c1):
+        a0, a1 = max(r0, t0), min(r1, t0 + block.shape[0])
+        b0, b1 = max(c0, u0), min(c1, u0 + block.shape[1])
+        out[a0 - r0:a1 - r0, b0 - c0:b1 - c0] = block[a0 - t0:a1 - t0, b0 - u0:b1 - u0]
+    return out
+
+
+def default_nodata(dtype):
+    dtype = np.dtype(dtype)
+    if dtype.kind == "f":
+        return float("nan")
+    if dtype.kind == "u":
+        return int(np.iinfo(dtype).max)
+    return int(np.iinfo(dtype).min)
+
+
+def valid_mask(array, nodata):
+    if nodata is None:
+        return np.ones(array.shape, dtype=bool)
+    if isinstance(nodata, float) and math.isnan(nodata):
+        return ~np.isnan(array)
+    return array != nodata
@@ -0,0 +1,276 @@
+#-------------------------------------------------------------------------------
+# Name:        ingest
+# Purpose:     project/clip/copy every input dataset into the project gdb.
+#              Each (folder, dataset) pair is an independent job, so jobs are
+#              fanned out to a process pool; every job works in its own scratch
+#              folder under temp and only the parent process writes into the
+#              file gdb (one writer at a time, as the gdb likes it). With a
+#              ProjectionCache (projcache.py) a job whose source, boundary and
+#              settings match an earlier run's copies that result instead.
+#-------------------------------------------------------------------------------
+import os
+import shutil
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from dataclasses import dataclass, field
+
+from .backends import get_backend
+from .profiling import Profiler
+
+#landcover classes straight out of the provincial product, squashed to 1-10
+LANDCOVER_REMAP = "20 10; 31 8; 32 7; 33 6; 34 10; 50 3; 110 2; 120 9; 210 1; 220 1; 230 1"
+
+
+def clean_name(name):
+    name = os.path.splitext(name)[0]
+    name = name.replace("-", "_").replace(" ", "_")
+    return name[:13]
+
+
+@dataclass(frozen=True)
+class IngestJob:
+    folder: str
+    dataset: str
+    kind: str  # "feature", "raster" or "landcover"
+    out_name: str
+
+
+@dataclass(frozen=True)
+class IngestSettings:
+    backend: str
+    temp_folder: str
+    clip_boundary: str
+    target_epsg: int = 26911
+    cell_size: int = 25
+    #row-band processes for the landcover rasterizer (same result at any count)
+    landcover_workers: int = 1
+
+
+@dataclass
+class IngestResult:
+    job: IngestJob
+    staged: str
+    scratch: str
+    log: list = field(default_factory=list)
+    timings: list = field(default_factory=list)
+    #copy of the result left for the projection cache
+    kept: str = None
+    #staged is the projection cache's entry itself: copied into the gdb, never moved
+    from_cache: bool = False
+
+
+def plan_jobs(backend, folders, folder_prefixes):
+    #one job per dataset; landcover polygons get rasterised so they're special
+    jobs = []
+    for folder in folders:
+        prefix = folder_prefixes[folder]
+        for fc in backend.list_feature_classes(folder):
+            if "Landcover" in folder:
+                jobs.append(IngestJob(folder, fc, "landcover", "Landcover"))
+            else:
+                jobs.append(IngestJob(folder, fc, "feature", clean_name(f"{prefix}_{fc}")))
+        for raster in backend.list_rasters(folder):
+            jobs.append(IngestJob(folder, raster, "raster", clean_name(f"{prefix}_{raster}")))
+    return jobs
+
+
+def run_job(job, settings, cached=None, keep=None):
+    #runs in a worker process: everything it writes stays inside its scratch
+    #folder, except a copy of the result in `keep` when the parent asks for one.
+    #cached is an earlier run's result, committed straight from the projection
+    #cache rather than projected again
+    scratch = os.path.join(settings.temp_folder, f"job_{job.out_name}")
+    os.makedirs(scratch, exist_ok=True)
+    backend = get_backend(settings.backend, scratch_workspace=scratch)
+    target_sr = backend.spatial_reference(settings.target_epsg)
+    log = []
+    #timings go back to the parent with the result, it owns the profile log
+    profiler = Profiler()
+
+    def step(tool, inputs):
+        return profiler.stage(f"ingest:{job.out_name}:{tool}", inputs=inputs, dataset=job.dataset)
+
+    def messages():
+        log.append("Processing...")
+        log.extend(backend.messages())
+
+    def staged(name, kind):
+        ext = backend.raster_ext if kind == "raster" else backend.feature_ext
+        return os.path.join(scratch, name + ext)
+
+    copy = backend.copy_features if job.kind == "feature" else backend.copy_raster
+
+    def done(output):
+        if not keep:
+            return IngestResult(job, output, scratch, log, profiler.records)
+        os.makedirs(keep, exist_ok=True)
+        kept = os.path.join(keep, os.path.basename(output))
+        with step("CacheKeep", [output]):
+            copy(output, kept)
+        return IngestResult(job, output, scratch, log, profiler.records, kept)
+
+    input_path = os.path.join(job.folder, job.dataset)
+    desc = backend.describe(input_path)
+    log.append(f"Name: {job.dataset}")
+    if job.kind == "raster":
+        log.append(f"  Raster Format: {desc.format}")
+        log.append(f"  Data Type: {desc.datasetType}")
+        log.append(f"  Pixel Type: {desc.pixelType}")
+    else:
+        log.append(f"  Shape Type: {desc.shapeType}")
+    log.append(f"  Spatial Ref Name: {desc.spatialReference.name}")
+    log.append(f"  Spatial Ref Type: {desc.spatialReference.type}")
+    if job.kind == "raster":
+        log.append(f"  Cell Size (X, Y): ({desc.meanCellWidth}, {desc.meanCellHeight})")
+
+    if cached:
+        log.append(f"Same source, boundary and settings as an earlier run, reusing {cached}")
+        return IngestResult(job, cached, scratch, log, profiler.records, from_cache=True)
+
+    if job.kind == "landcover":
+        clipped_fc = staged("landcover_clipped", "feature")
+        log.append(f"Projecting and clipping Landcover to StudyArea: {job.dataset} -> {clipped_fc}")
+        with step("ProjectClip", [input_path]):
+            backend.project_clip(input_path, settings.clip_boundary, clipped_fc, settings.target_epsg)
+        messages()
+
+        #rasterized by area-weighted majority with the remap applied on the
+        #way out, so there's no intermediate class raster to reclassify
+        log.append("Converting Landcover to raster and reclassifying")
+        raster_output = staged("Landcover", "raster")
+        with step("LandcoverToRaster", [clipped_fc]):
+            backend.landcover_to_raster(clipped_fc, "LC_class", LANDCOVER_REMAP, raster_output, settings.cell_size,
+                                        settings.landcover_workers)
+        messages()
+        log.append("Landcover misery has been dealt with. Your processor chip is smokin'.")
+        return done(raster_output)
+
+    if job.kind == "feature":
+        #one pass: bbox prefilter against the study area, reproject what's
+        #left, clip, write (the study area is already in NAD83 UTM Zone 11N)
+        clipped_fc = staged(f"{job.out_name}_clip", "feature")
+        log.append(f"Projecting and clipping feature class to study area: {job.dataset} -> {job.out_name}")
+        with step("ProjectClip", [input_path]):
+            backend.project_clip(input_path, settings.clip_boundary, clipped_fc, settings.target_epsg)
+        messages()
+        return done(clipped_fc)
+
+    #only the window under the study area is read, warped and masked, in one go
+    clipped_raster = staged(f"c_{job.out_name}", "raster")
+    if desc.spatialReference.name != target_sr.name:
+        log.append(f"Reprojecting and clipping raster to study area: {job.dataset} -> {clipped_raster}")
+    else:
+        log.append(f"Clipping raster (same projection) to study area: {job.dataset} -> {clipped_raster}")
+    with step("WarpToBoundary", [input_path]):
+        backend.warp_to_boundary(input_path, settings.clip_boundary, clipped_raster, settings.target_epsg)
+    messages()
+    return done(clipped_raster)
+
+
+def commit(backend, result, gdb_path, names=None):
+    #the only place ingest writes into the gdb; always called from the parent.
+    #names (an OutputManifest) gives the dataset its final name on the way in.
+    #A projection cache entry is copied, in one go from the cache to the gdb
+    final_output = os.path.join(gdb_path, names(result.job.out_name) if names else result.job.out_name)
+    if result.from_cache:
+        copy = backend.copy_features if result.job.kind == "feature" else backend.copy_raster
+        copy(result.staged, final_output)
+    elif result.job.kind == "feature":
+        backend.move_features(result.staged, final_output)
+    else:
+        backend.move_raster(result.staged, final_output)
+    shutil.rmtree(result.scratch, ignore_errors=True)
+    return final_output
+
+
+def job_params(job, settings):
+    #what the job does to its source, whatever the output ends up being called
+    return {
+        "kind": job.kind,
+        "target_epsg": settings.target_epsg,
+        "cell_size": settings.cell_size,
+        "remap": LANDCOVER_REMAP if job.kind == "landcover" else None,
+        "cell_assignment": "MAXIMUM_COMBINED_AREA" if job.kind == "landcover" else None,
+    }
+
+
+def job_key(cache, job, settings):
+    #everything that changes what lands in the gdb for this job
+    params = dict(job_params(job, settings), out_name=job.out_name)
+    return cache.key(f"ingest:{job.out_name}", params,
+                     datasets=[os.path.join(job.folder, job.dataset), settings.clip_boundary])
+
+
+def projection_key(projections, job, settings):
+    #shared by every run, study area and output name; the backend is in there
+    #since the two write different formats
+    params = dict(job_params(job, settings), backend=settings.backend)
+    return projections.key(os.path.join(job.folder, job.dataset), settings.clip_boundary, params)
+
+
+def run_ingest(folders, folder_prefixes, gdb_path, settings, workers=None, cache=None, profiler=None, names=None,
+               projections=None):
+    #workers=1 keeps everything in this process (handy for debugging).
+    #returns {out_name: key} so later stages can chain their cache keys; keys
+    #stay under the working names even when `names` publishes them as others.
+    #projections (a ProjectionCache) carries results over from other runs
+    backend = get_backend(settings.backend)
+    profiler = profiler or Profiler()
+    jobs = plan_jobs(backend, folders, folder_prefixes)
+    keys = {}
+    todo = []
+    for job in jobs:
+        if cache is None:
+            keys[job.out_name] = None
+            todo.append(job)
+            continue
+        keys[job.out_name] = job_key(cache, job, settings)
+        #a staging gdb reads through to the published one for what it hasn't rebuilt
+        final_output = names.source(gdb_path, job.out_name) if names else os.path.join(gdb_path, job.out_name)
+        if cache.stale(f"ingest:{job.out_name}", keys[job.out_name], [final_output]):
+            todo.append(job)
+
+    #{out_name: (projection key, cached path or None)}, looked up before any
+    #worker starts so nothing is filed or evicted while they read
+    reuse = {}
+    if projections is not None:
+        for job in todo:
+            key = projection_key(projections, job, settings)
+            reuse[job.out_name] = (key, projections.lookup(key))
+        print(f"[projection cache] {sum(1 for _, path in reuse.values() if path)} of {len(todo)} datasets "
+              f"already projected and clipped by an earlier run.")
+
+    def arguments(job):
+        #run_job's: commit the cached result, or keep a copy of the new one
+        key, path = reuse.get(job.out_name, (None, None))
+        return job, settings, path, projections.part(key) if key and not path else None
+
+    workers = max(1, min(workers or os.cpu_count() or 1, len(todo) or 1))
+    print(f"Ingesting {len(todo)} of {len(jobs)} datasets with {workers} worker(s).")
+
+    def report(result):
+        print(f"\nProcessed {result.job.folder} -> {result.job.out_name}")
+        for line in result.log:
+            print(line)
+        for record in result.timings:
+            profiler.add(record)
+        if result.kept:
+            source = os.path.join(result.job.folder, result.job.dataset)
+            projections.add(reuse[result.job.out_name][0], result.kept, source)
+        with profiler.stage(f"ingest:{result.job.out_name}:commit", inputs=[result.staged]):
+            final_output = commit(backend, result, gdb_path, names)
+        if cache is not None:
+            cache.record(f"ingest:{result.job.out_name}", keys[result.job.out_name], [final_output])
+        print(f"Saved to gdb: {final_output}")
+
+    if workers == 1:
+        for job in todo:
+            report(run_job(*arguments(job)))
+    else:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            futures = [pool.submit(run_job, *arguments(job)) for job in todo]
+            for future in as_completed(futures):
+                report(future.result())
+    if projections is not None:
+        total = projections.evict()
+        print(f"[projection cache] {total / 1e6:.1f} MB of {projections.max_bytes / 1e6:.1f} MB in {projections.folder}")
+    return keys
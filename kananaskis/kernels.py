@@ -0,0 +1,249 @@
+#-------------------------------------------------------------------------------
+# Name:        kernels
+# Purpose:     per-pixel NumPy versions of the Spatial Analyst functions the
+#              habitat model uses (RescaleByFunction transfer functions and
+#              Reclassify remaps). They work on any block of cells, so the
+#              block engine can run them tile by tile. Remap strings compile to
+#              a dense lookup table for integer classes, and a rescale compiles
+#              its transfer function and stretch into a few in-place ufunc calls
+#              on a float32 buffer; either can hand back a compact dtype (uint8
+#              for 1-10 suitability classes) instead of float64.
+#-------------------------------------------------------------------------------
+from dataclasses import dataclass
+from functools import lru_cache
+
+import numpy as np
+
+from .grid import default_nodata
+
+
+@dataclass(frozen=True)
+class Stats:
+    minimum: float
+    maximum: float
+    mean: float
+    count: int
+
+
+class StatsAccumulator:
+    #running min/max/mean over blocks, ignoring NaN cells
+    def __init__(self):
+        self.minimum = np.inf
+        self.maximum = -np.inf
+        self.total = 0.0
+        self.count = 0
+
+    def add(self, block):
+        vals = block[~np.isnan(block)]
+        if vals.size:
+            self.minimum = min(self.minimum, float(vals.min()))
+            self.maximum = max(self.maximum, float(vals.max()))
+            self.total += float(vals.sum(dtype=np.float64))
+            self.count += int(vals.size)
+
+    def result(self):
+        if not self.count:
+            return Stats(np.nan, np.nan, np.nan, 0)
+        return Stats(self.minimum, self.maximum, self.total / self.count, self.count)
+
+
+def cast_block(block, dtype, nodata=None):
+    #a float block (NaN = NoData) in the output dtype. Integer outputs are
+    #rounded, and NaN or values the dtype can't hold become nodata
+    dtype = np.dtype(dtype)
+    if dtype.kind == "f":
+        return block.astype(dtype, copy=False)
+    info = np.iinfo(dtype)
+    nodata = default_nodata(dtype) if nodata is None else nodata
+    with np.errstate(invalid="ignore"):
+        bad = ~((block >= info.min) & (block <= info.max))
+        out = np.rint(block).astype(dtype)
+    out[bad] = nodata
+    return out
+
+
+#transfer functions, same names and defaults as arcpy.sa (None = derive from
+#input stats). apply() evaluates into `out` in place; calling one returns a
+#new float64 array
+
+class _Transfer:
+    def __call__(self, x, stats):
+        x = np.array(x, dtype=np.float64)
+        return self.apply(x, stats, x)
+
+
+@dataclass(frozen=True)
+class TfLarge(_Transfer):
+    midpoint: float = None
+    spread: float = 5.0
+
+    def apply(self, x, stats, out):
+        mid = stats.mean if self.midpoint is None else self.midpoint
+        with np.errstate(divide="ignore", invalid="ignore", over="ignore"):
+            np.divide(x, mid, out=out)
+            np.power(out, -self.spread, out=out)
+            out += 1.0
+            return np.reciprocal(out, out=out)
+
+
+@dataclass(frozen=True)
+class TfSmall(_Transfer):
+    midpoint: float = None
+    spread: float = 5.0
+
+    def apply(self, x, stats, out):
+        mid = stats.mean if self.midpoint is None else self.midpoint
+        with np.errstate(divide="ignore", invalid="ignore", over="ignore"):
+            np.divide(x, mid, out=out)
+            np.power(out, self.spread, out=out)
+            out += 1.0
+            return np.reciprocal(out, out=out)
+
+
+@dataclass(frozen=True)
+class TfLinear(_Transfer):
+    minimum: float = None
+    maximum: float = None
+
+    def apply(self, x, stats, out):
+        lo = stats.minimum if self.minimum is None else self.minimum
+        hi = stats.maximum if self.maximum is None else self.maximum
+        if hi == lo:
+            out[...] = 0.0
+            return out
+        np.subtract(x, lo, out=out)
+        out /= hi - lo
+        return np.clip(out, 0.0, 1.0, out=out)
+
+
+TRANSFER_FUNCTIONS = {"TfLarge": TfLarge, "TfSmall": TfSmall, "TfLinear": TfLinear}
+
+
+class Rescaler:
+    #RescaleByFunction compiled for one input: the transfer function's values
+    #at the input's min and max are worked out once, so each block is the
+    #function plus one multiply-add, all in place on a float32 buffer
+    def __init__(self, function, stats, from_scale, to_scale, dtype=np.float32):
+        self.function = function
+        self.stats = stats
+        self.dtype = np.dtype(dtype)
+        f_lo, f_hi = function(np.array([stats.minimum, stats.maximum], dtype=np.float64), stats)
+        span = f_hi - f_lo
+        self.flat = not np.isfinite(span) or span == 0
+        self.offset = float(f_lo)
+        self.scale = 0.0 if self.flat else (to_scale - from_scale) / span
+        self.from_scale = float(from_scale)
+
+    def __call__(self, x, out=None):
+        #out: a float32 (or float64) buffer to reuse, x itself is fine
+        x = np.asarray(x)
+        if out is None:
+            out = np.empty(x.shape, dtype=np.float32)
+        missing = np.isnan(x)
+        if self.flat:
+            out[...] = self.from_scale
+        else:
+            self.function.apply(x, self.stats, out)
+            out -= self.offset
+            out *= self.scale
+            out += self.from_scale
+        out[missing] = np.nan
+        return cast_block(out, self.dtype)
+
+
+def rescale(x, function, stats, from_scale, to_scale, dtype=np.float64):
+    #RescaleByFunction: evaluate the transfer function, then stretch its value
+    #range over the input's min..max onto from_scale..to_scale
+    x = np.asarray(x, dtype=np.float64)
+    buffer = np.empty(x.shape, dtype=np.float64 if np.dtype(dtype) == np.float64 else np.float32)
+    return Rescaler(function, stats, from_scale, to_scale, dtype)(x, buffer)
+
+
+def parse_remap(remap):
+    #"20 10; 31 8" or "0 5 1; 5 10 2" -> list of (low, high, new), new is None for NODATA
+    rules = []
+    for entry in remap.split(";"):
+        parts = entry.split()
+        if not parts:
+            continue
+        new = None if parts[-1].upper() == "NODATA" else float(parts[-1])
+        low = float(parts[0])
+        high = float(parts[1]) if len(parts) == 3 else low
+        rules.append((low, high, new))
+    return rules
+
+
+class Remap:
+    #a remap string compiled once. Integer classes go through a dense lookup
+    #table covering the rules' range (one gather per block instead of a
+    #compare per rule); anything else (fractional values, very wide ranges)
+    #falls back to the rules. Values the remap doesn't mention keep their
+    #value (arcpy's "DATA" default), or become NoData if the output dtype
+    #can't hold them. Where ranges overlap the first rule wins, as in Reclassify
+    MAX_TABLE = 1 << 20
+
+    def __init__(self, remap, dtype=np.float64):
+        self.rules = parse_remap(remap)
+        self.dtype = np.dtype(dtype)
+        self.table = None
+        bounds = [b for low, high, _ in self.rules for b in (low, high)]
+        if bounds and all(b == int(b) for b in bounds):
+            self.low = int(min(bounds))
+            size = int(max(bounds)) - self.low + 1
+            if size <= self.MAX_TABLE:
+                #identity first, then the rules last to first so the first one wins
+                self.table = np.arange(self.low, self.low + size, dtype=np.float64)
+                for low, high, new in reversed(self.rules):
+                    self.table[int(low) - self.low:int(high) - self.low + 1] = np.nan if new is None else new
+                self.typed_table = cast_block(self.table, self.dtype)
+
+    def _by_rules(self, x):
+        out = x.copy()
+        done = np.zeros(x.shape, dtype=bool)
+        for low, high, new in self.rules:
+            hit = (x >= low) & (x <= high) & ~done
+            out[hit] = np.nan if new is None else new
+            done |= hit
+        return out
+
+    def __call__(self, x):
+        #x: a block, NaN for NoData (integer blocks have no NoData of their own)
+        x = np.asarray(x)
+        if self.table is None:
+            return cast_block(self._by_rules(x.astype(np.float64)), self.dtype)
+        with np.errstate(invalid="ignore"):
+            idx = x.astype(np.intp)
+            #NaN and fractional values don't survive the round trip
+            whole = None if x.dtype.kind in "iu" else idx == x
+        idx -= self.low
+        #negative offsets wrap to huge unsigned ones, so one compare covers both ends
+        inside = idx.view(np.uintp) < len(self.table)
+        if whole is not None:
+            inside &= whole
+        np.clip(idx, 0, len(self.table) - 1, out=idx)
+        if whole is None and self.dtype.kind in "iu":
+            #integer in, integer out: gather straight from a table in the output dtype
+            out = np.take(self.typed_table, idx)
+            outside = ~inside
+            if outside.any():
+                out[outside] = cast_block(x[outside].astype(np.float64), self.dtype)
+            return out
+        out = np.take(self.table, idx)
+        outside = ~inside
+        if outside.any():
+            np.copyto(out, x, where=outside)
+            if whole is not None:
+                rest = outside & ~whole & ~np.isnan(x)
+                if rest.any():
+                    out[rest] = self._by_rules(x[rest].astype(np.float64))
+        return cast_block(out, self.dtype)
+
+
+@lru_cache(maxsize=32)
+def compile_remap(remap, dtype=np.float64):
+    return Remap(remap, dtype)
+
+
+def reclassify(x, remap, dtype=np.float64):
+    #values the remap doesn't mention keep their value (arcpy's "DATA" default)
+    return compile_remap(remap, np.dtype(dtype))(x)
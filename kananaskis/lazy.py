@@ -0,0 +1,246 @@
+#-------------------------------------------------------------------------------
+# Name:        lazy
+# Purpose:     lazy map algebra. Expressions like
+#                  FocalRange(load("D_ab_dem")).rescale(TfLarge(), 10, 1) * 2 + ...
+#              only build a graph. Nothing is read until Graph.compute(), which
+#              walks the tiles once and evaluates every requested output in the
+#              same pass, so elementwise chains (rescale -> weight -> sum) are
+#              fused and shared sub-expressions are computed once per tile.
+#              Saves are only written when something asks for them.
+#-------------------------------------------------------------------------------
+import os
+
+import numpy as np
+
+from . import blocks, kernels
+from .grid import create_raster, default_nodata
+
+#optional terrain factors for habitat_graph: {metric: saved raster name}
+TERRAIN_FACTORS = {"slope": "Terrain_Slope", "tri": "Terrain_TRI", "curvature": "Terrain_Curv"}
+
+
+class Expr:
+    halo = 0
+
+    def children(self):
+        return ()
+
+    #arithmetic builds nodes, it never computes anything
+    def __add__(self, other):
+        return BinOp(np.add, self, wrap(other))
+
+    def __radd__(self, other):
+        return BinOp(np.add, wrap(other), self)
+
+    def __sub__(self, other):
+        return BinOp(np.subtract, self, wrap(other))
+
+    def __rsub__(self, other):
+        return BinOp(np.subtract, wrap(other), self)
+
+    def __mul__(self, other):
+        return BinOp(np.multiply, self, wrap(other))
+
+    def __rmul__(self, other):
+        return BinOp(np.multiply, wrap(other), self)
+
+    def __truediv__(self, other):
+        return BinOp(np.divide, self, wrap(other))
+
+    def focal_range(self, size=3):
+        return Apply(self, blocks.FocalRange(size))
+
+    def terrain(self, metric, cell, size=3):
+        return Apply(self, blocks.Terrain(metric, cell, size))
+
+    def rescale(self, function, from_scale, to_scale):
+        return Apply(self, blocks.Rescale(function, from_scale, to_scale))
+
+    def reclassify(self, remap):
+        return Apply(self, blocks.Reclass(remap))
+
+
+class Load(Expr):
+    def __init__(self, path):
+        self.path = path
+
+    def __repr__(self):
+        return f"Load({self.path!r})"
+
+
+class Const(Expr):
+    def __init__(self, value):
+        self.value = float(value)
+
+    def __repr__(self):
+        return repr(self.value)
+
+
+class Apply(Expr):
+    #one of the blocks.* steps applied to a child expression
+    def __init__(self, child, step):
+        self.child = child
+        self.step = step
+        self.halo = step.halo
+
+    def children(self):
+        return (self.child,)
+
+    @property
+    def needs_stats(self):
+        return isinstance(self.step, blocks.Rescale)
+
+    def __repr__(self):
+        return f"{type(self.step).__name__}({self.child!r})"
+
+
+class BinOp(Expr):
+    def __init__(self, op, left, right):
+        self.op = op
+        self.left = left
+        self.right = right
+
+    def children(self):
+        return (self.left, self.right)
+
+    def __repr__(self):
+        return f"{self.op.__name__}({self.left!r}, {self.right!r})"
+
+
+def wrap(value):
+    return value if isinstance(value, Expr) else Const(value)
+
+
+def load(path):
+    return Load(path)
+
+
+def weighted_sum(pairs):
+    #WeightedSum(WSTable([[raster, "Value", weight], ...])) as an expression
+    total = None
+    for expr, weight in pairs:
+        term = expr * weight if weight != 1 else expr
+        total = term if total is None else total + term
+    return total
+
+
+def walk(roots):
+    #every node reachable from roots, children before parents
+    seen, order = set(), []
+
+    def visit(node):
+        if id(node) in seen:
+            return
+        seen.add(id(node))
+        for child in node.children():
+            visit(child)
+        order.append(node)
+    for root in roots:
+        visit(root)
+    return order
+
+
+class Graph:
+    def __init__(self, grid, tile=512):
+        self.grid = grid
+        self.tile = tile
+        self.saves = {}
+        self._sources = {}
+        self._stats = {}
+
+    def save(self, expr, path, keep=False, dtype=None):
+        #register a possible output. keep=True marks a deliverable; the rest are
+        #only written when named in compute(targets=...). dtype overrides the
+        #one compute() writes with (e.g. uint8 for 1-10 classes)
+        self.saves[path] = (expr, keep, dtype)
+        return expr
+
+    def _source(self, path):
+        if path not in self._sources:
+            self._sources[path] = blocks.Source(path)
+        return self._sources[path]
+
+    def _eval(self, node, r0, r1, c0, c1, halo, memo):
+        #value of node on the tile grown by `halo` cells each side, memoised per tile
+        key = (id(node), halo)
+        if key in memo:
+            return memo[key]
+        if isinstance(node, Load):
+            window = self.grid.window(r0 - halo, c0 - halo, r1 - r0 + 2 * halo, c1 - c0 + 2 * halo)
+            value = self._source(node.path).read(window)
+        elif isinstance(node, Const):
+            value = node.value
+        elif isinstance(node, Apply):
+            child = self._eval(node.child, r0, r1, c0, c1, halo + node.halo, memo)
+            value = node.step.apply(child, self.stats(node.child) if node.needs_stats else None)
+        else:
+            value = node.op(self._eval(node.left, r0, r1, c0, c1, halo, memo),
+                            self._eval(node.right, r0, r1, c0, c1, halo, memo))
+        memo[key] = value
+        return value
+
+    def stats(self, node):
+        #global min/max/mean of an expression, streamed tile by tile
+        if id(node) not in self._stats:
+            acc = kernels.StatsAccumulator()
+            for r0, r1, c0, c1 in blocks.tiles(self.grid.shape, self.tile):
+                acc.add(np.broadcast_to(self._eval(node, r0, r1, c0, c1, 0, {}), (r1 - r0, c1 - c0)))
+            self._stats[id(node)] = acc.result()
+        return self._stats[id(node)]
+
+    def plan(self, targets=None):
+        #which saves will actually be written
+        if targets is None:
+            return [path for path, (_, keep, _) in self.saves.items() if keep]
+        return list(targets)
+
+    def compute(self, targets=None, dtype=np.float32):
+        paths = self.plan(targets)
+        exprs = [self.saves[p][0] for p in paths]
+        #stats first (children before parents), so the main loop is one clean pass
+        for node in walk(exprs):
+            if isinstance(node, Apply) and node.needs_stats:
+                self.stats(node.child)
+        dtypes = [np.dtype(self.saves[p][2] or dtype) for p in paths]
+        outs = [create_raster(p, self.grid, d, default_nodata(d)) for p, d in zip(paths, dtypes)]
+        for r0, r1, c0, c1 in blocks.tiles(self.grid.shape, self.tile):
+            memo = {}
+            for expr, out, d in zip(exprs, outs, dtypes):
+                value = np.broadcast_to(self._eval(expr, r0, r1, c0, c1, 0, memo), (r1 - r0, c1 - c0))
+                out[r0:r1, c0:c1] = kernels.cast_block(value, d)
+        for out in outs:
+            out.flush()
+        skipped = [p for p in self.saves if p not in paths]
+        return paths, skipped
+
+
+def habitat_graph(workspace, grid, landcover_remap, weights=None, tile=512, class_dtype=np.uint8, names=None):
+    #the FinalProject.py model as a lazy graph. Only Combined_Rasters is a
+    #deliverable, the rescaled factors are saved only if asked for, as
+    #class_dtype (whole 1-10 classes in a uint8 by default, a quarter of the
+    #float32 bytes; pass np.float32 to keep the fractions). Combined_Rasters is
+    #always summed from the unrounded values. A weight for one of
+    #TERRAIN_FACTORS adds that derivative as another factor; they all read the
+    #same DEM tiles as the ruggedness does. names (a publish.OutputManifest)
+    #gives the datasets their final names, in and out
+    weights = weights or {}
+    path = lambda name: os.path.join(workspace, names(name) if names else name)
+    g = Graph(grid, tile)
+    dem = load(path("D_ab_dem"))
+    ruggedness = g.save(dem.focal_range(3), path("Terrain_R"))
+    tf = kernels.TfLarge()
+    terrain = g.save(ruggedness.rescale(tf, 10, 1), path("Terrain_Rescale"), dtype=class_dtype)
+    roads = g.save(load(path("Distance_to_Roads")).rescale(tf, 10, 1), path("Roads_Rescale"), dtype=class_dtype)
+    trails = g.save(load(path("Distance_to_Trails")).rescale(tf, 10, 1), path("Trails_Rescale"), dtype=class_dtype)
+    hydro = g.save(load(path("Distance_to_Hydro")).rescale(tf, 10, 1), path("Hydrology_Rescale"), dtype=class_dtype)
+    landcover = g.save(load(path("Landcover")).reclassify(landcover_remap), path("LC_Reclass"), dtype=class_dtype)
+    factors = [(terrain, weights.get("terrain", 1)), (roads, weights.get("roads", 1)),
+               (landcover, weights.get("landcover", 1)), (hydro, weights.get("hydro", 1)),
+               (trails, weights.get("trails", 1))]
+    for metric, name in TERRAIN_FACTORS.items():
+        if metric in weights:
+            raw = g.save(dem.terrain(metric, grid.cell), path(name))
+            factors.append((g.save(raw.rescale(tf, 10, 1), path(f"{name}_Rescale"), dtype=class_dtype),
+                            weights[metric]))
+    g.save(weighted_sum(factors), path("Combined_Rasters"), keep=True)
+    return g
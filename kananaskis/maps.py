@@ -0,0 +1,237 @@
+#-------------------------------------------------------------------------------
+# Name:        maps
+# Purpose:     map production, decoupled from the analysis. A LayoutJob is one
+#              page (template, gdb, layers, title, scale, extent); runs drop
+#              jobs into a MapQueue, a folder of job files moved between
+#              pending/running/done/failed, and run_queue() renders whatever
+#              is pending in worker processes, many layouts at once. That can
+#              happen at the end of the run or later from another shell:
+#
+#              python -m kananaskis.maps --queue C:\GEOS456\FinalProject\map_queue --workers 4
+#
+#              Layer definitions (.lyrx for arcgis) are made once per feature
+#              class into a LayerCache and pointed at each job's gdb, instead
+#              of MakeFeatureLayer -> SaveToLayerFile for every layer every run.
+#-------------------------------------------------------------------------------
+import argparse
+import json
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from dataclasses import asdict, dataclass
+
+from .backends import get_backend
+from .profiling import Profiler
+
+STATES = ("pending", "running", "done", "failed")
+
+
+@dataclass(frozen=True)
+class LayoutJob:
+    name: str
+    gdb: str
+    #the arcgis backend exports a PDF here; the local one writes a PNG beside it
+    out_file: str
+    backend: str = "arcgis"
+    template: str = None
+    #feature classes to draw, in order; empty means every one in the gdb
+    layers: tuple = ()
+    #optional raster drawn under the layers
+    base_raster: str = None
+    title: str = "Bear Habitat, Kananaskis"
+    legend_title: str = "Kananaskis Elements"
+    scale: float = 350000
+    #zoom to this feature class (e.g. a region's boundary) before setting the scale
+    extent_fc: str = None
+    map_name: str = "Map"
+    #save the filled-in project here as well (the template itself is never saved)
+    aprx_copy: str = None
+
+    @classmethod
+    def from_json(cls, data):
+        return cls(**dict(data, layers=tuple(data.get("layers") or ())))
+
+
+class LayerCache:
+    #one layer definition per (feature class name, shape type), kept between
+    #runs; the index remembers which workspace each was made from so the
+    #render can re-point it at another gdb
+    def __init__(self, folder):
+        self.folder = folder
+        os.makedirs(folder, exist_ok=True)
+        self.index_path = os.path.join(folder, "layers.json")
+        try:
+            with open(self.index_path) as f:
+                self.index = json.load(f)
+        except (OSError, ValueError):
+            self.index = {}
+
+    def definitions(self, backend, gdb, names):
+        #[(definition file, workspace it came from)], making only the missing ones
+        out, changed = [], False
+        for name in names:
+            fc = os.path.join(gdb, name)
+            key = f"{name}_{backend.describe(fc).shapeType}"
+            path = os.path.join(self.folder, key + backend.layer_ext)
+            if key not in self.index or not os.path.exists(path):
+                backend.layer_definition(fc, path)
+                self.index[key] = gdb
+                changed = True
+            out.append((path, self.index[key]))
+        if changed:
+            with open(self.index_path + ".part", "w") as f:
+                json.dump(self.index, f, indent=2)
+            os.replace(self.index_path + ".part", self.index_path)
+        return out
+
+
+class MapQueue:
+    def __init__(self, folder):
+        self.folder = folder
+        for state in STATES:
+            os.makedirs(os.path.join(folder, state), exist_ok=True)
+
+    def _path(self, state, ticket):
+        return os.path.join(self.folder, state, ticket + ".json")
+
+    def tickets(self, state="pending"):
+        return sorted(f[:-5] for f in os.listdir(os.path.join(self.folder, state)) if f.endswith(".json"))
+
+    def submit(self, job):
+        #returns the ticket; the file only appears under pending once complete
+        ticket = f"{time.time_ns()}_{job.name}"
+        path = self._path("pending", ticket)
+        with open(path + ".part", "w") as f:
+            json.dump(asdict(job), f, indent=2)
+        os.replace(path + ".part", path)
+        return ticket
+
+    def claim(self):
+        #(ticket, job) for the oldest pending job, or None. The move into
+        #running is the lock, so several runners can share one queue
+        for ticket in self.tickets("pending"):
+            try:
+                os.replace(self._path("pending", ticket), self._path("running", ticket))
+            except FileNotFoundError:
+                continue
+            with open(self._path("running", ticket)) as f:
+                return ticket, LayoutJob.from_json(json.load(f))
+        return None
+
+    def finish(self, ticket, output=None, error=None):
+        with open(self._path("running", ticket)) as f:
+            record = json.load(f)
+        record.update({"output": output, "error": error, "finished": time.strftime("%Y-%m-%dT%H:%M:%S")})
+        path = self._path("failed" if error else "done", ticket)
+        with open(path, "w") as f:
+            json.dump(record, f, indent=2)
+        os.remove(self._path("running", ticket))
+
+    def requeue(self, state="running"):
+        #put jobs back in pending (e.g. running ones left by a runner that died)
+        tickets = self.tickets(state)
+        for ticket in tickets:
+            os.replace(self._path(state, ticket), self._path("pending", ticket))
+        return tickets
+
+
+def layer_names(backend, job):
+    if job.layers:
+        return list(job.layers)
+    return [os.path.splitext(fc)[0] for fc in backend.list_feature_classes(job.gdb)]
+
+
+def render(job, layers):
+    #runs in a worker process: one layout, start to finish
+    profiler = Profiler()
+    with profiler.stage(f"map:{job.name}"):
+        output = get_backend(job.backend).render_layout(job, layers)
+    return output, profiler.records
+
+
+def run_queue(queue, cache=None, workers=None, profiler=None):
+    #render everything pending; returns {ticket: output file or exception}
+    profiler = profiler or Profiler()
+    cache = cache or LayerCache(os.path.join(queue.folder, "layers"))
+    claimed = []
+    while True:
+        item = queue.claim()
+        if item is None:
+            break
+        claimed.append(item)
+    if not claimed:
+        return {}
+
+    #layer definitions are made here, once, so workers never race to write them
+    jobs = []
+    for ticket, job in claimed:
+        backend = get_backend(job.backend)
+        try:
+            jobs.append((ticket, job, cache.definitions(backend, job.gdb, layer_names(backend, job))))
+        except Exception as e:
+            queue.finish(ticket, error=f"{type(e).__name__}: {e}")
+            print(f"Map {job.name} failed: {e}")
+    workers = max(1, min(workers or os.cpu_count() or 1, len(jobs) or 1))
+    print(f"Rendering {len(jobs)} layout(s) with {workers} worker(s).")
+    results = {}
+
+    def report(ticket, job, outcome):
+        if isinstance(outcome, Exception):
+            queue.finish(ticket, error=f"{type(outcome).__name__}: {outcome}")
+            print(f"Map {job.name} failed: {outcome}")
+        else:
+            output, records = outcome
+            for record in records:
+                profiler.add(record)
+            queue.finish(ticket, output=output)
+            print(f"Map {job.name} exported -> {output}")
+            outcome = output
+        results[ticket] = outcome
+
+    if workers == 1:
+        for ticket, job, layers in jobs:
+            try:
+                outcome = render(job, layers)
+            except Exception as e:
+                outcome = e
+            report(ticket, job, outcome)
+    else:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            futures = {pool.submit(render, job, layers): (ticket, job) for ticket, job, layers in jobs}
+            for future in as_completed(futures):
+                ticket, job = futures[future]
+                report(ticket, job, future.exception() or future.result())
+    return results
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Render the map layouts waiting in a queue folder.")
+    parser.add_argument("--queue", required=True, help="queue folder (pending/running/done/failed)")
+    parser.add_argument("--layers", help="layer definition cache (default: <queue>/layers)")
+    parser.add_argument("--workers", type=int, help="layouts rendered at once (default: CPU count)")
+    parser.add_argument("--requeue", action="store_true", help="retry jobs left running or failed by earlier runs")
+    parser.add_argument("--status", action="store_true", help="only list the jobs in each state")
+    args = parser.parse_args(argv)
+
+    queue = MapQueue(args.queue)
+    if args.status:
+        for state in STATES:
+            tickets = queue.tickets(state)
+            print(f"{state}: {len(tickets)}")
+            for ticket in tickets:
+                print(f"  {ticket}")
+        return 0
+    if args.requeue:
+        queue.requeue("running")
+        queue.requeue("failed")
+    profiler = Profiler()
+    results = run_queue(queue, LayerCache(args.layers) if args.layers else None, args.workers, profiler)
+    if profiler.records:
+        print(f"\nLayout timings for run {profiler.run_id}, most expensive first:")
+        print(profiler.summary())
+    return 1 if any(isinstance(r, Exception) for r in results.values()) else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
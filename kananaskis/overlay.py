@@ -0,0 +1,103 @@
+#-------------------------------------------------------------------------------
+# Name:        overlay
+# Purpose:     weighted overlay for many weight scenarios at once. The rescaled
+#              factor rasters are streamed block by block; every block of every
+#              factor is read once and multiplied against the whole scenario
+#              weight matrix, so N scenarios cost one pass over the inputs
+#              instead of N WeightedSum runs. The pipeline's scenarios stage
+#              (--scenarios CSV) runs it over the saved rescaled factors.
+#-------------------------------------------------------------------------------
+import csv
+import re
+
+import numpy as np
+
+from . import blocks
+from .grid import create_raster
+
+#factor order used by FinalProject.py's WeightedSum
+FACTORS = ["terrain", "roads", "landcover", "hydro", "trails"]
+
+#the model's landcover reclass (provincial class -> suitability); the one
+#definition, used by the pipeline, batch runs and the benchmarks
+MODEL_REMAP = "11 10; 21 8; 22 7; 23 8; 24 9; 31 6; 41 2; 42 1; 43 2; 52 3; 71 3; 81 4; 82 6; 90 4; 95 4"
+
+
+def load_scenarios(path, factors=FACTORS):
+    #CSV with a "scenario" column plus one weight column per factor;
+    #missing factor columns default to a weight of 1
+    scenarios = {}
+    with open(path, newline="") as f:
+        for row in csv.DictReader(f):
+            if "scenario" not in row:
+                raise ValueError(f"{path} has no 'scenario' column")
+            name = row.pop("scenario")
+            unknown = set(row) - set(factors)
+            if unknown:
+                raise ValueError(f"Scenario '{name}' has weights for unknown factors: {sorted(unknown)}")
+            try:
+                scenarios[name] = {factor: float(row.get(factor) or 1) for factor in factors}
+            except ValueError:
+                raise ValueError(f"Scenario '{name}' has a weight that isn't a number: {row}")
+    if not scenarios:
+        raise ValueError(f"{path} has no scenarios")
+    return scenarios
+
+
+def scenario_raster(name):
+    #the cost surface of one scenario in the gdb
+    return "Scenario_" + re.sub(r"\W", "_", name)
+
+
+def scenario_paths(name):
+    #the habitat connections routed over that surface
+    return "Paths_" + re.sub(r"\W", "_", name)
+
+
+def weight_matrix(scenarios, factors):
+    #{scenario: {factor: weight}} -> (names, S x F array)
+    names = list(scenarios)
+    matrix = np.array([[scenarios[n].get(f, 1.0) for f in factors] for n in names], dtype=np.float64)
+    return names, matrix.reshape(len(names), len(factors))
+
+
+def overlay_block(weights, stack):
+    #(S, F) weights x (F, h, w) factor block -> (S, h, w); a NoData factor
+    #makes the cell NoData in every scenario, same as WeightedSum
+    missing = np.isnan(stack).any(axis=0)
+    result = np.tensordot(weights, np.nan_to_num(stack), axes=1)
+    result[:, missing] = np.nan
+    return result
+
+
+def weighted_overlay(factors, scenarios, grid, outputs, tile=512, dtype=np.float32):
+    #factors: {factor name: raster path}; outputs: {scenario: raster path},
+    #one surface per scenario, all written from one pass over the factors
+    names = list(factors)
+    scenario_names, weights = weight_matrix(scenarios, names)
+    sources = [blocks.Source(factors[n]) for n in names]
+    outs = [create_raster(outputs[s], grid, dtype, float("nan")) for s in scenario_names]
+
+    for r0, r1, c0, c1 in blocks.tiles(grid.shape, tile):
+        window = grid.window(r0, c0, r1 - r0, c1 - c0)
+        result = overlay_block(weights, np.stack([src.read(window) for src in sources]))
+        for out, block in zip(outs, result):
+            out[r0:r1, c0:c1] = block
+    for out in outs:
+        out.flush()
+    return outputs
+
+
+def parse_weights(items, factors=FACTORS):
+    #["roads=2", "terrain=0.5"] (from the command line) -> {factor: weight}
+    weights = {}
+    for item in items or []:
+        name, _, value = item.partition("=")
+        try:
+            weight = float(value)
+        except ValueError:
+            weight = None
+        if name not in factors or weight is None:
+            raise ValueError(f"Bad weight '{item}', expected one of {factors} as NAME=VALUE")
+        weights[name] = weight
+    return weights
@@ -0,0 +1,490 @@
+#-------------------------------------------------------------------------------
+# Name:        pipeline
+# Purpose:     the Kananaskis bear habitat run (FinalProject.py) as an
+#              importable module. Importing it does nothing: arcpy is only
+#              imported by the steps that use it, in the process running them,
+#              and a run can be cut down to selected steps or model stages,
+#              e.g. just the area summary or just the map export. Those skip
+#              the temp folder reset, the gdb checkout and the ingest a full
+#              run does, and work on the published gdb.
+#
+#              python -m kananaskis --step area_summary --step maps
+#              python -m kananaskis --step "distance:*" --step "rescale:*"
+#              python -m kananaskis --dry-run
+#-------------------------------------------------------------------------------
+import argparse
+import fnmatch
+import os
+import shutil
+from dataclasses import dataclass, field, replace
+
+import numpy as np
+
+from . import tables, zonal
+from .backends import get_backend
+from .cache import StageCache
+from .config import FOLDERS, RENAMES
+from .dag import Pipeline, Stage, stage_costs
+from .overlay import FACTORS, MODEL_REMAP, load_scenarios, parse_weights, scenario_paths, scenario_raster
+from .profiling import Profiler
+from .publish import OutputManifest, checkout, discard, publish, staging_path
+
+#the run in order; a full run is all of them
+STEPS = ("ingest", "model", "area_summary", "publish", "maps", "report")
+
+#all factors count equally unless --weight says otherwise
+DEFAULT_WEIGHTS = {"terrain": 1, "roads": 1, "landcover": 1, "hydro": 1, "trails": 1}
+
+#the reclassified landcover labels (from the scale value table)
+LANDCOVER_LABELS = {
+    1: "Coniferous / Broadleaf / Mixed Forest",
+    2: "Grassland",
+    3: "Shrubland",
+    6: "Exposed Land",
+    7: "Rock/Rubble",
+    8: "Snow/Ice",
+    9: "Agriculture",
+    10: "Water / Developed",
+}
+
+#RescaleByFunction for every factor but landcover (TfLarge, from 10 to 1)
+RESCALE = ("TfLarge", 10, 1)
+
+#factor -> (raster it is rescaled from, rescaled raster); terrain is the DEM's
+#ruggedness (a 3 x 3 focal RANGE), which only lives in memory on the way
+RESCALES = {
+    "terrain": ("D_ab_dem", "Terrain_Rescale"),
+    "roads": ("Distance_to_Roads", "Roads_Rescale"),
+    "hydro": ("Distance_to_Hydro", "Hydrology_Rescale"),
+    "trails": ("Distance_to_Trails", "Trails_Rescale"),
+}
+
+#the rasters the weighted sum reads, by factor
+FACTOR_RASTERS = {"terrain": "Terrain_Rescale", "roads": "Roads_Rescale", "landcover": "LC_Reclass",
+                  "hydro": "Hydrology_Rescale", "trails": "Trails_Rescale"}
+
+#coarse levels for --pyramid routing: 100 m and 400 m over the 25 m cost surface
+ROUTE_PYRAMID = (4, 16)
+
+ZONAL_TABLE = "ElevationStats_Kananaskis"
+AREA_TABLE = "Landcover_Area_by_Class"
+SUMMARY_TABLE = "Landcover_Area_Summary"
+
+
+@dataclass(frozen=True)
+class ProjectSettings:
+    base_folder: str = r"C:\GEOS456\FinalProject"
+    #input folder -> prefix for the names in the gdb; empty means FOLDERS under base_folder
+    folder_prefixes: dict = field(default_factory=dict)
+    #empty means Kananaskis\KCountry_Bound.shp under base_folder
+    study_area: str = None
+    #(working name, final name) pairs, see publish.OutputManifest
+    renames: tuple = RENAMES
+    gdb_name: str = "KananaskisWildlife.gdb"
+    map_name: str = "FinalProject_RRB"
+    template: str = "GEOS456_FinalProject.aprx"
+    map_title: str = "Bear Habitat, Kananaskis"
+    legend_title: str = "Kananaskis Elements"
+    #1:350,000 fits the whole of K-Country on the page
+    map_scale: float = 350000
+
+    def path(self, *parts):
+        return os.path.join(self.base_folder, *parts)
+
+    @property
+    def prefixes(self):
+        return self.folder_prefixes or {self.path(folder): prefix for prefix, folder in FOLDERS.items()}
+
+    @property
+    def boundary(self):
+        return self.study_area or self.path("Kananaskis", "KCountry_Bound.shp")
+
+    @property
+    def gdb(self):
+        return self.path(self.gdb_name)
+
+    @property
+    def names(self):
+        return OutputManifest(self.renames)
+
+
+def workers_from_env(name):
+    return int(os.environ.get(name, os.cpu_count() or 1))
+
+
+#--- model stages --------------------------------------------------------------
+#each one runs in a worker process (see dag.py), so it sets up its own
+#arcpy environment and reads its inputs back by name: from the gdb it writes
+#to, or the published gdb for what a full run hasn't rebuilt (names.source)
+
+def _arcpy(gdb_path):
+    import arcpy
+    arcpy.env.workspace = gdb_path
+    arcpy.env.overwriteOutput = True
+    #set raster size to standard
+    arcpy.env.cellSize = 25
+    arcpy.CheckOutExtension("Spatial")
+    return arcpy
+
+
+def messages():
+    import arcpy
+    print("Processing...")
+    print(arcpy.GetMessage(0))
+    count = arcpy.GetMessageCount()
+    print(arcpy.GetMessage(count - 1))
+
+
+def _cells(record, *rasters):
+    #the cells a raster stage worked through, for its profile record
+    if record is not None:
+        backend = get_backend("arcgis")
+        record["cells"] = sum(backend.cell_count(raster) for raster in rasters)
+
+
+def nts_overlay(gdb_path, names):
+    #one pass over both layers with a spatial index on the townships (see townships.py),
+    #written to a table instead of a wall of prints
+    from .townships import OVERLAY_FIELDS, nts_township_pairs
+    _arcpy(gdb_path)
+    backend = get_backend("arcgis")
+    pairs = nts_township_pairs(backend, names.source(gdb_path, "N_NTS50"), names.source(gdb_path, "A_AB_Township"))
+    overlay_table = os.path.join(gdb_path, "NTS_Township_Overlay")
+    backend.write_table(overlay_table, OVERLAY_FIELDS, pairs)
+    print(f"{len(pairs)} NTS sheet / township pairs over {len(set(p[0] for p in pairs))} sheets written to {overlay_table}")
+
+
+def distance(gdb_path, names, source, out_raster, record=None):
+    arcpy = _arcpy(gdb_path)
+    arcpy.sa.DistanceAccumulation(names.source(gdb_path, source)).save(out_raster)
+    _cells(record, names.path(gdb_path, out_raster))
+    messages()
+
+
+def landcover_reclass(gdb_path, names, record=None):
+    _arcpy(gdb_path)
+    get_backend("arcgis").reclassify(names.source(gdb_path, "Landcover"), MODEL_REMAP, names.path(gdb_path, "LC_Reclass"))
+    _cells(record, names.path(gdb_path, "LC_Reclass"))
+    messages()
+
+
+def rescale(gdb_path, names, source, out_raster, focal_range=None, record=None):
+    #the inversion on the appeal of the roads is opposite terrain in the values
+    _arcpy(gdb_path)
+    get_backend("arcgis").rescale(names.source(gdb_path, source), names.path(gdb_path, out_raster), *RESCALE,
+                                  focal_range=focal_range)
+    _cells(record, names.path(gdb_path, out_raster))
+    messages()
+
+
+def weighted_sum(gdb_path, names, weights, record=None):
+    _arcpy(gdb_path)
+    factors = [(names.source(gdb_path, FACTOR_RASTERS[f]), weights[f]) for f in FACTORS]
+    get_backend("arcgis").weighted_sum(factors, names.path(gdb_path, "Combined_Rasters"))
+    _cells(record, names.path(gdb_path, "Combined_Rasters"))
+    messages()
+
+
+def weight_scenarios(gdb_path, names, scenarios, record=None):
+    #one cost surface per weight scenario, all from one pass over the rescaled factors (see overlay.py)
+    _arcpy(gdb_path)
+    factors = {f: names.source(gdb_path, FACTOR_RASTERS[f]) for f in FACTORS}
+    outputs = {s: names.path(gdb_path, scenario_raster(s)) for s in scenarios}
+    get_backend("arcgis").weighted_overlay(factors, scenarios, outputs)
+    _cells(record, *outputs.values())
+    print(f"{len(outputs)} scenario cost surfaces written: {', '.join(scenario_raster(s) for s in scenarios)}")
+
+
+def optimal_routes(gdb_path, names, pyramid=(), record=None):
+    #connect the bear habitat over the combined cost surface, coarse-to-fine if a pyramid is given
+    _arcpy(gdb_path)
+    cost = names.source(gdb_path, "Combined_Rasters")
+    get_backend("arcgis").optimal_region_connections(names.source(gdb_path, "W_Bear_Habita"), "Paths", cost, pyramid)
+    _cells(record, cost)
+    messages()
+
+
+def scenario_routes(gdb_path, names, scenarios, record=None):
+    #connect the bear habitat over every scenario's cost surface; the local backend builds the cost graph once
+    _arcpy(gdb_path)
+    surfaces = {s: names.source(gdb_path, scenario_raster(s)) for s in scenarios}
+    outputs = {s: names.path(gdb_path, scenario_paths(s)) for s in scenarios}
+    get_backend("arcgis").scenario_routes(names.source(gdb_path, "W_Bear_Habita"), surfaces, outputs)
+    _cells(record, *surfaces.values())
+    print(f"{len(outputs)} scenario routes written: {', '.join(scenario_paths(s) for s in scenarios)}")
+
+
+def zonal_summary(gdb_path, names, record=None):
+    #elevation stats and landcover area per zone come out of one pass over the zones
+    _arcpy(gdb_path)
+    dem = names.source(gdb_path, "D_ab_dem")
+    get_backend("arcgis").zonal_summary(names.source(gdb_path, "K_KCountry_Bo"), "OBJECTID", dem,
+                                        names.source(gdb_path, "LC_Reclass"), ZONAL_TABLE, AREA_TABLE, 25)
+    _cells(record, dem)
+    print(f"Zonal statistics table '{ZONAL_TABLE}' and TabulateArea table '{AREA_TABLE}' created.")
+
+
+def build_pipeline(gdb_path, names, weights, pyramid=(), scenarios=None):
+    #the model as a graph of stages (working names in, working names out); the distance
+    #surfaces don't depend on one another, so they run side by side. Every stage calls arcpy,
+    #which isn't thread-safe (it shares arcpy.env across threads), so they all go to processes
+    stages = [Stage("nts_overlay", nts_overlay, ["N_NTS50", "A_AB_Township"], ["NTS_Township_Overlay"],
+                    args=(gdb_path, names))]
+    for factor, source, out_raster in [("roads", "K_Road", "Distance_to_Roads"),
+                                       ("trails", "K_Trails", "Distance_to_Trails"),
+                                       ("hydro", "K_Hydro", "Distance_to_Hydro")]:
+        stages.append(Stage(f"distance:{factor}", distance, [source], [out_raster],
+                            args=(gdb_path, names, source, out_raster), params={"cell_size": 25}, record=True))
+    #one stage per factor, each keyed on its own parameters, so a new weight
+    #only reruns the weighted sum and a new remap only the reclass
+    stages.append(Stage("landcover_reclass", landcover_reclass, ["Landcover"], ["LC_Reclass"], args=(gdb_path, names),
+                        params={"remap": MODEL_REMAP}, record=True))
+    for factor, (source, out_raster) in RESCALES.items():
+        params = {"rescale": list(RESCALE)}
+        focal_range = None
+        if factor == "terrain":
+            focal_range = 3
+            params["neighborhood"] = [3, 3, "CELL", "RANGE"]
+        stages.append(Stage(f"rescale:{factor}", rescale, [source], [out_raster],
+                            args=(gdb_path, names, source, out_raster, focal_range), params=params,
+                            record=True))
+    stages.append(Stage("weighted_sum", weighted_sum, [FACTOR_RASTERS[f] for f in FACTORS], ["Combined_Rasters"],
+                        args=(gdb_path, names, weights), params={"weights": {f: weights[f] for f in FACTORS}}, record=True))
+    if scenarios:
+        #--scenarios: a cost surface per weighting, beside the one for --weight
+        stages.append(Stage("scenarios", weight_scenarios, [FACTOR_RASTERS[f] for f in FACTORS],
+                            [scenario_raster(s) for s in scenarios], args=(gdb_path, names, scenarios),
+                            params={"scenarios": scenarios}, record=True))
+        #and the habitat routed over each of them (the local backend reuses one cost graph)
+        stages.append(Stage("scenario_routes", scenario_routes,
+                            ["W_Bear_Habita"] + [scenario_raster(s) for s in scenarios],
+                            [scenario_paths(s) for s in scenarios], args=(gdb_path, names, scenarios), record=True))
+    stages.append(Stage("optimal_routes", optimal_routes, ["W_Bear_Habita", "Combined_Rasters"], ["Paths"],
+                        args=(gdb_path, names, tuple(pyramid)), params={"pyramid": list(pyramid)} if pyramid else {},
+                        record=True))
+    stages.append(Stage("zonal_summary", zonal_summary, ["K_KCountry_Bo", "D_ab_dem", "LC_Reclass"],
+                        [ZONAL_TABLE, AREA_TABLE], args=(gdb_path, names),
+                        params={"statistics_type": "ALL", "processing_cell_size": 25}, record=True))
+    return Pipeline(stages)
+
+
+def select_steps(patterns, pipeline):
+    #(steps, model stage patterns or None for all of them) for --step; naming a
+    #model stage (e.g. "distance:*") runs the model step with just those stages
+    if not patterns:
+        return list(STEPS), None
+    steps = [s for s in STEPS if any(fnmatch.fnmatchcase(s, p) for p in patterns)]
+    stage_patterns = [p for p in patterns if pipeline.matching([p])]
+    unknown = [p for p in patterns if p not in stage_patterns and not any(fnmatch.fnmatchcase(s, p) for s in STEPS)]
+    if unknown:
+        raise ValueError(f"Unknown step(s) {unknown}, expected {list(STEPS)} or model stages {pipeline.order()}")
+    if "model" in steps or not stage_patterns:
+        return steps, None
+    return [s for s in STEPS if s in steps or s == "model"], stage_patterns
+
+
+#--- the other steps -----------------------------------------------------------
+
+def ingest(settings, backend, gdb_path, names, cache, profiler):
+    #project, clip and copy every dataset into the gdb (see ingest.py); the only
+    #step that uses the temp folder, so the only one that resets it
+    from .ingest import IngestSettings, run_ingest
+    from .projcache import DEFAULT_MAX_MB, ProjectionCache
+    temp_folder = settings.path("temp")
+    if os.path.exists(temp_folder):
+        shutil.rmtree(temp_folder, ignore_errors=True)
+    os.makedirs(temp_folder)
+    print("Temp data will be deleted if it already exists and then created afresh.")
+    #the study area doesn't need to have projection changed since already in NAD83 UTM Zone 11N
+    ingest_settings = IngestSettings(backend="arcgis", temp_folder=temp_folder, clip_boundary=settings.boundary,
+                                     landcover_workers=int(os.environ.get("LANDCOVER_WORKERS", 1)))
+    #kept outside temp and the gdb so reference layers are projected once, not once per run;
+    #PROJECTION_CACHE_MB=0 turns it off
+    cache_mb = float(os.environ.get("PROJECTION_CACHE_MB", DEFAULT_MAX_MB))
+    projections = ProjectionCache(settings.path("projection_cache"), cache_mb) if cache_mb > 0 else None
+    keys = run_ingest(list(settings.prefixes), settings.prefixes, gdb_path, ingest_settings,
+                      workers=workers_from_env("INGEST_WORKERS"), cache=cache, profiler=profiler, names=names,
+                      projections=projections)
+    print("All data processed and organized.\n")
+    return keys
+
+
+def area_summary(backend, gdb_path, names):
+    #hectares per landcover class, written with one NumPyArrayToTable instead of an InsertCursor loop
+    class_areas = zonal.class_areas(backend.read_array(names.source(gdb_path, AREA_TABLE)))
+    print("\nLandcover Area Summary (in hectares):")
+    labels = [LANDCOVER_LABELS.get(value, f"Class {value}") for value in class_areas]
+    area_ha = np.array(list(class_areas.values()), dtype=np.float64) / 10000
+    for label, ha in zip(labels, area_ha):
+        print(f"{label}: {ha:.2f} hectares")
+    backend.write_array(os.path.join(gdb_path, SUMMARY_TABLE),
+                        tables.from_columns(["Landcover_Type", "Area_ha"], [labels, area_ha]))
+    print(f"\nGDB table created: {SUMMARY_TABLE}")
+
+
+def export_maps(settings, gdb_path, profiler):
+    #the layout is a job in the map queue (see maps.py); set MAP_EXPORT=queue to only queue it
+    #and render later with python -m kananaskis.maps --queue <base>\map_queue
+    from .maps import LayoutJob, MapQueue, run_queue
+    queue = MapQueue(settings.path("map_queue"))
+    queue.submit(LayoutJob(name=settings.map_name, gdb=gdb_path, out_file=settings.path(settings.map_name + ".pdf"),
+                           template=settings.path(settings.template),
+                           #the filled-in project is kept as a copy, the original is left alone
+                           aprx_copy=settings.path(settings.map_name + ".aprx"),
+                           title=settings.map_title, legend_title=settings.legend_title, scale=settings.map_scale))
+    if os.environ.get("MAP_EXPORT", "now") == "now":
+        run_queue(queue, workers=workers_from_env("MAP_WORKERS"), profiler=profiler)
+    else:
+        print(f"Map layout queued in {queue.folder}.")
+
+
+def report(backend, gdb_path):
+    #route length, then what ended up in the gdb
+    total_length = tables.total(backend.feature_array(os.path.join(gdb_path, "Paths"), ["SHAPE@LENGTH"]),
+                                "SHAPE@LENGTH")
+    print(f"\nTotal length of optimal routes: {total_length / 1000:.2f} km")
+    print("\nFinal Dataset Summary\n")
+    print("Feature Classes:")
+    for fc in backend.list_feature_classes(gdb_path):
+        desc = backend.describe(os.path.join(gdb_path, fc))
+        print(f"Name: {fc}")
+        print(f"  Shape Type: {desc.shapeType}")
+        print(f"  Spatial Ref Name: {desc.spatialReference.name}")
+        print(f"  Spatial Ref Type: {desc.spatialReference.type}")
+    print("Raster Datasets:")
+    for raster in backend.list_rasters(gdb_path):
+        desc = backend.describe(os.path.join(gdb_path, raster))
+        print(f"Name: {raster}")
+        print(f"  Raster Format: {desc.format}")
+        print(f"  Data Type: {desc.datasetType}")
+        print(f"  Pixel Type: {desc.pixelType}")
+        print(f"  Spatial Ref Name: {desc.spatialReference.name}")
+        print(f"  Spatial Ref Type: {desc.spatialReference.type}")
+        print(f"  Cell Size (X, Y): ({desc.meanCellWidth}, {desc.meanCellHeight})")
+    print("\nTables:")
+    for table in backend.list_tables(gdb_path):
+        print(f"Name: {table}")
+    print("\nAll dataset names finalized and summary complete. Ready for submission.")
+
+
+def run(settings, steps=STEPS, stages=None, weights=None, force=False, only=None, pyramid=(), scenarios=None):
+    #the selected steps in order. A full run builds into a staging gdb and
+    #publishes it at the end, or throws it away if anything fails, so the
+    #published gdb is always the last complete one; a partial run works on
+    #the published gdb
+    weights = dict(DEFAULT_WEIGHTS, **(weights or {}))
+    full = list(steps) == list(STEPS) and stages is None
+    names = settings.names
+    #arcpy gets imported here, once there is something to run. Only the ingest and the model
+    #use Spatial Analyst, so a run of just the summary, maps or report leaves the extension alone
+    backend = get_backend("arcgis", spatial=False)
+    spatial = "ingest" in steps or "model" in steps
+    if spatial:
+        import arcpy
+        arcpy.CheckOutExtension("Spatial")
+        print("Spatial Extension Engaged!")
+
+    try:
+        #wall/CPU time, memory and sizes of every stage, appended to run_profile.jsonl
+        profiler = Profiler(settings.path("run_profile.jsonl"))
+        #remembers a fingerprint of every stage's inputs and parameters between runs;
+        #--force rebuilds everything into an empty staging gdb
+        cache = StageCache(settings.path("pipeline_cache.json"), force=force, only=only, exists=backend.exists)
+        staging = staging_path(settings.gdb)
+        gdb_path = settings.gdb
+        if full:
+            gdb_path = checkout(backend, settings.gdb, staging)
+            if not force:
+                #what this run doesn't rebuild is read from the published gdb
+                names = names.reading_through(settings.gdb)
+
+        try:
+            if "ingest" in steps:
+                keys = ingest(settings, backend, gdb_path, names, cache, profiler)
+            else:
+                #chain onto the keys the last ingest recorded
+                keys = cache.recorded("ingest:")
+            if "model" in steps:
+                #stages run as soon as their inputs are ready, up to PIPELINE_WORKERS at once
+                print("For nosy folks who want to know the 1:50,000 NTS map sheets and the TWP-TGE-MER that covers the "
+                      "park, hold onto your socks...")
+                model = build_pipeline(gdb_path, names, weights, pyramid, scenarios)
+                model.run(workers=workers_from_env("PIPELINE_WORKERS"), cache=cache, profiler=profiler, sources=keys,
+                          select=stages, resolve=lambda name: names.source(gdb_path, name))
+            if "area_summary" in steps:
+                with profiler.stage("area_summary"):
+                    area_summary(backend, gdb_path, names)
+            if "publish" in steps and gdb_path == staging:
+                #everything was written under its final name, so there's nothing left to rename; carry the
+                #unchanged datasets over and swap the staging gdb in (before the layout opens anything in it)
+                gdb_path = publish(backend, gdb_path, settings.gdb, fresh=force)
+        finally:
+            #still on the staging gdb means the run stopped before it was published
+            if gdb_path == staging:
+                discard(backend, staging, settings.gdb)
+        if "maps" in steps:
+            export_maps(settings, gdb_path, profiler)
+        if "report" in steps:
+            report(backend, gdb_path)
+
+        #where did the time go? (full records are in run_profile.jsonl)
+        print(f"\nStage timings for run {profiler.run_id}, most expensive first:")
+        print(profiler.summary())
+        return gdb_path
+    finally:
+        #check in spatial extension when finished, whether or not the run made it
+        if spatial:
+            import arcpy
+            arcpy.CheckInExtension("Spatial")
+            print("Spatial Extension Disengaged!")
+
+
+def main(argv=None, settings=None):
+    parser = argparse.ArgumentParser(description="Kananaskis bear habitat pipeline")
+    parser.add_argument("--base", help="project folder holding the inputs (default: the one in the settings)")
+    parser.add_argument("--step", action="append", metavar="STEP",
+                        help=f"run only these steps ({', '.join(STEPS)}) or model stages, e.g. --step 'distance:*' "
+                             "(repeatable); skips the temp reset, checkout and publish of a full run")
+    parser.add_argument("--force", action="store_true", help="ignore the stage cache and rebuild the gdb from scratch")
+    parser.add_argument("--only", action="append", metavar="STAGE",
+                        help="rebuild only these stages, e.g. --only weighted_sum --only 'rescale:*' (repeatable)")
+    parser.add_argument("--weight", action="append", metavar="FACTOR=VALUE",
+                        help=f"weighted sum weight for one factor ({', '.join(FACTORS)}), e.g. --weight roads=2 (repeatable)")
+    parser.add_argument("--scenarios", metavar="CSV",
+                        help="weight scenarios (a 'scenario' column plus one column per factor, 1 if left out); "
+                             "writes a Scenario_<name> cost surface for each in one pass over the rescaled factors")
+    parser.add_argument("--pyramid", action="store_true",
+                        help="route coarse-to-fine over 100 m and 400 m copies of the cost surface, refining only "
+                             "inside a corridor at 25 m (for study areas too big to route at full resolution)")
+    parser.add_argument("--dry-run", action="store_true",
+                        help="print the steps, the model's waves and critical path (timed from run_profile.jsonl), then stop")
+    args = parser.parse_args(argv)
+
+    settings = settings or ProjectSettings()
+    if args.base:
+        settings = replace(settings, base_folder=args.base, folder_prefixes={}, study_area=None)
+    try:
+        weights = dict(DEFAULT_WEIGHTS, **parse_weights(args.weight))
+    except ValueError as e:
+        parser.error(str(e))
+    scenarios = None
+    if args.scenarios:
+        try:
+            scenarios = load_scenarios(args.scenarios)
+        except (OSError, ValueError) as e:
+            parser.error(str(e))
+    pyramid = ROUTE_PYRAMID if args.pyramid else ()
+    pipeline = build_pipeline(settings.gdb, settings.names, weights, pyramid, scenarios)
+    try:
+        steps, stages = select_steps(args.step, pipeline)
+    except ValueError as e:
+        parser.error(str(e))
+    if args.dry_run:
+        print(f"steps: {', '.join(steps)}")
+        if stages:
+            print(f"model stages: {', '.join(pipeline.matching(stages))}")
+        if "model" in steps:
+            print(pipeline.plan(stage_costs(settings.path("run_profile.jsonl")), workers_from_env("PIPELINE_WORKERS")))
+        return 0
+    run(settings, steps, stages, weights, args.force, args.only, pyramid, scenarios)
+    return 0
@@ -0,0 +1,127 @@
+#-------------------------------------------------------------------------------
+# Name:        profiling
+# Purpose:     per-stage telemetry. Every stage (or single tool call) wrapped in
+#              Profiler.stage() gets wall time, CPU time (including child
+#              processes where the OS reports it), resident / peak memory,
+#              input sizes on disk and the number of cells it touched. Records
+#              are appended to a JSON lines file as they finish and summarised,
+#              most expensive first, at the end of the run.
+#-------------------------------------------------------------------------------
+import json
+import os
+import sys
+import time
+import uuid
+from contextlib import contextmanager
+
+from .cache import dataset_files
+
+MB = 1024 * 1024
+
+
+def _windows_memory():
+    import ctypes
+    from ctypes import wintypes
+
+    class Counters(ctypes.Structure):
+        _fields_ = [("cb", wintypes.DWORD), ("PageFaultCount", wintypes.DWORD),
+                    ("PeakWorkingSetSize", ctypes.c_size_t), ("WorkingSetSize", ctypes.c_size_t),
+                    ("QuotaPeakPagedPoolUsage", ctypes.c_size_t), ("QuotaPagedPoolUsage", ctypes.c_size_t),
+                    ("QuotaPeakNonPagedPoolUsage", ctypes.c_size_t), ("QuotaNonPagedPoolUsage", ctypes.c_size_t),
+                    ("PagefileUsage", ctypes.c_size_t), ("PeakPagefileUsage", ctypes.c_size_t)]
+
+    counters = Counters()
+    counters.cb = ctypes.sizeof(counters)
+    process = ctypes.windll.kernel32.GetCurrentProcess()
+    ctypes.windll.psapi.GetProcessMemoryInfo(process, ctypes.byref(counters), counters.cb)
+    return counters.WorkingSetSize, counters.PeakWorkingSetSize
+
+
+def memory():
+    #(current RSS, peak RSS) of this process in bytes; None where unknown
+    if sys.platform == "win32":
+        return _windows_memory()
+    import resource
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    peak = peak if sys.platform == "darwin" else peak * 1024
+    rss = None
+    try:
+        with open("/proc/self/statm") as f:
+            rss = int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except OSError:
+        pass
+    return rss, peak
+
+
+def cpu_times():
+    #(own CPU seconds, CPU seconds of finished child processes)
+    t = os.times()
+    return t.user + t.system, t.children_user + t.children_system
+
+
+def dataset_bytes(paths):
+    total = 0
+    for path in paths:
+        for f in dataset_files(path):
+            try:
+                total += os.path.getsize(f)
+            except OSError:
+                pass
+    return total
+
+
+class Profiler:
+    def __init__(self, log_path=None, run_id=None):
+        self.log_path = log_path
+        self.run_id = run_id or uuid.uuid4().hex[:12]
+        self.records = []
+
+    @contextmanager
+    def stage(self, name, inputs=(), cells=None, **extra):
+        #the yielded dict can be filled in by the caller (e.g. cells once the
+        #output raster is known); it's written out when the block finishes
+        record = {"stage": name, "cells": cells, "input_bytes": dataset_bytes(inputs), **extra}
+        _, peak_before = memory()
+        cpu0, child0 = cpu_times()
+        start = time.perf_counter()
+        try:
+            yield record
+            record.setdefault("status", "ok")
+        except BaseException as e:
+            record["status"] = f"error: {type(e).__name__}"
+            raise
+        finally:
+            cpu1, child1 = cpu_times()
+            rss, peak = memory()
+            record.update({
+                "wall_s": round(time.perf_counter() - start, 4),
+                "cpu_s": round(cpu1 - cpu0, 4),
+                "child_cpu_s": round(child1 - child0, 4),
+                "rss_mb": None if rss is None else round(rss / MB, 1),
+                "peak_rss_mb": None if peak is None else round(peak / MB, 1),
+                "peak_growth_mb": None if peak is None else round((peak - peak_before) / MB, 1),
+            })
+            self.add(record)
+
+    def add(self, record):
+        #also used for records measured in worker processes
+        record = dict(record, run=self.run_id)
+        record.setdefault("time", time.strftime("%Y-%m-%dT%H:%M:%S"))
+        self.records.append(record)
+        if self.log_path:
+            with open(self.log_path, "a") as f:
+                f.write(json.dumps(record) + "\n")
+
+    def summary(self, top=None):
+        #text table, most expensive (wall time) stage first
+        records = sorted(self.records, key=lambda r: r.get("wall_s") or 0, reverse=True)[:top]
+        total = sum(r.get("wall_s") or 0 for r in self.records) or 1
+        lines = [f"{'stage':<40} {'wall s':>9} {'%':>5} {'cpu s':>9} {'peak MB':>9} {'input MB':>9} {'cells':>13}"]
+        for r in records:
+            peak = r.get("peak_rss_mb")
+            cells = r.get("cells")
+            lines.append(f"{r['stage'][:40]:<40} {r.get('wall_s', 0):>9.2f} {100 * (r.get('wall_s') or 0) / total:>5.1f} "
+                         f"{(r.get('cpu_s') or 0) + (r.get('child_cpu_s') or 0):>9.2f} "
+                         f"{'' if peak is None else f'{peak:.0f}':>9} {(r.get('input_bytes') or 0) / MB:>9.1f} "
+                         f"{'' if cells is None else f'{cells:,}':>13}")
+        return "\n".join(lines)
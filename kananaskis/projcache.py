@@ -0,0 +1,131 @@
+#-------------------------------------------------------------------------------
+# Name:        projcache
+# Purpose:     projected and clipped inputs kept between runs. The reference
+#              layers (AB_Township, NTS50, the DEM, ...) only change when the
+#              province republishes them, yet every run and every study area
+#              used to reproject them again. Each ingest result is filed under
+#              a key made from the source's files (path, size, mtime), the
+#              target CRS, the cell size and a content hash of the boundary it
+#              was clipped to, so the next run with the same key copies it back
+#              instead. Once the folder grows past its cap the least recently
+#              used entries go. Workers only read entries or write *.part
+#              folders; the parent files them and owns the index.
+#-------------------------------------------------------------------------------
+import hashlib
+import json
+import os
+import shutil
+import time
+
+from .cache import _hash_files, dataset_files
+
+DEFAULT_MAX_MB = 20000
+
+#a .part folder this old belongs to a run that died, not one still writing it
+STALE_PART_S = 24 * 3600
+
+
+def source_identity(path):
+    #[file, size, mtime] for every file of the dataset: cheap enough to take for
+    #a multi-gigabyte DEM on every run, and republishing it changes it
+    files = dataset_files(path)
+    if not files:
+        raise FileNotFoundError(f"No files found for dataset {path}")
+    return [[os.path.abspath(f), os.stat(f).st_size, os.stat(f).st_mtime_ns] for f in sorted(files)]
+
+
+def folder_bytes(path):
+    return sum(os.path.getsize(f) for f in dataset_files(path))
+
+
+class ProjectionCache:
+    def __init__(self, folder, max_mb=DEFAULT_MAX_MB):
+        self.folder = folder
+        self.max_bytes = int(max_mb * 1024 * 1024)
+        os.makedirs(folder, exist_ok=True)
+        self.index_path = os.path.join(folder, "index.json")
+        self.index = self._load()
+        self.hits = 0
+        self.misses = 0
+
+    def _load(self):
+        try:
+            with open(self.index_path) as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {"entries": {}, "files": {}}
+
+    def key(self, source, boundary, params=None):
+        #params: target CRS, cell size and whatever else changes the result.
+        #The boundary is hashed by content since batch runs rewrite their
+        #envelope every time, usually with the same polygon
+        boundary_files = dataset_files(boundary)
+        if not boundary_files:
+            raise FileNotFoundError(f"No files found for dataset {boundary}")
+        payload = {
+            "source": source_identity(source),
+            "boundary": _hash_files(boundary_files, self.index["files"]),
+            "params": params,
+        }
+        return hashlib.sha1(json.dumps(payload, sort_keys=True, default=str).encode()).hexdigest()
+
+    def lookup(self, key):
+        #path of the cached dataset, or None; a hit counts as a use
+        entry = self.index["entries"].get(key)
+        if entry is not None:
+            path = os.path.join(self.folder, key, entry["name"])
+            if dataset_files(path):
+                entry["used"] = time.time()
+                self.hits += 1
+                return path
+            del self.index["entries"][key]
+        self.misses += 1
+        return None
+
+    def part(self, key):
+        #folder a worker copies a fresh result into, for add() to file under the key
+        return os.path.join(self.folder, f"{key}.{os.getpid()}.part")
+
+    def add(self, key, kept, source):
+        #kept is the dataset a worker left in part(key)
+        final = os.path.join(self.folder, key)
+        shutil.rmtree(final, ignore_errors=True)
+        os.replace(os.path.dirname(kept), final)
+        self.index["entries"][key] = {
+            "name": os.path.basename(kept),
+            "source": source,
+            "bytes": folder_bytes(final),
+            "used": time.time(),
+        }
+        self.save()
+
+    def evict(self):
+        #drop least recently used entries until the folder is under the cap;
+        #only called between runs of workers, never while one may be reading
+        entries = self.index["entries"]
+        total = sum(entry["bytes"] for entry in entries.values())
+        for key in sorted(entries, key=lambda k: entries[k]["used"]):
+            if total <= self.max_bytes:
+                break
+            total -= entries[key]["bytes"]
+            print(f"[projection cache] evicting {entries[key]['source']} ({entries[key]['bytes'] / 1e6:.1f} MB)")
+            shutil.rmtree(os.path.join(self.folder, key), ignore_errors=True)
+            del entries[key]
+        now = time.time()
+        for name in os.listdir(self.folder):
+            path = os.path.join(self.folder, name)
+            if name.endswith(".part") and os.path.isdir(path) and now - os.path.getmtime(path) > STALE_PART_S:
+                shutil.rmtree(path, ignore_errors=True)
+        self.save()
+        return total
+
+    def save(self):
+        #another run sharing the folder may have filed entries since this one
+        #loaded the index; keep those whose data is still there
+        for key, entry in self._load()["entries"].items():
+            if key not in self.index["entries"] and os.path.isdir(os.path.join(self.folder, key)):
+                self.index["entries"][key] = entry
+        tmp = self.index_path + f".{os.getpid()}.part"
+        with open(tmp, "w") as f:
+            json.dump(self.index, f, indent=1, sort_keys=True)
+        os.replace(tmp, self.index_path)
@@ -0,0 +1,117 @@
+#-------------------------------------------------------------------------------
+# Name:        publish
+# Purpose:     outputs go straight to their final names, built in a staging
+#              gdb. OutputManifest maps the working names the stages are
+#              written in terms of (D_ab_dem, Combined_Rasters, ...) to the names
+#              the deliverable uses (DEM, OptimalRoutes, ...), so nothing has to
+#              be renamed or copied afterwards. A run builds in a staging gdb
+#              that starts empty and only gets what the run writes; whatever
+#              it hasn't written (yet) is read from the last published gdb,
+#              so the stage cache still finds the outputs it can reuse. The
+#              published gdb is never touched while the run works: publish()
+#              carries the datasets the run didn't rewrite over into the
+#              staging gdb and swaps it in once the run has succeeded, and
+#              discard() throws it away when it hasn't.
+#-------------------------------------------------------------------------------
+import os
+
+from .backends import get_backend
+
+
+class OutputManifest:
+    #arcpy names are case-insensitive, so lookups are too. fallback is the
+    #published gdb a staging gdb reads through (see source())
+    def __init__(self, renames=(), fallback=None, backend="arcgis"):
+        self.renames = {old.lower(): new for old, new in renames}
+        self.fallback = fallback
+        self.backend = backend
+
+    def __call__(self, name):
+        return self.renames.get(name.lower(), name)
+
+    def path(self, workspace, name):
+        return os.path.join(workspace, self(name))
+
+    def reading_through(self, published, backend="arcgis"):
+        #the same names for a run building into a staging gdb over `published`
+        return OutputManifest(self.renames.items(), published, backend)
+
+    def source(self, workspace, name):
+        #where to read a dataset from: the workspace if the run has written it
+        #there, else the published gdb if it's there (unchanged since then)
+        path = self.path(workspace, name)
+        if self.fallback is None or os.path.abspath(workspace) == os.path.abspath(self.fallback):
+            return path
+        backend = get_backend(self.backend)
+        if backend.exists(path):
+            return path
+        published = self.path(self.fallback, name)
+        return published if backend.exists(published) else path
+
+
+def staging_path(gdb_path):
+    root, ext = os.path.splitext(gdb_path)
+    return f"{root}_staging{ext}"
+
+
+def checkout(backend, gdb_path, staging=None):
+    #an empty staging gdb for this run; reads of what it hasn't written go to
+    #the published gdb (OutputManifest.source). A staging gdb still there is
+    #from a run that died part way, so it goes first
+    staging = staging or staging_path(gdb_path)
+    if backend.exists(staging):
+        backend.delete(staging)
+    folder, name = os.path.split(staging)
+    backend.create_file_gdb(folder, name)
+    print(f"Staging geodatabase created; {gdb_path} stays published until this run succeeds.")
+    return staging
+
+
+def datasets(backend, workspace):
+    #names of every feature class, raster and table in a gdb
+    found = backend.list_feature_classes(workspace) + backend.list_rasters(workspace) + backend.list_tables(workspace)
+    return sorted({os.path.splitext(name)[0] for name in found})
+
+
+def carry(backend, staging, gdb_path):
+    #the published datasets the run didn't rewrite, into the staging gdb so
+    #it's complete before it's swapped in
+    carried = [name for name in datasets(backend, gdb_path) if not backend.exists(os.path.join(staging, name))]
+    for name in carried:
+        backend.carry_dataset(os.path.join(gdb_path, name), os.path.join(staging, name))
+    if carried:
+        print(f"Carried {len(carried)} unchanged dataset(s) over from {gdb_path}.")
+    return carried
+
+
+def discard(backend, staging, gdb_path):
+    #a run that didn't make it: its staging gdb goes, the published one was never touched
+    if backend.exists(staging):
+        backend.delete(staging)
+        print(f"Discarded {staging}; {gdb_path} is unchanged.")
+
+
+def publish(backend, staging, gdb_path, fresh=False):
+    #swap the staging gdb in under the published name, with the datasets it
+    #didn't rewrite carried over unless fresh (a rebuild from scratch) is set.
+    #Whatever is published now is moved aside first and only deleted once the
+    #swap has worked, so a failure leaves one complete gdb in place
+    previous = None
+    if backend.exists(gdb_path) and not fresh:
+        carry(backend, staging, gdb_path)
+    if backend.exists(gdb_path):
+        root, ext = os.path.splitext(gdb_path)
+        previous = f"{root}_previous{ext}"
+        if backend.exists(previous):
+            backend.delete(previous)
+        backend.rename(gdb_path, previous)
+    try:
+        backend.rename(staging, gdb_path)
+    except Exception:
+        if previous:
+            backend.rename(previous, gdb_path)
+        raise
+    if previous:
+        backend.delete(previous)
+    print(f"Published {staging} as {gdb_path}.")
+    return gdb_path
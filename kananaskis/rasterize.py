@@ -0,0 +1,193 @@
+#-------------------------------------------------------------------------------
+# Name:        rasterize
+# Purpose:     scanline polygon fill onto a Grid (cell centre rule), used by the
+#              local backend for masks and PolygonToRaster, plus an
+#              area-weighted majority fill (PolygonToRaster's
+#              MAXIMUM_COMBINED_AREA) for landcover. The majority fill measures
+#              every class's coverage along a few scanlines per row, in row
+#              bands, picks the winning class per cell and maps it through the
+#              remap as a lookup table on the way out, so there's no separate
+#              Reclassify pass; bands can go to worker processes.
+#-------------------------------------------------------------------------------
+import math
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+from . import geometry
+
+
+def _crossings(edges, grid, row0=0, row1=None, sub=1):
+    #(rows, x_in, x_out) for every stretch of a scanline inside the edges'
+    #rings (even-odd rule); x in fractional grid columns. Scanlines run through
+    #the centres of `sub` equal slices of each row, rows [row0, row1) counted
+    #in slices
+    row1 = grid.nrows * sub if row1 is None else row1
+    height = grid.cell / sub
+    empty = np.empty(0, dtype=np.int64), np.empty(0), np.empty(0)
+    edges = edges[edges[:, 1] != edges[:, 3]]
+    if len(edges) == 0:
+        return empty
+    ylo = np.minimum(edges[:, 1], edges[:, 3]).min()
+    yhi = np.maximum(edges[:, 1], edges[:, 3]).max()
+    r_start = max(row0, int(math.floor((grid.ymax - yhi) / height - 0.5)))
+    r_end = min(row1, int(math.ceil((grid.ymax - ylo) / height - 0.5)) + 1)
+    if r_start >= r_end:
+        return empty
+    x1, y1, x2, y2 = edges.T
+    step = max(1, 2_000_000 // max(1, len(edges)))
+    out_rows, out_in, out_out = [], [], []
+    for band in range(r_start, r_end, step):
+        rows = np.arange(band, min(band + step, r_end))
+        yc = grid.ymax - (rows + 0.5) * height
+        crosses = (y1[None, :] > yc[:, None]) != (y2[None, :] > yc[:, None])
+        ri, ei = np.nonzero(crosses)
+        if len(ri) == 0:
+            continue
+        xs = x1[ei] + (yc[ri] - y1[ei]) * (x2[ei] - x1[ei]) / (y2[ei] - y1[ei])
+        order = np.lexsort((xs, ri))
+        ri, xs = ri[order], (xs[order] - grid.xmin) / grid.cell
+        #closed rings cross every scanline an even number of times, so after
+        #sorting, crossings pair up (in, out) within each row
+        out_rows.append(rows[ri[0::2]])
+        out_in.append(xs[0::2])
+        out_out.append(xs[1::2])
+    if not out_rows:
+        return empty
+    return np.concatenate(out_rows), np.concatenate(out_in), np.concatenate(out_out)
+
+
+def _spans(edges, grid, row0=0, row1=None):
+    #(rows, col_starts, col_ends) of the cells whose centres fall inside
+    rows, x_in, x_out = _crossings(edges, grid, row0, row1)
+    c0 = np.clip(np.ceil(x_in - 0.5).astype(np.int64), 0, grid.ncols)
+    c1 = np.clip(np.ceil(x_out - 0.5).astype(np.int64), 0, grid.ncols)
+    keep = c1 > c0
+    return rows[keep], c0[keep], c1[keep]
+
+
+def _scan_spans(rings, grid, row0=0, row1=None):
+    #yield (row, col_start, col_end) spans whose cell centres fall inside the
+    #rings (even-odd rule), restricted to rows [row0, row1)
+    for r, c0, c1 in zip(*_spans(geometry._edges(rings), grid, row0, row1)):
+        yield r, c0, c1
+
+
+def polygon_mask(geom, grid):
+    mask = np.zeros(grid.shape, dtype=bool)
+    for poly in geometry.polygons(geom):
+        for r, c0, c1 in _scan_spans(poly, grid):
+            mask[r, c0:c1] = True
+    return mask
+
+
+def rasterize(shapes, grid, dtype, fill):
+    #burn (geometry, value) pairs, later shapes win where they overlap
+    out = np.full(grid.shape, fill, dtype=dtype)
+    for geom, value in shapes:
+        for poly in geometry.polygons(geom):
+            for r, c0, c1 in _scan_spans(poly, grid):
+                out[r, c0:c1] = value
+    return out
+
+
+def _band_majority(grid, r0, r1, polys, nclasses, samples):
+    #(winning class index, covered fraction) for rows r0:r1. Each row is cut
+    #into `samples` scanlines; the inside stretches of every scanline are
+    #exact in x, so a cell's coverage is the length of each stretch over it.
+    #Whole cells go into a difference array (one running sum per class) and
+    #the partial cells at either end are added directly, so the cost is a few
+    #whole-array passes however many polygons there are
+    nrows = r1 - r0
+    rows, starts, ends, classes = [], [], [], []
+    for edges, k in polys:
+        r, a, b = _crossings(edges, grid, r0 * samples, r1 * samples, samples)
+        rows.append(r // samples - r0)
+        starts.append(a)
+        ends.append(b)
+        classes.append(np.full(len(r), k, dtype=np.int64))
+    if not rows:
+        return np.zeros((nrows, grid.ncols), dtype=np.int64), np.zeros((nrows, grid.ncols))
+    shape = (nclasses, nrows, grid.ncols + 1)
+    size = nclasses * nrows * (grid.ncols + 1)
+    r, k = np.concatenate(rows), np.concatenate(classes)
+    a = np.clip(np.concatenate(starts), 0, grid.ncols)
+    b = np.clip(np.concatenate(ends), 0, grid.ncols)
+    ia, ib = np.floor(a).astype(np.int64), np.floor(b).astype(np.int64)
+    row_base = (k * nrows + r) * (grid.ncols + 1)
+    same, cross = ia == ib, ia != ib
+    #partial cells: a stretch inside one cell, else the first and last cells
+    #it touches; the whole cells in between go into the difference array
+    part_idx = np.concatenate([row_base[same] + ia[same], row_base[cross] + ia[cross], row_base[cross] + ib[cross]])
+    part_len = np.concatenate([(b - a)[same], (ia + 1 - a)[cross], (b - ib)[cross]])
+    cover = np.bincount(part_idx, part_len, minlength=size).reshape(shape)
+    n = int(cross.sum())
+    steps = np.bincount(np.concatenate([row_base[cross] + ia[cross] + 1, row_base[cross] + ib[cross]]),
+                        np.repeat([1.0, -1.0], n), minlength=size).reshape(shape)
+    cover += np.cumsum(steps, axis=2)
+    #running best over the classes (cheaper than argmax down the first axis)
+    best = np.zeros((nrows, grid.ncols), dtype=np.int64)
+    top = cover[0, :, :-1].copy()
+    total = top.copy()
+    for i in range(1, nclasses):
+        layer = cover[i, :, :-1]
+        wins = layer > top
+        best[wins] = i
+        np.maximum(top, layer, out=top)
+        total += layer
+    return best, total / samples
+
+
+def _band_rows(grid, nclasses, samples, memory_bytes=64 * 1024 * 1024):
+    #rows per band so the coverage counts (plus their running sum) fit the budget
+    per_row = nclasses * (grid.ncols + 1) * 8 * 3
+    return max(1, min(grid.nrows, memory_bytes // max(1, per_row)))
+
+
+def rasterize_majority(shapes, grid, lut=None, fill=-2147483648, samples=4, workers=1, dtype=np.int32):
+    #burn (geometry, class) pairs with an area-weighted majority per cell:
+    #coverage is measured along `samples` scanlines per row (exact across
+    #each) and every cell gets the class covering most of its area (overlaps
+    #count for every class involved; ties go to the smaller class). Cells less than half covered stay `fill`, which keeps the
+    #footprint of the cell centre rule along the outer edge. lut maps the
+    #winning class to the output value ({class: value or None for NoData});
+    #classes it doesn't mention keep their value
+    values = sorted({v for g, v in shapes if g is not None})
+    index = {v: i for i, v in enumerate(values)}
+    lut = lut or {}
+    out_values = np.array([fill if lut.get(v, v) is None else lut.get(v, v) for v in values] or [fill],
+                          dtype=dtype)
+    polys = []
+    for geom, value in shapes:
+        for rings in geometry.polygons(geom):
+            edges = geometry._edges(rings)
+            if len(edges):
+                ys = edges[:, [1, 3]]
+                polys.append((edges, index[value], ys.min(), ys.max()))
+    nclasses = max(1, len(values))
+    band = _band_rows(grid, nclasses, samples)
+    jobs = []
+    for r0 in range(0, grid.nrows, band):
+        r1 = min(r0 + band, grid.nrows)
+        top, bottom = grid.ymax - r0 * grid.cell, grid.ymax - r1 * grid.cell
+        jobs.append((r0, r1, [(e, k) for e, k, lo, hi in polys if hi >= bottom and lo <= top]))
+
+    out = np.full(grid.shape, fill, dtype=dtype)
+
+    def place(r0, r1, result):
+        best, covered = result
+        out[r0:r1] = np.where(covered >= 0.5, out_values[best], fill)
+
+    if workers is None:
+        workers = min(len(jobs), os.cpu_count() or 1)
+    if workers <= 1 or len(jobs) <= 1:
+        for r0, r1, band_polys in jobs:
+            place(r0, r1, _band_majority(grid, r0, r1, band_polys, nclasses, samples))
+        return out
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        futures = [(r0, r1, pool.submit(_band_majority, grid, r0, r1, band_polys, nclasses, samples))
+                   for r0, r1, band_polys in jobs]
+        for r0, r1, future in futures:
+            place(r0, r1, future.result())
+    return out
@@ -0,0 +1,314 @@
+#-------------------------------------------------------------------------------
+# Name:        routing
+# Purpose:     least-cost corridors between habitat regions, in the spirit of
+#              OptimalRegionConnections. The 8-connected grid graph is built
+#              once in CSR arrays; costs can be swapped in for a new weight
+#              scenario without rebuilding it. A single multi-source Dijkstra
+#              from every region gives each cell its nearest region, and the
+#              cheapest crossings between neighbouring regions feed a minimum
+#              spanning tree that becomes the connection network.
+#              scipy (shipped with ArcGIS Pro) is used for Dijkstra when it's
+#              importable, otherwise a heapq version runs. For big study areas
+#              coarse_to_fine() solves on a pyramid of the cost surface (e.g.
+#              400 m, then 100 m) and at each finer level only searches a
+#              buffered corridor around the coarser routes, so the work follows
+#              the corridor's area rather than the study area's.
+#-------------------------------------------------------------------------------
+import heapq
+import math
+from dataclasses import dataclass
+
+import numpy as np
+
+from .rasterize import rasterize
+
+try:
+    from scipy.sparse import csr_matrix
+    from scipy.sparse.csgraph import dijkstra as _scipy_dijkstra
+except ImportError:
+    csr_matrix = None
+
+#(row offset, col offset) for the 8 neighbours
+NEIGHBOURS = [(-1, -1), (-1, 0), (-1, 1), (0, -1), (0, 1), (1, -1), (1, 0), (1, 1)]
+
+
+class CostGraph:
+    #topology (which cells touch and how far apart their centres are) is kept
+    #separate from the cost values so a new surface is just a re-weighting
+    def __init__(self, valid, cell):
+        self.shape = valid.shape
+        self.cell = cell
+        self.valid = valid
+        nrows, ncols = valid.shape
+        ids = np.arange(valid.size).reshape(valid.shape)
+        us, vs, lengths = [], [], []
+        for dr, dc in NEIGHBOURS:
+            r0, r1 = max(0, -dr), nrows - max(0, dr)
+            c0, c1 = max(0, -dc), ncols - max(0, dc)
+            both = valid[r0:r1, c0:c1] & valid[r0 + dr:r1 + dr, c0 + dc:c1 + dc]
+            us.append(ids[r0:r1, c0:c1][both])
+            vs.append(ids[r0 + dr:r1 + dr, c0 + dc:c1 + dc][both])
+            lengths.append(np.full(int(both.sum()), cell * (math.sqrt(2) if dr and dc else 1.0)))
+        u = np.concatenate(us)
+        order = np.argsort(u, kind="stable")
+        self.u = u[order]
+        self.indices = np.concatenate(vs)[order]
+        self.lengths = np.concatenate(lengths)[order]
+        self.indptr = np.searchsorted(self.u, np.arange(valid.size + 1))
+        self.weights = None
+
+    @classmethod
+    def from_surface(cls, cost, cell):
+        graph = cls(np.isfinite(cost), cell)
+        return graph.with_costs(cost)
+
+    def with_costs(self, cost):
+        #ArcGIS cost distance: mean of the two cell costs times the step length
+        flat = np.asarray(cost, dtype=np.float64).ravel()
+        if flat.size != self.indptr.size - 1:
+            raise ValueError(f"Cost surface has {flat.size} cells, graph was built for {self.indptr.size - 1}")
+        weights = (flat[self.u] + flat[self.indices]) / 2 * self.lengths
+        if not np.isfinite(weights).all():
+            raise ValueError("Cost surface has NoData where the graph expects values; build a new graph")
+        self.weights = weights
+        return self
+
+    def matches(self, cost):
+        #same NoData footprint -> the topology can be reused as is
+        valid = np.isfinite(cost)
+        return valid.shape == self.shape and np.array_equal(valid, self.valid)
+
+    def dijkstra(self, sources):
+        #multi-source shortest paths: (distance, nearest source, predecessor)
+        n = self.indptr.size - 1
+        if csr_matrix is not None:
+            matrix = csr_matrix((self.weights, self.indices, self.indptr), shape=(n, n))
+            dist, pred, origin = _scipy_dijkstra(matrix, directed=True, indices=sources,
+                                                 return_predecessors=True, min_only=True)
+            pred = np.where(pred < 0, -1, pred)
+            return dist, origin, pred
+        return _heap_dijkstra(self.indptr, self.indices, self.weights, sources)
+
+
+def _heap_dijkstra(indptr, indices, weights, sources):
+    n = indptr.size - 1
+    dist = np.full(n, np.inf)
+    origin = np.full(n, -9999, dtype=np.int64)
+    pred = np.full(n, -1, dtype=np.int64)
+    heap = []
+    for s in sources:
+        dist[s] = 0.0
+        origin[s] = s
+        heap.append((0.0, int(s)))
+    heapq.heapify(heap)
+    indptr_l, indices_l, weights_l = indptr.tolist(), indices.tolist(), weights.tolist()
+    dist_l = dist.tolist()
+    done = bytearray(n)
+    while heap:
+        d, u = heapq.heappop(heap)
+        if done[u]:
+            continue
+        done[u] = 1
+        for e in range(indptr_l[u], indptr_l[u + 1]):
+            v = indices_l[e]
+            nd = d + weights_l[e]
+            if nd < dist_l[v]:
+                dist_l[v] = nd
+                origin[v] = origin[u]
+                pred[v] = u
+                heapq.heappush(heap, (nd, v))
+    return np.array(dist_l), origin, pred
+
+
+@dataclass
+class Connection:
+    region_a: int
+    region_b: int
+    cost: float
+    cells: list  # flat cell ids from region a to region b
+
+
+def _find(parent, x):
+    while parent[x] != x:
+        parent[x] = parent[parent[x]]
+        x = parent[x]
+    return x
+
+
+def candidate_connections(graph, regions):
+    #the cheapest crossing between every pair of touching catchments, as
+    #Connections sorted cheapest first; connect_regions picks its tree from these
+    labels = np.asarray(regions).ravel()
+    sources = np.nonzero(labels > 0)[0]
+    if len(np.unique(labels[sources])) < 2:
+        return []
+    dist, origin, pred = graph.dijkstra(sources)
+    reached = origin >= 0
+    region_of = np.zeros(labels.size, dtype=np.int64)
+    region_of[reached] = labels[origin[reached]]
+
+    u, v, w = graph.u, graph.indices, graph.weights
+    ra, rb = region_of[u], region_of[v]
+    cross = (ra > 0) & (rb > 0) & (ra < rb)
+    total = dist[u[cross]] + w[cross] + dist[v[cross]]
+    best = {}
+    for a, b, cost, e_u, e_v in zip(ra[cross].tolist(), rb[cross].tolist(), total.tolist(),
+                                    u[cross].tolist(), v[cross].tolist()):
+        if (a, b) not in best or cost < best[(a, b)][0]:
+            best[(a, b)] = (cost, e_u, e_v)
+    return [Connection(a, b, cost, _trace(pred, e_u)[::-1] + _trace(pred, e_v))
+            for (a, b), (cost, e_u, e_v) in sorted(best.items(), key=lambda item: item[1][0])]
+
+
+def connect_regions(graph, regions):
+    #regions: int array, 0 = not a habitat, 1..n = region ids
+    return spanning_tree(candidate_connections(graph, regions))
+
+
+def spanning_tree(candidates):
+    #Kruskal over the region graph gives the cheapest network joining them all
+    parent = {r: r for c in candidates for r in (c.region_a, c.region_b)}
+    connections = []
+    for c in candidates:
+        root_a, root_b = _find(parent, c.region_a), _find(parent, c.region_b)
+        if root_a == root_b:
+            continue
+        parent[root_a] = root_b
+        connections.append(c)
+    return connections
+
+
+def _trace(pred, cell):
+    path = [cell]
+    while pred[path[-1]] >= 0:
+        path.append(int(pred[path[-1]]))
+    return path
+
+
+def connection_lines(connections, grid):
+    #connections -> GeoJSON LineStrings through the cell centres
+    lines = []
+    for c in connections:
+        rows, cols = np.divmod(np.asarray(c.cells), grid.ncols)
+        xs, ys = grid.xmin + (cols + 0.5) * grid.cell, grid.ymax - (rows + 0.5) * grid.cell
+        lines.append(({"type": "LineString", "coordinates": np.column_stack([xs, ys]).tolist()},
+                      {"REGION_A": c.region_a, "REGION_B": c.region_b, "PATH_COST": c.cost}))
+    return lines
+
+
+def region_labels(geoms, grid):
+    #habitat polygons -> region ids 1..n (0 outside every region)
+    shapes = [(g, i + 1) for i, g in enumerate(geoms) if g is not None]
+    return rasterize(shapes, grid, np.int32, 0)
+
+
+def scenario_connections(surfaces, regions, cell):
+    #(scenario, cost array) pairs -> {scenario: connections}; overlay scenarios
+    #share a NoData footprint, so the graph is built once and only re-weighted.
+    #surfaces can be a generator, so only one cost surface is held at a time
+    graph, results = None, {}
+    for name, cost in surfaces:
+        if graph is None or not graph.matches(cost):
+            graph = CostGraph(np.isfinite(cost), cell)
+        results[name] = connect_regions(graph.with_costs(cost), regions)
+    return results
+
+
+def downsample(cost, factor):
+    #mean of the valid cells under each factor x factor block (NaN where none
+    #are), the same as the raster store's overviews of a float raster
+    nrows, ncols = cost.shape
+    nr, nc = -(-nrows // factor), -(-ncols // factor)
+    padded = np.full((nr * factor, nc * factor), np.nan)
+    padded[:nrows, :ncols] = cost
+    tiles = padded.reshape(nr, factor, nc, factor)
+    count = (~np.isnan(tiles)).sum(axis=(1, 3))
+    with np.errstate(invalid="ignore"):
+        return np.where(count > 0, np.nansum(tiles, axis=(1, 3)) / np.maximum(count, 1), np.nan)
+
+
+def downsample_labels(labels, factor):
+    #a coarse cell takes the highest region id under it, so no region vanishes
+    #unless another shares all of its coarse cells
+    nrows, ncols = labels.shape
+    nr, nc = -(-nrows // factor), -(-ncols // factor)
+    padded = np.zeros((nr * factor, nc * factor), dtype=labels.dtype)
+    padded[:nrows, :ncols] = labels
+    return padded.reshape(nr, factor, nc, factor).max(axis=(1, 3))
+
+
+def _dilate(mask, radius):
+    #square dilation by `radius` cells, separable running sums
+    out = mask
+    for axis in (0, 1):
+        counts = np.cumsum(np.moveaxis(out, axis, 0), axis=0, dtype=np.int64)
+        counts = np.concatenate([np.zeros((1,) + counts.shape[1:], dtype=np.int64), counts])
+        n = counts.shape[0] - 1
+        hi = np.minimum(np.arange(n) + radius + 1, n)
+        lo = np.maximum(np.arange(n) - radius, 0)
+        out = np.moveaxis(counts[hi] - counts[lo] > 0, 0, axis)
+    return out
+
+
+def _upsample(mask, factor, shape):
+    return np.repeat(np.repeat(mask, factor, axis=0), factor, axis=1)[:shape[0], :shape[1]]
+
+
+def _candidates_within(cost, regions, cell, mask):
+    #candidate_connections on the bounding box of mask with everything outside
+    #it NoData; the connections come back in full-grid cell ids
+    rows, cols = np.nonzero(mask)
+    r0, r1, c0, c1 = rows.min(), rows.max() + 1, cols.min(), cols.max() + 1
+    window = np.where(mask[r0:r1, c0:c1], cost[r0:r1, c0:c1], np.nan)
+    labels = np.where(np.isfinite(window), regions[r0:r1, c0:c1], 0)
+    candidates = candidate_connections(CostGraph.from_surface(window, cell), labels)
+    width, ncols = c1 - c0, cost.shape[1]
+    for c in candidates:
+        local_rows, local_cols = np.divmod(np.asarray(c.cells, dtype=np.int64), width)
+        c.cells = ((local_rows + r0) * ncols + local_cols + c0).tolist()
+    return candidates
+
+
+def coarse_to_fine(cost, regions, cell, factors=(16, 4), buffer=2, levels=None):
+    #connections over the full-resolution cost surface (NaN = NoData), solved
+    #first on the coarsest level of the pyramid and then refined level by
+    #level. Each finer level only searches the corridor of every candidate
+    #crossing found one level up (not just the tree, so the finer level can
+    #still pick other pairs), widened by `buffer` of that level's cells.
+    #levels can hand in ready-made coarse surfaces ({factor: array}, e.g. the
+    #store's overviews). A level whose tree comes out smaller than the coarser
+    #one's is retried with twice the buffer
+    cost = np.asarray(cost, dtype=np.float64)
+    regions = np.asarray(regions)
+    levels = levels or {}
+    wanted = np.unique(regions[(regions > 0) & np.isfinite(cost)])
+    previous = None
+    for factor in sorted(set(factors), reverse=True) + [1]:
+        surface = cost if factor == 1 else levels.get(factor)
+        if surface is None:
+            surface = downsample(cost, factor)
+        labels = regions if factor == 1 else downsample_labels(regions, factor)
+        if previous is None:
+            candidates = candidate_connections(CostGraph.from_surface(surface, cell * factor), labels)
+            if not candidates:
+                #nothing to follow down the pyramid
+                return connect_regions(CostGraph.from_surface(cost, cell), regions)
+            previous = (factor, surface.shape, candidates, len(spanning_tree(candidates)))
+            continue
+        prev_factor, prev_shape, prev_candidates, prev_tree = previous
+        width = buffer
+        while True:
+            routes = np.zeros(prev_shape, dtype=bool)
+            routes.flat[[i for c in prev_candidates for i in c.cells]] = True
+            corridor = _upsample(_dilate(routes, width), prev_factor // factor, surface.shape)
+            #regions the coarser routes never touched are searched in full
+            missing = np.setdiff1d(wanted, np.unique(labels[corridor]))
+            if len(missing):
+                corridor |= np.isin(labels, missing)
+            candidates = _candidates_within(surface, labels, cell * factor, corridor)
+            tree = len(spanning_tree(candidates))
+            if tree >= prev_tree or corridor.all():
+                break
+            width *= 2
+        previous = (factor, surface.shape, candidates, tree)
+    return spanning_tree(candidates)
@@ -0,0 +1,114 @@
+#-------------------------------------------------------------------------------
+# Name:        store
+# Purpose:     rasters by name. A RasterStore is a folder (the local backend's
+#              "gdb", or its temp folder) of rasters in grid.py's layout. Reads
+#              are memory-mapped, so in-process consumers get views of the file
+#              instead of copies, and rename / move between stores on the same
+#              disk only rename files (data, sidecar, overviews, packed tiles)
+#              rather than copying the cells. Cold rasters can be packed into
+#              compressed tiles and come back on the next read.
+#-------------------------------------------------------------------------------
+import glob
+import os
+import shutil
+
+from . import blocks
+from .grid import (RASTER_EXT, build_overviews, create_raster, delete_raster, pack_raster, raster_files,
+                   read_meta, read_overview, read_raster, read_window, write_raster)
+
+#preferred block size for tiles(); matches the model engine's default tile
+TILE = 512
+
+
+class RasterStore:
+    def __init__(self, root):
+        self.root = root
+        os.makedirs(root, exist_ok=True)
+
+    @classmethod
+    def of(cls, path):
+        #(store, name) for a raster path like <gdb>/<name> or <gdb>/<name>.npy
+        folder, name = os.path.split(path)
+        return cls(folder or "."), name[:-len(RASTER_EXT)] if name.endswith(RASTER_EXT) else name
+
+    def path(self, name):
+        return os.path.join(self.root, name)
+
+    def names(self):
+        #a raster is anything with a grid sidecar (packed ones have no .npy)
+        names = []
+        for f in glob.glob(os.path.join(glob.escape(self.root), "*.json")):
+            name = os.path.basename(f)[:-5]
+            if not name.endswith(".part") and "grid" in read_meta(f[:-5]):
+                names.append(name)
+        return sorted(names)
+
+    def exists(self, name):
+        return os.path.exists(self.path(name) + ".json")
+
+    def files(self, name):
+        return raster_files(self.path(name))
+
+    def nbytes(self, name):
+        return sum(os.path.getsize(f) for f in self.files(name))
+
+    #--- reading --------------------------------------------------------------
+
+    def open(self, name):
+        #(read-only memmap, grid, nodata); slicing it never copies
+        return read_raster(self.path(name))
+
+    def view(self, name, r0, r1, c0, c1):
+        return read_window(self.path(name), r0, r1, c0, c1)
+
+    def tiles(self, name, tile=TILE):
+        #(row0, row1, col0, col1, view) over the whole raster
+        data, grid, _ = self.open(name)
+        for r0, r1, c0, c1 in blocks.tiles(grid.shape, tile):
+            yield r0, r1, c0, c1, data[r0:r1, c0:c1]
+
+    def overview(self, name, factor):
+        return read_overview(self.path(name), factor)
+
+    #--- writing --------------------------------------------------------------
+
+    def put(self, name, array, grid, nodata=None):
+        write_raster(self.path(name), array, grid, nodata)
+
+    def create(self, name, grid, dtype, nodata=None, fill=None):
+        #writable memmap; fill it block by block and flush()
+        return create_raster(self.path(name), grid, dtype, nodata, fill)
+
+    def build_overviews(self, name, factors=(4, 16)):
+        return build_overviews(self.path(name), factors)
+
+    def pack(self, name, tile=256):
+        #compressed size in bytes
+        return pack_raster(self.path(name), tile)
+
+    def delete(self, name):
+        delete_raster(self.path(name))
+
+    #--- metadata operations --------------------------------------------------
+
+    def rename(self, old, new):
+        self.move(old, self, new)
+
+    def move(self, name, other, new_name=None):
+        #into another store; a rename on the same disk, a copy + delete only
+        #when the stores sit on different volumes
+        new_name = new_name or name
+        src, dst = self.path(name), other.path(new_name)
+        if os.path.abspath(src) == os.path.abspath(dst):
+            return
+        if not self.exists(name):
+            raise FileNotFoundError(f"No raster '{name}' in {self.root}")
+        if other.exists(new_name):
+            other.delete(new_name)
+        #the sidecar goes last so a half-finished move never looks complete
+        for f in sorted(self.files(name), key=lambda f: f.endswith(".json")):
+            target = dst + f[len(src):]
+            try:
+                os.replace(f, target)
+            except OSError:
+                shutil.move(f, target)
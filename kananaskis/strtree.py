@@ -0,0 +1,74 @@
+#-------------------------------------------------------------------------------
+# Name:        strtree
+# Purpose:     Sort-Tile-Recursive packed R-tree over bounding boxes. Built
+#              once from an (n, 4) array of xmin, ymin, xmax, ymax and then
+#              queried with a box; every level is a flat NumPy array so a query
+#              only does a few vectorised overlap tests per node.
+#-------------------------------------------------------------------------------
+import math
+
+import numpy as np
+
+
+def _str_order(boxes, capacity):
+    #STR packing: sort by x centre into vertical slices, then by y within each
+    n = len(boxes)
+    if n == 0:
+        return np.empty(0, dtype=np.int64)
+    cx = (boxes[:, 0] + boxes[:, 2]) / 2
+    cy = (boxes[:, 1] + boxes[:, 3]) / 2
+    leaves = math.ceil(n / capacity)
+    slices = max(1, math.ceil(math.sqrt(leaves)))
+    per_slice = slices * capacity
+    by_x = np.argsort(cx, kind="stable")
+    order = []
+    for s in range(0, n, per_slice):
+        chunk = by_x[s:s + per_slice]
+        order.append(chunk[np.argsort(cy[chunk], kind="stable")])
+    return np.concatenate(order)
+
+
+class STRtree:
+    def __init__(self, boxes, capacity=16):
+        boxes = np.asarray(boxes, dtype=float).reshape(-1, 4)
+        self.capacity = capacity
+        order = _str_order(boxes, capacity)
+        self.items = order
+        #levels[0] holds the leaf nodes; each level stores the node boxes and,
+        #for every node, the [start, stop) range of children one level down
+        self.levels = []
+        child_boxes = boxes[order]
+        while True:
+            n = len(child_boxes)
+            starts = np.arange(0, n, capacity)
+            stops = np.minimum(starts + capacity, n)
+            node_boxes = np.array([[child_boxes[a:b, 0].min(), child_boxes[a:b, 1].min(),
+                                    child_boxes[a:b, 2].max(), child_boxes[a:b, 3].max()]
+                                   for a, b in zip(starts, stops)]).reshape(-1, 4)
+            self.levels.append((node_boxes, starts, stops))
+            if len(node_boxes) <= 1:
+                break
+            #pack the next level up; nodes are already in STR order so keep it
+            child_boxes = node_boxes
+        self.leaf_boxes = boxes[order]
+
+    def __len__(self):
+        return len(self.items)
+
+    def query(self, box):
+        #indices (into the original boxes) whose box overlaps `box`
+        if len(self.items) == 0:
+            return np.empty(0, dtype=np.int64)
+        x0, y0, x1, y1 = box
+        top = len(self.levels) - 1
+        candidates = np.arange(len(self.levels[top][0]))
+        for level in range(top, -1, -1):
+            node_boxes, starts, stops = self.levels[level]
+            nb = node_boxes[candidates]
+            hit = candidates[(nb[:, 0] <= x1) & (nb[:, 2] >= x0) & (nb[:, 1] <= y1) & (nb[:, 3] >= y0)]
+            if len(hit) == 0:
+                return np.empty(0, dtype=np.int64)
+            candidates = np.concatenate([np.arange(starts[i], stops[i]) for i in hit])
+        lb = self.leaf_boxes[candidates]
+        hit = candidates[(lb[:, 0] <= x1) & (lb[:, 2] >= x0) & (lb[:, 1] <= y1) & (lb[:, 3] >= y0)]
+        return np.sort(self.items[hit])
@@ -0,0 +1,224 @@
+#-------------------------------------------------------------------------------
+# Name:        synthetic
+# Purpose:     made-up Kananaskis-like inputs for benchmarking without the
+#              course data. Lays out the same folders FinalProject.py reads
+#              (ATS, dem, Kananaskis, Landcover, NTS/NTS-50, Wildlife) in the
+#              local backend's formats, with the same mix of coordinate systems:
+#              a geographic DEM, landcover and townships in 10TM, roads in
+#              NAD83 geographic, everything else in UTM 11N. Size is set by the
+#              number of 25 m model cells (10^6 .. 10^9); the DEM is written in
+#              row blocks so big sizes never sit in memory. Same seed, same data.
+#-------------------------------------------------------------------------------
+import json
+import math
+import os
+from dataclasses import dataclass
+
+import numpy as np
+
+from . import crs
+from .config import FOLDERS
+from .features import feature, write_features
+from .grid import Grid, create_raster
+
+LANDCOVER_CLASSES = [20, 31, 32, 33, 34, 50, 110, 120, 210, 220, 230]
+
+
+@dataclass(frozen=True)
+class SyntheticSpec:
+    cells: int = 10 ** 6
+    cell: float = 25.0
+    seed: int = 456
+    #north-west corner of the study area, UTM 11N (west of Calgary)
+    x0: float = 600000.0
+    y0: float = 5680000.0
+
+    @property
+    def side(self):
+        return max(64, int(round(math.sqrt(self.cells))))
+
+    @property
+    def extent(self):
+        size = self.side * self.cell
+        return (self.x0, self.y0 - size, self.x0 + size, self.y0)
+
+
+def _folders(root):
+    paths = {key: os.path.join(root, name) for key, name in FOLDERS.items()}
+    for path in paths.values():
+        os.makedirs(path, exist_ok=True)
+    return paths
+
+
+def _walk(rng, start, heading, steps, step_len, wiggle, extent):
+    #a wandering polyline, stopped when it leaves the extent
+    xmin, ymin, xmax, ymax = extent
+    pts = [start]
+    x, y = start
+    for _ in range(steps):
+        heading += rng.normal(0, wiggle)
+        x, y = x + step_len * math.cos(heading), y + step_len * math.sin(heading)
+        pts.append((x, y))
+        if not (xmin <= x <= xmax and ymin <= y <= ymax):
+            break
+    return np.array(pts)
+
+
+def _lines(rng, count, extent, step_len, wiggle, epsg, piece=40):
+    #`count` long wandering routes, cut into features of `piece` vertices
+    #like the segment-per-feature road and stream layers
+    xmin, ymin, xmax, ymax = extent
+    steps = int(2 * max(xmax - xmin, ymax - ymin) / step_len)
+    fn = crs.transformer(26911, epsg)
+    out = []
+    for _ in range(count):
+        start = (rng.uniform(xmin, xmax), rng.uniform(ymin, ymax))
+        pts = _walk(rng, start, rng.uniform(0, 2 * math.pi), steps, step_len, wiggle, extent)
+        x, y = fn(pts[:, 0], pts[:, 1])
+        coords = np.column_stack([x, y])
+        for i in range(0, len(coords) - 1, piece - 1):
+            out.append(feature({"type": "LineString", "coordinates": coords[i:i + piece].tolist()},
+                               OBJECTID=len(out) + 1))
+    return out
+
+
+def _blob(rng, cx, cy, radius, n=24, jitter=0.3):
+    angles = np.linspace(0, 2 * math.pi, n, endpoint=False)
+    r = radius * (1 + rng.uniform(-jitter, jitter, n))
+    ring = np.column_stack([cx + r * np.cos(angles), cy + r * np.sin(angles)])
+    return np.vstack([ring, ring[:1]])
+
+
+def _polygon(ring, fn=None):
+    if fn is not None:
+        x, y = fn(ring[:, 0], ring[:, 1])
+        ring = np.column_stack([x, y])
+    return {"type": "Polygon", "coordinates": [ring.tolist()]}
+
+
+def boundary(spec, rng):
+    #concave, park-shaped outline covering most of the extent
+    xmin, ymin, xmax, ymax = spec.extent
+    size = xmax - xmin
+    ring = _blob(rng, xmin + size / 2, ymin + size / 2, size * 0.4, n=64, jitter=0.15)
+    return [feature(_polygon(ring), OBJECTID=1, NAME="Kananaskis Country")]
+
+
+def landcover(spec, rng, cells_per_polygon=2500):
+    #jittered lattice of quads that tile the extent, each with an LC_class
+    xmin, ymin, xmax, ymax = spec.extent
+    n = max(4, int(round(math.sqrt(spec.side ** 2 / cells_per_polygon))))
+    step = (xmax - xmin) / n
+    gx, gy = np.meshgrid(xmin + np.arange(n + 1) * step, ymax - np.arange(n + 1) * step)
+    inner = np.s_[1:-1, 1:-1]
+    gx[inner] += rng.uniform(-0.3, 0.3, (n - 1, n - 1)) * step
+    gy[inner] += rng.uniform(-0.3, 0.3, (n - 1, n - 1)) * step
+    fn = crs.transformer(26911, 3400)
+    classes = rng.choice(LANDCOVER_CLASSES, size=(n, n))
+    out = []
+    for r in range(n):
+        for c in range(n):
+            ring = np.array([(gx[r, c], gy[r, c]), (gx[r + 1, c], gy[r + 1, c]), (gx[r + 1, c + 1], gy[r + 1, c + 1]),
+                             (gx[r, c + 1], gy[r, c + 1]), (gx[r, c], gy[r, c])])
+            out.append(feature(_polygon(ring, fn), LC_class=int(classes[r, c])))
+    return out
+
+
+def nts_sheets(spec):
+    #1:50,000 sheets (15' x 30') covering the extent, NAD83 geographic
+    lon, lat = _geographic_bounds(spec)
+    out = []
+    for la in np.arange(math.floor(lat[0] * 4) / 4, lat[1], 0.25):
+        for lo in np.arange(math.floor(lon[0] * 2) / 2, lon[1], 0.5):
+            ring = np.array([(lo, la), (lo + 0.5, la), (lo + 0.5, la + 0.25), (lo, la + 0.25), (lo, la)])
+            name = f"082{chr(65 + int((la - 49) * 4) % 16)}{int((-lo - 112) * 2) % 16 + 1:02d}"
+            out.append(feature(_polygon(ring), NAME=name))
+    return out
+
+
+def townships(spec):
+    #ATS-ish townships (six miles square) in 10TM
+    fwd = crs.transformer(26911, 3400)
+    xmin, ymin, xmax, ymax = spec.extent
+    tx, ty = fwd(np.array([xmin, xmax, xmin, xmax]), np.array([ymin, ymin, ymax, ymax]))
+    size = 9656.0
+    out = []
+    for row, y in enumerate(np.arange(math.floor(ty.min() / size) * size, ty.max(), size)):
+        for col, x in enumerate(np.arange(math.floor(tx.min() / size) * size, tx.max(), size)):
+            ring = np.array([(x, y), (x + size, y), (x + size, y + size), (x, y + size), (x, y)])
+            out.append(feature(_polygon(ring), TWP=20 + row, RGE=10 - col % 30, M=5))
+    return out
+
+
+def habitats(spec, rng):
+    xmin, ymin, xmax, ymax = spec.extent
+    size = xmax - xmin
+    count = max(4, spec.side // 400)
+    out = []
+    for i in range(count):
+        cx, cy = rng.uniform(xmin + size * 0.2, xmax - size * 0.2), rng.uniform(ymin + size * 0.2, ymax - size * 0.2)
+        out.append(feature(_polygon(_blob(rng, cx, cy, rng.uniform(4, 12) * spec.cell * max(1, spec.side / 1000))),
+                           OBJECTID=i + 1))
+    return out
+
+
+def _geographic_bounds(spec, margin=0.02):
+    xmin, ymin, xmax, ymax = spec.extent
+    inv = crs.transformer(26911, 4269)
+    t = np.linspace(0, 1, 33)
+    lon, lat = inv(np.concatenate([xmin + t * (xmax - xmin), xmin + t * (xmax - xmin), np.full(33, xmin), np.full(33, xmax)]),
+                   np.concatenate([np.full(33, ymin), np.full(33, ymax), ymin + t * (ymax - ymin), ymin + t * (ymax - ymin)]))
+    return (lon.min() - margin, lon.max() + margin), (lat.min() - margin, lat.max() + margin)
+
+
+def dem(spec, path, rows_per_block=512):
+    #smooth ridges and valleys plus a little noise, NAD83 geographic. Square
+    #degree cells sized so the DEM has about spec.cells cells
+    lon, lat = _geographic_bounds(spec, margin=0.005)
+    mid = math.radians(sum(lat) / 2)
+    cell = spec.cell / 111320.0 / math.sqrt(math.cos(mid))
+    grid = Grid(lon[0], lat[1], cell, int(math.ceil((lat[1] - lat[0]) / cell)),
+                int(math.ceil((lon[1] - lon[0]) / cell)), 4269)
+    out = create_raster(path, grid, np.float32, -9999.0)
+    xs, _ = grid.cell_centers(rows=[0])
+    kx = xs * 111320.0 * math.cos(mid)
+    for r0 in range(0, grid.nrows, rows_per_block):
+        r1 = min(r0 + rows_per_block, grid.nrows)
+        _, ys = grid.cell_centers(rows=np.arange(r0, r1))
+        ky = (ys * 111320.0)[:, None]
+        block = (1800 + 700 * np.sin(kx / 7000.0) * np.cos(ky / 5000.0)
+                 + 250 * np.sin((kx + ky) / 2300.0) + 80 * np.cos(kx / 900.0 - ky / 1300.0))
+        noise = np.random.default_rng([spec.seed, r0]).normal(0, 5, block.shape)
+        out[r0:r1] = (block + noise).astype(np.float32)
+    out.flush()
+    return grid
+
+
+def generate(root, spec=SyntheticSpec()):
+    #writes the input folders under root; returns a manifest of what was made
+    rng = np.random.default_rng(spec.seed)
+    folders = _folders(root)
+    manifest = {"spec": {"cells": spec.cells, "cell": spec.cell, "seed": spec.seed, "side": spec.side},
+                "datasets": {}}
+
+    def vector(key, name, feats, epsg):
+        write_features(os.path.join(folders[key], name + ".geojson"), feats, epsg)
+        manifest["datasets"][name] = {"folder": folders[key], "prefix": key, "features": len(feats), "epsg": epsg}
+
+    size = spec.side * spec.cell
+    lines = max(4, spec.side // 50)
+    vector("K", "KCountry_Bound", boundary(spec, rng), 26911)
+    vector("K", "Road", _lines(rng, lines, spec.extent, 20 * spec.cell, 0.15, 4269), 4269)
+    vector("K", "Trails", _lines(rng, lines * 2, spec.extent, 8 * spec.cell, 0.4, 26911), 26911)
+    vector("K", "Hydro", _lines(rng, lines, spec.extent, 12 * spec.cell, 0.3, 26911), 26911)
+    vector("L", "Landcover", landcover(spec, rng), 3400)
+    vector("N", "NTS50", nts_sheets(spec), 4269)
+    vector("A", "AB_Township", townships(spec), 3400)
+    vector("W", "Bear_Habitat", habitats(spec, rng), 26911)
+    grid = dem(spec, os.path.join(folders["D"], "ab_dem"))
+    manifest["datasets"]["ab_dem"] = {"folder": folders["D"], "prefix": "D", "cells": grid.nrows * grid.ncols, "epsg": 4269}
+    manifest["extent"] = list(spec.extent)
+    manifest["size_m"] = size
+    with open(os.path.join(root, "synthetic.json"), "w") as f:
+        json.dump(manifest, f, indent=2)
+    return manifest
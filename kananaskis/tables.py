@@ -0,0 +1,83 @@
+#-------------------------------------------------------------------------------
+# Name:        tables
+# Purpose:     whole tables as NumPy structured arrays, in the spirit of
+#              arcpy.da.TableToNumPyArray / NumPyArrayToTable, so summaries
+#              (route length, hectares per class) are one vectorized call
+#              rather than a cursor loop. The local backend stores a table
+#              column by column in an .npz (one array per field, in order), so
+#              reading or writing one costs a few array copies, not a Python
+#              object per cell. Nulls follow TableToNumPyArray's null_value:
+#              NaN in float columns, "" in text ones.
+#-------------------------------------------------------------------------------
+import numpy as np
+
+#integer columns holding nulls become float so they can carry NaN
+_NULL_DEFAULTS = {"f": np.nan, "U": ""}
+
+
+def column_dtype(values):
+    #narrowest of int64 / float64 / text that holds every value; None is a null
+    present = [v for v in values if v is not None]
+    if not present:
+        return np.dtype(np.float64)
+    if all(isinstance(v, (bool, int, np.integer)) for v in present):
+        return np.dtype(np.int64) if len(present) == len(values) else np.dtype(np.float64)
+    if all(isinstance(v, (int, float, np.integer, np.floating)) for v in present):
+        return np.dtype(np.float64)
+    return np.dtype(f"U{max(len(str(v)) for v in present)}")
+
+
+def from_columns(fields, columns):
+    #[name], [sequence per name] -> structured array
+    arrays = []
+    for values in columns:
+        values = list(values) if not isinstance(values, np.ndarray) else values
+        if isinstance(values, np.ndarray) and values.dtype.kind in "iufU":
+            arrays.append(values)
+            continue
+        dtype = column_dtype(values)
+        null = _NULL_DEFAULTS.get(dtype.kind)
+        arrays.append(np.array([null if v is None else v for v in values], dtype=dtype))
+    n = len(arrays[0]) if arrays else 0
+    out = np.empty(n, dtype=[(f, a.dtype) for f, a in zip(fields, arrays)])
+    for field, array in zip(fields, arrays):
+        out[field] = array
+    return out
+
+
+def from_rows(fields, rows):
+    #(fields, [tuple, ...]) as the cursors deliver them -> structured array
+    columns = list(zip(*rows)) if rows else [[] for _ in fields]
+    return from_columns(fields, columns)
+
+
+def to_rows(array):
+    #structured array -> [tuple, ...] of plain Python values
+    return array.tolist()
+
+
+def save(path, array):
+    #columnar .npz; the field order rides along as its own entry
+    fields = list(array.dtype.names or ())
+    np.savez(path, __fields__=np.array(fields, dtype="U"), **{f"c{i}": array[f] for i, f in enumerate(fields)})
+
+
+def load(path, fields=None):
+    #only the requested columns are read out of the archive
+    with np.load(path, allow_pickle=False) as data:
+        names = data["__fields__"].tolist()
+        wanted = names if fields is None else list(fields)
+        missing = [f for f in wanted if f not in names]
+        if missing:
+            raise KeyError(f"{path} has no field(s) {missing}")
+        return from_columns(wanted, [data[f"c{names.index(f)}"] for f in wanted])
+
+
+def total(array, field):
+    #sum of a column, nulls skipped
+    return float(np.nansum(array[field])) if len(array) else 0.0
+
+
+def value_columns(array):
+    #{class value: field name} for TabulateArea's VALUE_<class> columns
+    return {int(f[6:]): f for f in array.dtype.names if f.upper().startswith("VALUE_")}
@@ -0,0 +1,149 @@
+#-------------------------------------------------------------------------------
+# Name:        terrain
+# Purpose:     terrain derivatives of the DEM from one read. Range (the
+#              ruggedness FocalStatistics RANGE), slope and aspect (Horn),
+#              TRI (Riley) and curvature (Zevenbergen & Thorne, as arcpy's
+#              Curvature) all come from the same shifted views of a haloed
+#              block, so asking for more of them costs arithmetic, not another
+#              pass over D_ab_dem. Windows bigger than 3x3 use a running
+#              min/max (van Herk / Gil-Werman), O(1) per cell whatever the
+#              size. Whole rasters are done in row bands, optionally spread
+#              over worker processes.
+#-------------------------------------------------------------------------------
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+from .grid import create_raster, read_raster, valid_mask
+
+METRICS = ("range", "slope", "aspect", "tri", "curvature")
+
+
+def _sliding(x, size, axis, fn):
+    #fn (np.fmax / np.fmin) over every `size` cells along axis; the result is
+    #size - 1 shorter along it. Small windows just combine shifted views,
+    #bigger ones use block prefix/suffix scans, which cost the same at any size
+    x = np.moveaxis(x, axis, -1)
+    n = x.shape[-1] - size + 1
+    if size <= 5:
+        out = fn(x[..., 0:n], x[..., 1:n + 1])
+        for k in range(2, size):
+            fn(out, x[..., k:n + k], out=out)
+    else:
+        m = -(-x.shape[-1] // size) * size
+        padded = np.full(x.shape[:-1] + (m,), np.nan)
+        padded[..., :x.shape[-1]] = x
+        chunks = padded.reshape(x.shape[:-1] + (m // size, size))
+        prefix = fn.accumulate(chunks, axis=-1).reshape(padded.shape)
+        suffix = fn.accumulate(chunks[..., ::-1], axis=-1)[..., ::-1].reshape(padded.shape)
+        out = fn(suffix[..., :n], prefix[..., size - 1:size - 1 + n])
+    return np.moveaxis(out, -1, axis)
+
+
+def focal_range(block, size=3):
+    #RANGE over a size x size rectangle, NoData (NaN) neighbours ignored. The
+    #block carries a size // 2 halo, which is trimmed off the result
+    hi = _sliding(_sliding(block, size, 0, np.fmax), size, 1, np.fmax)
+    lo = _sliding(_sliding(block, size, 0, np.fmin), size, 1, np.fmin)
+    return hi - lo
+
+
+def derivatives(block, cell, metrics=METRICS, size=3):
+    #{metric: array} for a block with a halo of max(1, size // 2) cells.
+    #Only range uses `size`; the others are 3x3. As in arcpy, a NoData centre
+    #stays NoData and NoData neighbours take the centre's value
+    unknown = set(metrics) - set(METRICS)
+    if unknown:
+        raise ValueError(f"Unknown terrain metric(s) {sorted(unknown)}, expected some of {METRICS}")
+    halo = max(1, size // 2)
+    rows, cols = block.shape[0] - 2 * halo, block.shape[1] - 2 * halo
+    out = {}
+    if "range" in metrics:
+        trim = halo - size // 2
+        out["range"] = focal_range(block[trim:block.shape[0] - trim, trim:block.shape[1] - trim], size)
+    rest = [m for m in metrics if m != "range"]
+    if not rest:
+        return out
+
+    o = halo - 1
+    e = block[halo:halo + rows, halo:halo + cols]
+
+    def at(dr, dc):
+        #neighbour (dr, dc) of every centre cell, NoData filled with the centre
+        view = block[o + 1 + dr:o + 1 + dr + rows, o + 1 + dc:o + 1 + dc + cols]
+        return np.where(np.isnan(view), e, view)
+
+    a, b, c = at(-1, -1), at(-1, 0), at(-1, 1)
+    d, f = at(0, -1), at(0, 1)
+    g, h, i = at(1, -1), at(1, 0), at(1, 1)
+    if "slope" in rest or "aspect" in rest:
+        dzdx = ((c + 2 * f + i) - (a + 2 * d + g)) / (8 * cell)
+        dzdy = ((g + 2 * h + i) - (a + 2 * b + c)) / (8 * cell)
+        if "slope" in rest:
+            out["slope"] = np.degrees(np.arctan(np.hypot(dzdx, dzdy)))
+        if "aspect" in rest:
+            #compass degrees clockwise from north, -1 where flat
+            angle = np.degrees(np.arctan2(dzdy, -dzdx))
+            aspect = np.where(angle > 90, 450 - angle, 90 - angle)
+            aspect[(dzdx == 0) & (dzdy == 0)] = -1
+            out["aspect"] = aspect
+    if "tri" in rest:
+        total = np.zeros_like(e)
+        for n in (a, b, c, d, f, g, h, i):
+            total += (n - e) ** 2
+        out["tri"] = np.sqrt(total)
+    if "curvature" in rest:
+        out["curvature"] = -200 * (((d + f) / 2 - e) + ((b + h) / 2 - e)) / (cell * cell)
+    missing = np.isnan(e)
+    for m in rest:
+        out[m][missing] = np.nan
+    return out
+
+
+def _band(dem_path, r0, r1, metrics, size):
+    #derivatives for rows r0:r1, read with a halo (NaN past the raster's edges)
+    data, grid, nodata = read_raster(dem_path)
+    halo = max(1, size // 2)
+    top, bottom = max(0, r0 - halo), min(grid.nrows, r1 + halo)
+    raw = np.asarray(data[top:bottom])
+    block = np.full((r1 - r0 + 2 * halo, grid.ncols + 2 * halo), np.nan)
+    inner = raw.astype(np.float64)
+    inner[~valid_mask(raw, nodata)] = np.nan
+    block[top - (r0 - halo):top - (r0 - halo) + len(inner), halo:halo + grid.ncols] = inner
+    return {m: v.astype(np.float32) for m, v in derivatives(block, grid.cell, metrics, size).items()}
+
+
+def band_rows(ncols, n_metrics, memory_bytes=64 * 1024 * 1024):
+    #rows per band so a band's float64 working arrays fit the budget
+    per_row = ncols * 8 * (n_metrics + 12)
+    return max(16, memory_bytes // max(1, per_row))
+
+
+def terrain_rasters(dem_path, outputs, size=3, workers=1, rows=None):
+    #outputs: {metric: raster path}. Every metric comes out of the same read of
+    #each band of the DEM; bands go to `workers` processes
+    metrics = list(outputs)
+    _, grid, _ = read_raster(dem_path)
+    rows = rows or band_rows(grid.ncols, len(metrics))
+    bands = [(r0, min(r0 + rows, grid.nrows)) for r0 in range(0, grid.nrows, rows)]
+    outs = {m: create_raster(path, grid, np.float32, float("nan")) for m, path in outputs.items()}
+
+    def place(r0, r1, result):
+        for m, values in result.items():
+            outs[m][r0:r1] = values
+
+    if workers is None:
+        workers = min(len(bands), os.cpu_count() or 1)
+    if workers <= 1 or len(bands) <= 1:
+        for r0, r1 in bands:
+            place(r0, r1, _band(dem_path, r0, r1, metrics, size))
+    else:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            futures = [(r0, r1, pool.submit(_band, dem_path, r0, r1, metrics, size)) for r0, r1 in bands]
+            for r0, r1, future in futures:
+                place(r0, r1, future.result())
+    for out in outs.values():
+        out.flush()
+    return outputs
+
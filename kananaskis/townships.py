@@ -0,0 +1,34 @@
+#-------------------------------------------------------------------------------
+# Name:        townships
+# Purpose:     which ATS townships (TWP-RGE-MER) fall on each 1:50,000 NTS map
+#              sheet. Both layers are read once, townships go into an STR-tree
+#              and every NTS sheet is matched in one sweep, instead of a
+#              MakeFeatureLayer + SelectLayerByLocation round trip per sheet.
+#-------------------------------------------------------------------------------
+import numpy as np
+
+from . import geometry
+from .strtree import STRtree
+
+OVERLAY_FIELDS = ["NTS", "TWP", "RGE", "MER"]
+
+
+def nts_township_pairs(backend, nts_fc, townships_fc,
+                       nts_field="NAME", township_fields=("TWP", "RGE", "M")):
+    #returns [(nts name, twp, rge, mer), ...] sorted by sheet then township
+    townships = [row for row in backend.read_rows(townships_fc, list(township_fields) + ["SHAPE@"])
+                 if row[-1] is not None]
+    boxes = np.array([geometry.bounds(row[-1]) for row in townships]).reshape(-1, 4)
+    tree = STRtree(boxes)
+
+    pairs = []
+    for name, shape in backend.read_rows(nts_fc, [nts_field, "SHAPE@"]):
+        if shape is None:
+            continue
+        for i in tree.query(geometry.bounds(shape)):
+            twp = townships[i]
+            if geometry.intersects(shape, twp[-1]):
+                pairs.append((name,) + tuple(twp[:-1]))
+    #native values, so township 2 comes before 10; nulls go last
+    pairs.sort(key=lambda row: tuple((v is None, v) for v in row))
+    return pairs
@@ -0,0 +1,116 @@
+#-------------------------------------------------------------------------------
+# Name:        zonal
+# Purpose:     ZonalStatisticsAsTable + TabulateArea in one streamed pass. The
+#              zones are rasterized once; each tile of the value raster (DEM)
+#              and class raster (reclassified landcover) is then folded into
+#              per-zone accumulators with np.bincount, so hundreds of zones
+#              and any number of classes cost the same single scan as one.
+#-------------------------------------------------------------------------------
+import numpy as np
+
+from . import blocks, tables
+from .rasterize import rasterize
+
+STATS_FIELDS = ["COUNT", "AREA", "MIN", "MAX", "RANGE", "MEAN", "STD", "SUM"]
+
+
+class ZonalAccumulator:
+    #zone ids are 1..nzones in the zone raster, 0 is "no zone"
+    def __init__(self, nzones):
+        n = nzones + 1
+        self.count = np.zeros(n, dtype=np.int64)
+        self.total = np.zeros(n)
+        #running mean and sum of squared deviations from it: the variance comes
+        #from these rather than E[x^2] - mean^2, which loses most of its digits
+        #on elevation-sized values
+        self.mean = np.zeros(n)
+        self.m2 = np.zeros(n)
+        self.low = np.full(n, np.inf)
+        self.high = np.full(n, -np.inf)
+        self.classes = {}  #class value -> cell count per zone
+
+    def add_values(self, zones, values):
+        ok = (zones > 0) & ~np.isnan(values)
+        z, v = zones[ok], values[ok]
+        n = self.count.size
+        count = np.bincount(z, minlength=n)
+        total = np.bincount(z, weights=v, minlength=n)
+        mean = total / np.maximum(count, 1)
+        dev = v - mean[z]
+        m2 = np.bincount(z, weights=dev * dev, minlength=n)
+        #Chan et al.'s pairwise merge of this tile's (count, mean, M2) into the running ones
+        merged = self.count + count
+        share = count / np.maximum(merged, 1)
+        delta = mean - self.mean
+        self.mean += delta * share
+        self.m2 += m2 + delta * delta * self.count * share
+        self.count = merged
+        self.total += total
+        np.minimum.at(self.low, z, v)
+        np.maximum.at(self.high, z, v)
+
+    def add_classes(self, zones, classes):
+        ok = (zones > 0) & ~np.isnan(classes)
+        if not ok.any():
+            return
+        values, dense = np.unique(classes[ok], return_inverse=True)
+        n = self.count.size
+        counts = np.bincount(dense * n + zones[ok], minlength=len(values) * n).reshape(len(values), n)
+        for value, row in zip(values.tolist(), counts):
+            value = int(value)
+            if value in self.classes:
+                self.classes[value] += row
+            else:
+                self.classes[value] = row.copy()
+
+    def stats_table(self, zone_field, zone_ids, cell_area):
+        #one row per zone with data: zone id + STATS_FIELDS, as a structured array
+        n = self.count[1:]
+        has = n > 0
+        mean = self.mean[1:]
+        with np.errstate(invalid="ignore", divide="ignore"):
+            std = np.sqrt(self.m2[1:] / n)
+        low, high = self.low[1:], self.high[1:]
+        columns = [np.asarray(zone_ids)[has], n[has], n[has] * float(cell_area), low[has], high[has],
+                   (high - low)[has], mean[has], std[has], self.total[1:][has]]
+        return tables.from_columns([zone_field] + STATS_FIELDS, columns)
+
+    def area_table(self, zone_field, zone_ids, cell_area):
+        #TabulateArea layout: zone id + one VALUE_<class> column of areas
+        values = sorted(self.classes)
+        columns = [np.asarray(zone_ids)] + [self.classes[v][1:] * float(cell_area) for v in values]
+        return tables.from_columns([zone_field] + [f"VALUE_{v}" for v in values], columns)
+
+    def class_totals(self, cell_area):
+        #{class value: area summed over every zone}
+        return {v: float(row[1:].sum() * cell_area) for v, row in sorted(self.classes.items())}
+
+
+def zonal_summary(zones, grid, value_raster=None, class_raster=None, tile=1024):
+    #zones: [(zone id, geometry)] -> (zone ids, filled ZonalAccumulator); both
+    #rasters are sampled onto `grid`, which sets the processing cell size
+    zone_ids = [zone for zone, _ in zones]
+    labels = rasterize([(geom, i) for i, (_, geom) in enumerate(zones, start=1) if geom is not None],
+                       grid, np.int32, 0)
+    acc = ZonalAccumulator(len(zone_ids))
+    value_src = blocks.Source(value_raster) if value_raster else None
+    class_src = blocks.Source(class_raster) if class_raster else None
+    for r0, r1, c0, c1 in blocks.tiles(grid.shape, tile):
+        z = labels[r0:r1, c0:c1]
+        if not z.any():
+            continue
+        window = grid.window(r0, c0, r1 - r0, c1 - c0)
+        if value_src:
+            acc.add_values(z, value_src.read(window))
+        if class_src:
+            acc.add_classes(z, class_src.read(window))
+    return zone_ids, acc
+
+
+def class_areas(table):
+    #TabulateArea table (structured array) -> {class value: area summed over every zone}
+    columns = tables.value_columns(table)
+    if not columns or not len(table):
+        return {value: 0.0 for value in columns}
+    sums = np.nansum(np.column_stack([table[f] for f in columns.values()]), axis=0)
+    return dict(zip(columns, sums.tolist()))
@@ -0,0 +1,43 @@
+#-------------------------------------------------------------------------------
+# Name:        conftest
+# Purpose:     a small synthetic study area (see synthetic.py), ingested once
+#              per session through the local backend with its distance
+#              surfaces; tests that write into it get their own copy.
+#-------------------------------------------------------------------------------
+import os
+import shutil
+from types import SimpleNamespace
+
+import pytest
+
+from kananaskis import synthetic
+from kananaskis.backends import get_backend
+from kananaskis.config import FOLDERS
+from kananaskis.ingest import IngestSettings, run_ingest
+
+DISTANCE_SOURCES = {"Distance_to_Roads": "K_Road", "Distance_to_Trails": "K_Trails", "Distance_to_Hydro": "K_Hydro"}
+
+
+@pytest.fixture(scope="session")
+def study_area(tmp_path_factory):
+    root = str(tmp_path_factory.mktemp("study_area"))
+    manifest = synthetic.generate(root, synthetic.SyntheticSpec(cells=10000, seed=7))
+    backend = get_backend("local")
+    backend.create_file_gdb(root, "KananaskisWildlife.gdb")
+    gdb = os.path.join(root, "KananaskisWildlife.gdb")
+    folders = [os.path.join(root, name) for name in FOLDERS.values()]
+    boundary = os.path.join(manifest["datasets"]["KCountry_Bound"]["folder"], "KCountry_Bound.shp")
+    os.makedirs(os.path.join(root, "temp"))
+    settings = IngestSettings("local", os.path.join(root, "temp"), boundary)
+    run_ingest(folders, dict(zip(folders, FOLDERS)), gdb, settings, workers=1)
+    backend.distance_rasters(gdb, DISTANCE_SOURCES, os.path.join(gdb, "D_ab_dem"))
+    return SimpleNamespace(root=root, gdb=gdb, folders=folders, prefixes=dict(zip(folders, FOLDERS)),
+                           boundary=boundary, manifest=manifest)
+
+
+@pytest.fixture
+def gdb(study_area, tmp_path):
+    #a copy of the ingested gdb to write into
+    path = str(tmp_path / "KananaskisWildlife.gdb")
+    shutil.copytree(study_area.gdb, path)
+    return path
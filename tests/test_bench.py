@@ -0,0 +1,52 @@
+#-------------------------------------------------------------------------------
+# Name:        test_bench
+# Purpose:     the regression gate of the benchmark suite: floors, the
+#              baseline tolerance and the min_wall cut in check(), plus a tiny
+#              end-to-end run whose saved JSON is used as its own baseline.
+#-------------------------------------------------------------------------------
+import json
+
+from kananaskis.bench import check, main
+
+
+def _row(stage="model", size=1000000, wall_s=2.0, rate=1e6, floor=5e5):
+    return {"stage": stage, "size": size, "count": size, "units": "cells", "wall_s": wall_s, "rate": rate,
+            "floor": floor}
+
+
+def test_floor():
+    assert check([_row(rate=6e5)]) == []
+    problems = check([_row(rate=4e5)])
+    assert len(problems) == 1
+    assert "model @ 1,000,000 cells" in problems[0] and "under the floor of 500,000" in problems[0]
+    #no floor, no floor check
+    assert check([_row(rate=1, floor=None)]) == []
+
+
+def test_baseline_tolerance():
+    baseline = [_row(rate=2e6)]
+    assert check([_row(rate=1.6e6)], baseline) == []
+    problems = check([_row(rate=1.4e6)], baseline)
+    assert len(problems) == 1 and "(-30%)" in problems[0]
+    assert check([_row(rate=1.4e6)], baseline, tolerance=0.5) == []
+    #only the same stage at the same size is compared
+    assert check([_row(rate=1.4e6, size=2000000)], baseline) == []
+    assert check([_row(stage="zonal_summary", rate=1.4e6)], baseline) == []
+
+
+def test_quick_stages_are_skipped():
+    rows = [_row(wall_s=0.1, rate=1)]
+    assert check(rows, [_row(rate=2e6)]) == []
+    assert len(check(rows, [_row(rate=2e6)], min_wall=0.05)) == 2
+
+
+def test_run_against_own_baseline(tmp_path, capsys):
+    out = str(tmp_path / "bench.json")
+    args = ["--cells", "4000", "--stage", "model", "--stage", "zonal_summary", "--workdir", str(tmp_path / "work")]
+    assert main(args + ["--out", out]) == 0
+    with open(out) as f:
+        rows = json.load(f)
+    assert sorted(r["stage"] for r in rows) == ["model", "zonal_summary"]
+    assert all(r["size"] == 4000 and r["rate"] > 0 for r in rows)
+    assert main(args + ["--baseline", out]) == 0
+    assert "REGRESSION" not in capsys.readouterr().out
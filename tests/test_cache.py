@@ -0,0 +1,96 @@
+#-------------------------------------------------------------------------------
+# Name:        test_cache
+# Purpose:     the stage cache's invalidation rules: a key moves with the
+#              parameters, the upstream keys and the contents of raw input
+#              files (not their mtime), and a stage is only skipped while its
+#              key matches the recorded one and its outputs are all there.
+#-------------------------------------------------------------------------------
+import os
+
+import pytest
+
+from kananaskis.cache import StageCache, dataset_files
+
+
+@pytest.fixture
+def cache(tmp_path):
+    return StageCache(str(tmp_path / "cache.json"))
+
+
+def _write(path, text):
+    with open(path, "w") as f:
+        f.write(text)
+    return str(path)
+
+
+def test_key_follows_params_and_upstream(cache):
+    key = cache.key("rescale:roads", {"from": 10, "to": 1}, ["a"])
+    assert key == cache.key("rescale:roads", {"to": 1, "from": 10}, ["a"])
+    assert key != cache.key("rescale:roads", {"from": 10, "to": 2}, ["a"])
+    assert key != cache.key("rescale:roads", {"from": 10, "to": 1}, ["b"])
+    assert key != cache.key("rescale:hydro", {"from": 10, "to": 1}, ["a"])
+
+
+def test_key_follows_file_contents_not_mtime(cache, tmp_path):
+    path = _write(tmp_path / "roads.shp", "one")
+    key = cache.key("ingest:K_Road", datasets=[path])
+    os.utime(path, ns=(1, 1))
+    assert cache.key("ingest:K_Road", datasets=[path]) == key
+    _write(tmp_path / "roads.shp", "two")
+    assert cache.key("ingest:K_Road", datasets=[path]) != key
+    #a sidecar belongs to the dataset as well
+    _write(tmp_path / "roads.dbf", "attributes")
+    assert cache.key("ingest:K_Road", datasets=[path]) != key
+
+
+def test_dataset_files_picks_up_sidecars_and_folders(tmp_path):
+    shp = _write(tmp_path / "roads.shp", "")
+    _write(tmp_path / "roads.dbf", "")
+    _write(tmp_path / "roads_old.shp", "")
+    assert sorted(os.path.basename(f) for f in dataset_files(shp)) == ["roads.dbf", "roads.shp"]
+    os.makedirs(tmp_path / "dem")
+    _write(tmp_path / "dem" / "hdr.adf", "")
+    assert [os.path.basename(f) for f in dataset_files(str(tmp_path / "dem"))] == ["hdr.adf"]
+
+
+def test_missing_dataset_raises(cache, tmp_path):
+    with pytest.raises(FileNotFoundError):
+        cache.key("ingest:K_Road", datasets=[str(tmp_path / "nowhere.shp")])
+
+
+def test_stale_until_recorded_with_outputs(cache, tmp_path):
+    out = str(tmp_path / "Terrain_Rescale")
+    key = cache.key("rescale:terrain", {"size": 3})
+    assert cache.stale("rescale:terrain", key, [out])
+    _write(out, "")
+    assert cache.stale("rescale:terrain", key, [out])
+    cache.record("rescale:terrain", key, [out])
+    assert not cache.stale("rescale:terrain", key, [out])
+    assert cache.stale("rescale:terrain", cache.key("rescale:terrain", {"size": 5}), [out])
+    os.remove(out)
+    assert cache.stale("rescale:terrain", key, [out])
+
+
+def test_state_survives_reload_and_force_ignores_it(cache, tmp_path):
+    out = _write(tmp_path / "LC_Reclass", "")
+    key = cache.key("landcover_reclass", {"remap": "1 2"})
+    cache.record("landcover_reclass", key, [out])
+    assert not StageCache(cache.state_path).stale("landcover_reclass", key, [out])
+    assert StageCache(cache.state_path, force=True).stale("landcover_reclass", key, [out])
+
+
+def test_only_rebuilds_matching_stages(cache, tmp_path):
+    out = _write(tmp_path / "Distance_to_Roads", "")
+    cache.record("distance:roads", "old", [out])
+    cache.record("weighted_sum", "old", [out])
+    only = StageCache(cache.state_path, only=["distance:*"])
+    assert only.stale("distance:roads", "old", [out])
+    #everything else is reused whatever its key, as long as its outputs exist
+    assert not only.stale("weighted_sum", "new", [out])
+
+
+def test_recorded_by_prefix(cache):
+    cache.record("ingest:D_ab_dem", "k1", [])
+    cache.record("ingest:K_Road", "k2", [])
+    cache.record("weighted_sum", "k3", [])
+    assert cache.recorded("ingest:") == {"D_ab_dem": "k1", "K_Road": "k2"}
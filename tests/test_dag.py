@@ -0,0 +1,164 @@
+#-------------------------------------------------------------------------------
+# Name:        test_dag
+# Purpose:     the stage scheduler: stages start only after what they read is
+#              written and never more than `workers` at once, a failure stops
+#              new stages and is raised, fresh stages are skipped, and every
+#              stage's profile record carries its input sizes and the cells it
+#              reports. Plus the dry-run waves and critical path.
+#-------------------------------------------------------------------------------
+import os
+import threading
+import time
+
+import pytest
+
+from kananaskis.cache import StageCache
+from kananaskis.dag import Pipeline, Stage
+from kananaskis.profiling import Profiler
+
+
+class Log:
+    #what ran, when, and how many at once
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.events = []
+        self.running = 0
+        self.most = 0
+
+    def stage(self, name, folder=None, outputs=(), pause=0.02, fail=False):
+        def fn():
+            with self.lock:
+                self.events.append(("start", name))
+                self.running += 1
+                self.most = max(self.most, self.running)
+            time.sleep(pause)
+            with self.lock:
+                self.running -= 1
+                self.events.append(("end", name))
+            if fail:
+                raise RuntimeError(f"{name} failed")
+            for out in outputs if folder else ():
+                with open(os.path.join(folder, out), "w") as f:
+                    f.write(name)
+            return name
+        return fn
+
+    def order(self, kind):
+        return [name for event, name in self.events if event == kind]
+
+
+def _diamond(log, folder=None, fail=()):
+    #a -> (b, c) -> d, plus e on its own
+    spec = [("a", [], ["A"]), ("b", ["A"], ["B"]), ("c", ["A"], ["C"]), ("d", ["B", "C"], ["D"]), ("e", [], ["E"])]
+    return Pipeline([Stage(name, log.stage(name, folder, outputs, fail=name in fail), inputs, outputs, kind="thread")
+                     for name, inputs, outputs in spec])
+
+
+@pytest.mark.parametrize("workers", [1, 2, 4])
+def test_inputs_are_written_before_a_stage_starts(workers):
+    log = Log()
+    results = _diamond(log).run(workers=workers)
+    assert sorted(results) == ["a", "b", "c", "d", "e"]
+    for name, before in [("b", "a"), ("c", "a"), ("d", "b"), ("d", "c")]:
+        assert log.events.index(("end", before)) < log.events.index(("start", name))
+
+
+@pytest.mark.parametrize("workers", [1, 3])
+def test_workers_budget(workers):
+    log = Log()
+    stages = [Stage(f"s{i}", log.stage(f"s{i}", pause=0.05), outputs=[f"S{i}"], kind="thread") for i in range(8)]
+    Pipeline(stages).run(workers=workers)
+    assert log.most == workers
+
+
+def test_failure_stops_new_stages():
+    log = Log()
+    with pytest.raises(RuntimeError, match="b failed"):
+        _diamond(log, fail={"b"}).run(workers=1)
+    #in order a, e, then b fails and nothing after it starts
+    assert log.order("start") == ["a", "e", "b"]
+    log = Log()
+    with pytest.raises(RuntimeError, match="b failed"):
+        _diamond(log, fail={"b"}).run(workers=3)
+    assert "d" not in log.order("start")
+    #whatever was running when b failed was let finish
+    assert sorted(log.order("start")) == sorted(log.order("end"))
+
+
+def test_fresh_stages_are_skipped(tmp_path):
+    folder = str(tmp_path)
+    resolve = lambda name: os.path.join(folder, name)
+    cache = StageCache(str(tmp_path / "cache.json"))
+    log = Log()
+    _diamond(log, folder).run(workers=2, cache=cache, resolve=resolve)
+    assert sorted(log.order("end")) == ["a", "b", "c", "d", "e"]
+
+    log = Log()
+    _diamond(log, folder).run(workers=2, cache=StageCache(str(tmp_path / "cache.json")), resolve=resolve)
+    assert log.events == []
+
+    #a missing output reruns its stage and, through the keys, nothing else
+    os.remove(resolve("C"))
+    log = Log()
+    _diamond(log, folder).run(workers=2, cache=StageCache(str(tmp_path / "cache.json")), resolve=resolve)
+    assert log.order("end") == ["c"]
+
+    #new parameters for a rerun a and everything downstream of it
+    log = Log()
+    pipeline = _diamond(log, folder)
+    stages = [Stage(s.name, s.fn, s.inputs, s.outputs, s.kind, params={"v": 2} if s.name == "a" else None)
+              for s in pipeline.stages.values()]
+    Pipeline(stages).run(workers=2, cache=StageCache(str(tmp_path / "cache.json")), resolve=resolve)
+    assert sorted(log.order("end")) == ["a", "b", "c", "d"]
+
+
+def count_cells(path, record=None):
+    #a "process" stage: module level so it pickles
+    record["cells"] = os.path.getsize(path) * 2
+    return os.getpid()
+
+
+@pytest.mark.parametrize("kind,workers", [("thread", 1), ("thread", 2), ("process", 2)])
+def test_profile_records(tmp_path, kind, workers):
+    folder = str(tmp_path)
+    for name, size in [("In", 300), ("Other", 50)]:
+        with open(os.path.join(folder, name + ".npy"), "wb") as f:
+            f.write(b"x" * size)
+    stages = [Stage("sized", count_cells, ["In", "Other"], ["Out"], kind=kind,
+                    args=(os.path.join(folder, "In.npy"),), record=True),
+              Stage("plain", Log().stage("plain"), ["In"], ["Plain"], kind="thread")]
+    profiler = Profiler()
+    Pipeline(stages).run(workers=workers, profiler=profiler, resolve=lambda name: os.path.join(folder, name))
+    records = {r["stage"]: r for r in profiler.records}
+    assert records["sized"]["input_bytes"] == 350 and records["sized"]["cells"] == 600
+    assert records["plain"]["input_bytes"] == 300 and records["plain"]["cells"] is None
+    assert all(r["status"] == "ok" and r["wall_s"] >= 0 for r in records.values())
+
+
+def test_plan_and_critical_path():
+    pipeline = _diamond(Log())
+    assert pipeline.order() == ["a", "e", "b", "c", "d"]
+    assert pipeline.waves() == [["a", "e"], ["b", "c"], ["d"]]
+    assert pipeline.sources() == []
+    total, path = pipeline.critical_path()
+    assert total == 3.0 and path[0] == "a" and path[2] == "d"
+    costs = {"a": 1.0, "b": 2.0, "c": 5.0, "d": 1.0, "e": 8.5}
+    assert pipeline.critical_path(costs) == (8.5, ["e"])
+    costs["c"] = 7.0
+    assert pipeline.critical_path(costs) == (9.0, ["a", "c", "d"])
+    plan = pipeline.plan(costs, workers=2)
+    assert plan.splitlines()[:4] == ["5 stages from 0 inputs, at most 2 at once",
+                                     "wave 1: a (thread), e (thread)",
+                                     "wave 2: b (thread), c (thread)",
+                                     "wave 3: d (thread)"]
+    assert "critical path: 9.0 s of 19.5 s of stage time" in plan
+
+
+def test_graph_errors():
+    fn = Log().stage("x")
+    with pytest.raises(ValueError, match="written by both"):
+        Pipeline([Stage("a", fn, outputs=["X"]), Stage("b", fn, outputs=["x"])])
+    with pytest.raises(ValueError, match="cycle"):
+        Pipeline([Stage("a", fn, ["Y"], ["X"]), Stage("b", fn, ["X"], ["Y"])]).order()
+    with pytest.raises(ValueError, match="kind"):
+        Pipeline([Stage("a", fn, kind="gpu")])
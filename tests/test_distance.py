@@ -0,0 +1,55 @@
+#-------------------------------------------------------------------------------
+# Name:        test_distance
+# Purpose:     the exact distance transform against the minimum over every
+#              pair of cells, and the shared bit-packed burn against burning
+#              each layer on its own.
+#-------------------------------------------------------------------------------
+import numpy as np
+import pytest
+
+from kananaskis.distance import burn_sources, distance_surfaces, edt
+from kananaskis.grid import Grid
+
+SEEDS = range(20)
+
+
+def _brute_edt(mask, cell):
+    rows, cols = np.nonzero(mask)
+    out = np.full(mask.shape, np.inf)
+    for r, c in np.ndindex(mask.shape):
+        if len(rows):
+            out[r, c] = np.sqrt(((rows - r) ** 2 + (cols - c) ** 2).min()) * cell
+    return out
+
+
+@pytest.mark.parametrize("seed", SEEDS)
+def test_edt_matches_brute_force(seed):
+    rng = np.random.default_rng(seed)
+    shape = tuple(rng.integers(1, 16, size=2))
+    mask = rng.random(shape) < rng.choice([0.02, 0.1, 0.5])
+    cell = float(rng.choice([1.0, 30.0]))
+    np.testing.assert_allclose(edt(mask, cell), _brute_edt(mask, cell), rtol=1e-12)
+
+
+def test_edt_without_sources_is_inf():
+    assert np.isinf(edt(np.zeros((4, 5), dtype=bool))).all()
+
+
+def _random_layer(rng, grid, n):
+    geoms = []
+    for _ in range(n):
+        pts = rng.uniform([grid.xmin, grid.ymin], [grid.xmax, grid.ymax], size=(int(rng.integers(2, 5)), 2))
+        geoms.append({"type": "LineString", "coordinates": pts.tolist()})
+    return geoms
+
+
+@pytest.mark.parametrize("workers", [1, 2])
+def test_shared_burn_matches_layers_alone(workers):
+    rng = np.random.default_rng(3)
+    grid = Grid(xmin=0.0, ymax=600.0, cell=25.0, nrows=24, ncols=30, epsg=26911)
+    layers = {f"layer_{i}": _random_layer(rng, grid, i) for i in range(10)}
+    surfaces = distance_surfaces(layers, grid, workers)
+    for name, geoms in layers.items():
+        bits, index = burn_sources({name: geoms}, grid)
+        expected = edt(bits != 0, grid.cell).astype(np.float32)
+        np.testing.assert_array_equal(surfaces[name], expected)
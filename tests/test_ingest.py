@@ -0,0 +1,62 @@
+#-------------------------------------------------------------------------------
+# Name:        test_ingest
+# Purpose:     the fused Project + Clip of the ingest against the two tools run
+#              one after the other: the bbox pre-filter may only drop features
+#              the clip would have dropped anyway.
+#-------------------------------------------------------------------------------
+import os
+
+import numpy as np
+import pytest
+
+from kananaskis import crs
+from kananaskis.backends import get_backend
+from kananaskis.features import FEATURE_EXT, feature, read_features, write_features
+
+FEATURE_DATASETS = ["Road", "Trails", "Hydro", "Landcover", "NTS50", "AB_Township", "Bear_Habitat"]
+
+
+def _both(backend, in_fc, clip_fc, tmp_path, epsg=26911):
+    #(project_clip output, project then clip output)
+    fused, projected, clipped = (str(tmp_path / name) for name in ("fused", "projected", "clipped"))
+    backend.project_clip(in_fc, clip_fc, fused, epsg)
+    backend.project(in_fc, projected, epsg)
+    backend.clip(projected, clip_fc, clipped)
+    return read_features(fused + FEATURE_EXT), read_features(clipped + FEATURE_EXT)
+
+
+@pytest.mark.parametrize("name", FEATURE_DATASETS)
+def test_project_clip_matches_project_then_clip(study_area, tmp_path, name):
+    in_fc = os.path.join(study_area.manifest["datasets"][name]["folder"], name)
+    (fused, fused_epsg), (reference, reference_epsg) = _both(get_backend("local"), in_fc, study_area.boundary,
+                                                             tmp_path)
+    assert fused_epsg == reference_epsg == 26911
+    assert fused == reference
+    assert reference
+
+
+@pytest.mark.parametrize("seed", range(5))
+def test_project_clip_drops_only_what_clip_drops(study_area, tmp_path, seed):
+    #random points, lines and boxes in NAD83 geographic, most of them well
+    #outside the study area, so the pre-filter has plenty to throw away
+    rng = np.random.default_rng(seed)
+    to_geographic = crs.transformer(26911, 4269)
+    xmin, ymin, xmax, ymax = study_area.manifest["extent"]
+    lon, lat = to_geographic(np.array([xmin - 10000, xmax + 10000]), np.array([ymin - 10000, ymax + 10000]))
+    feats = []
+    for i in range(60):
+        x, y = rng.uniform(lon[0], lon[1], 3), rng.uniform(lat[0], lat[1], 3)
+        kind = i % 3
+        if kind == 0:
+            geom = {"type": "Point", "coordinates": [x[0], y[0]]}
+        elif kind == 1:
+            geom = {"type": "LineString", "coordinates": np.column_stack([x, y]).tolist()}
+        else:
+            x0, x1, y0, y1 = min(x[:2]), max(x[:2]), min(y[:2]), max(y[:2])
+            geom = {"type": "Polygon", "coordinates": [[[x0, y0], [x1, y0], [x1, y1], [x0, y1], [x0, y0]]]}
+        feats.append(feature(geom, ID=i))
+    in_fc = str(tmp_path / "random")
+    write_features(in_fc + FEATURE_EXT, feats, 4269)
+    (fused, _), (reference, _) = _both(get_backend("local"), in_fc, study_area.boundary, tmp_path)
+    assert fused == reference
+    assert 0 < len(reference) < len(feats)
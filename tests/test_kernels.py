@@ -0,0 +1,96 @@
+#-------------------------------------------------------------------------------
+# Name:        test_kernels
+# Purpose:     the numeric kernels checked against brute-force references on
+#              tiny random inputs: the remap lookup tables against the rules
+#              one by one, and the compiled rescales against the transfer
+#              functions written out cell by cell.
+#-------------------------------------------------------------------------------
+import numpy as np
+import pytest
+
+from kananaskis.kernels import Remap, Rescaler, StatsAccumulator, TfLarge, TfLinear, TfSmall, rescale
+
+SEEDS = range(20)
+
+
+def _brute_remap(rules, x):
+    #the first rule whose range holds the value wins; NaN stays NaN
+    out = np.array(x, dtype=np.float64)
+    for i, v in np.ndenumerate(out):
+        for low, high, new in rules:
+            if low <= v <= high:
+                out[i] = np.nan if new is None else new
+                break
+    return out
+
+
+def _random_remap(rng):
+    entries = []
+    for _ in range(int(rng.integers(1, 8))):
+        low = int(rng.integers(-5, 40))
+        high = low + int(rng.integers(0, 10))
+        new = "NODATA" if rng.random() < 0.15 else str(int(rng.integers(0, 100)))
+        entries.append(f"{low} {new}" if low == high and rng.random() < 0.5 else f"{low} {high} {new}")
+    return "; ".join(entries)
+
+
+@pytest.mark.parametrize("seed", SEEDS)
+def test_remap_table_matches_rules(seed):
+    rng = np.random.default_rng(seed)
+    remap = Remap(_random_remap(rng))
+    assert remap.table is not None
+    #integers inside and outside the table, plus fractions and NoData
+    ints = rng.integers(-15, 60, size=200)
+    floats = np.concatenate([ints[:100].astype(np.float64), rng.uniform(-15, 60, 50), np.full(5, np.nan)])
+    for x in (ints, floats):
+        expected = _brute_remap(remap.rules, x)
+        np.testing.assert_array_equal(remap(x), expected)
+        np.testing.assert_array_equal(remap._by_rules(x.astype(np.float64)), expected)
+
+
+@pytest.mark.parametrize("seed", SEEDS)
+def test_remap_integer_output_matches_rules(seed):
+    rng = np.random.default_rng(seed)
+    text = _random_remap(rng).replace("NODATA", "0")
+    remap = Remap(text, dtype=np.int32)
+    x = rng.integers(-15, 60, size=200)
+    np.testing.assert_array_equal(remap(x), _brute_remap(remap.rules, x).astype(np.int32))
+
+
+def _transfer(function, v, stats):
+    #RescaleByFunction's transfer functions for one value
+    if isinstance(function, TfLinear):
+        return min(1.0, max(0.0, (v - stats.minimum) / (stats.maximum - stats.minimum)))
+    mid = stats.mean if function.midpoint is None else function.midpoint
+    spread = -function.spread if isinstance(function, TfLarge) else function.spread
+    return 1.0 / (1.0 + (v / mid) ** spread)
+
+
+@pytest.mark.parametrize("seed", SEEDS)
+@pytest.mark.parametrize("function", [TfLarge(), TfLarge(midpoint=40.0, spread=2.0), TfSmall(), TfLinear()])
+def test_rescale_matches_transfer_function(seed, function):
+    rng = np.random.default_rng(seed)
+    x = rng.uniform(1, 100, size=(8, 9))
+    x[rng.random(x.shape) < 0.1] = np.nan
+    acc = StatsAccumulator()
+    acc.add(x)
+    stats = acc.result()
+    f_lo, f_hi = _transfer(function, stats.minimum, stats), _transfer(function, stats.maximum, stats)
+    expected = np.full(x.shape, np.nan)
+    for i, v in np.ndenumerate(x):
+        if not np.isnan(v):
+            expected[i] = 10 + (_transfer(function, v, stats) - f_lo) * (1 - 10) / (f_hi - f_lo)
+    np.testing.assert_allclose(rescale(x, function, stats, 10, 1), expected, rtol=1e-12, equal_nan=True)
+    #the float32 kernel, in place on the input's own buffer
+    buffer = x.astype(np.float32)
+    out = Rescaler(function, stats, 10, 1)(buffer, buffer)
+    assert out.dtype == np.float32
+    np.testing.assert_allclose(out, expected, rtol=1e-5, atol=1e-5, equal_nan=True)
+
+
+def test_rescale_flat_input():
+    #one value everywhere: no range to stretch, so everything is from_scale
+    x = np.array([[5.0, 5.0], [np.nan, 5.0]])
+    acc = StatsAccumulator()
+    acc.add(x)
+    np.testing.assert_array_equal(rescale(x, TfLarge(), acc.result(), 10, 1), [[10, 10], [np.nan, 10]])
@@ -0,0 +1,42 @@
+#-------------------------------------------------------------------------------
+# Name:        test_model
+# Purpose:     the model's stages one at a time (landcover_reclass,
+#              rescale:<factor>, weighted_sum) against the fused habitat graph
+#              they were split out of, on the local backend.
+#-------------------------------------------------------------------------------
+import os
+
+import numpy as np
+
+from kananaskis import lazy
+from kananaskis.backends import get_backend
+from kananaskis.grid import read_grid, read_raster
+from kananaskis.overlay import FACTORS, MODEL_REMAP
+from kananaskis.pipeline import FACTOR_RASTERS, RESCALE, RESCALES
+
+WEIGHTS = {"terrain": 2, "roads": 1, "landcover": 0.5, "hydro": 1, "trails": 3}
+
+
+def _raster(path):
+    return np.array(read_raster(path)[0], dtype=np.float64)
+
+
+def test_stages_match_fused_model(gdb):
+    backend = get_backend("local")
+    path = lambda name: os.path.join(gdb, name)
+    grid, _ = read_grid(path("D_ab_dem"))
+    graph = lazy.habitat_graph(gdb, grid, MODEL_REMAP, WEIGHTS)
+    graph.compute()
+    fused = _raster(path("Combined_Rasters"))
+
+    backend.reclassify(path("Landcover"), MODEL_REMAP, path("LC_Reclass"))
+    for factor, (source, out_raster) in RESCALES.items():
+        backend.rescale(path(source), path(out_raster), *RESCALE, focal_range=3 if factor == "terrain" else None)
+    backend.weighted_sum([(path(FACTOR_RASTERS[f]), WEIGHTS[f]) for f in FACTORS], path("Combined_Rasters"))
+    staged = _raster(path("Combined_Rasters"))
+
+    np.testing.assert_array_equal(np.isnan(staged), np.isnan(fused))
+    np.testing.assert_allclose(staged, fused, rtol=1e-5, equal_nan=True)
+    #only the outputs the stages name are written
+    assert not os.path.exists(path("Terrain_R.npy"))
+
@@ -0,0 +1,71 @@
+#-------------------------------------------------------------------------------
+# Name:        test_overlay
+# Purpose:     the batched weighted overlay: every scenario's surface from the
+#              one pass has to equal a WeightedSum run with that scenario's
+#              weights alone. Plus the CSV and --weight parsing around it.
+#-------------------------------------------------------------------------------
+import os
+
+import numpy as np
+import pytest
+
+from kananaskis.backends import get_backend
+from kananaskis.grid import Grid, read_raster, write_raster
+from kananaskis.overlay import FACTORS, load_scenarios, parse_weights, scenario_raster
+
+
+def _write_csv(path, text):
+    with open(path, "w") as f:
+        f.write(text)
+    return str(path)
+
+
+@pytest.fixture
+def factors(tmp_path):
+    #five random factor rasters with scattered NoData, on one grid
+    rng = np.random.default_rng(11)
+    grid = Grid(xmin=500000.0, ymax=5650000.0, cell=25.0, nrows=37, ncols=53, epsg=26911)
+    paths = {}
+    for factor in FACTORS:
+        values = rng.uniform(1, 10, grid.shape).astype(np.float32)
+        values[rng.random(grid.shape) < 0.05] = np.nan
+        paths[factor] = str(tmp_path / f"{factor}_factor")
+        write_raster(paths[factor], values, grid, float("nan"))
+    return paths
+
+
+def test_each_scenario_matches_its_own_weighted_sum(factors, tmp_path):
+    backend = get_backend("local")
+    scenarios = load_scenarios(_write_csv(tmp_path / "scenarios.csv",
+                                          "scenario,terrain,roads,landcover,hydro,trails\n"
+                                          "even,1,1,1,1,1\n"
+                                          "roads heavy,1,4,1,1,0.5\n"
+                                          "no water,2,1,1,0,1\n"))
+    outputs = {s: str(tmp_path / scenario_raster(s)) for s in scenarios}
+    backend.weighted_overlay(factors, scenarios, outputs)
+    for name, weights in scenarios.items():
+        single = str(tmp_path / "single")
+        backend.weighted_sum([(factors[f], weights[f]) for f in FACTORS], single)
+        expected = np.array(read_raster(single)[0])
+        np.testing.assert_allclose(np.array(read_raster(outputs[name])[0]), expected, rtol=1e-6, equal_nan=True)
+
+
+def test_load_scenarios_defaults_and_errors(tmp_path):
+    scenarios = load_scenarios(_write_csv(tmp_path / "a.csv", "scenario,roads\nbase,\nroads,3\n"))
+    assert scenarios["base"] == dict.fromkeys(FACTORS, 1.0)
+    assert scenarios["roads"]["roads"] == 3.0
+    for text in ("scenario,rivers\nbase,2\n", "name,roads\nbase,2\n", "scenario,roads\nbase,lots\n", "scenario\n"):
+        with pytest.raises(ValueError):
+            load_scenarios(_write_csv(tmp_path / "bad.csv", text))
+
+
+def test_scenario_raster_names():
+    assert scenario_raster("roads heavy") == "Scenario_roads_heavy"
+    assert scenario_raster("base") == "Scenario_base"
+
+
+def test_parse_weights():
+    assert parse_weights(["roads=2", "terrain=0.5"]) == {"roads": 2.0, "terrain": 0.5}
+    for bad in (["rivers=2"], ["roads=lots"], ["roads"]):
+        with pytest.raises(ValueError):
+            parse_weights(bad)
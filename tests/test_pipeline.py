@@ -0,0 +1,58 @@
+#-------------------------------------------------------------------------------
+# Name:        test_pipeline
+# Purpose:     the run around the stages: FinalProject.py and the package
+#              publish under the same names, and the Spatial Analyst extension
+#              is only checked out (and back in) by runs that use it. arcpy is
+#              a stand-in recording the calls.
+#-------------------------------------------------------------------------------
+import os
+import sys
+import types
+
+import pytest
+
+from kananaskis import pipeline
+from kananaskis.config import RENAMES
+from kananaskis.dag import Pipeline
+from kananaskis.pipeline import ProjectSettings
+
+
+def test_final_project_uses_the_package_names():
+    import FinalProject
+    default = ProjectSettings()
+    assert FinalProject.settings.renames == default.renames == RENAMES
+    assert default.names("D_ab_dem") == "DEM" and default.names("A_AB_Township") == "Townships"
+    assert default.names("Distance_to_Roads") == "Distance_to_Roads"
+
+
+@pytest.fixture
+def arcpy(monkeypatch):
+    calls = []
+    module = types.ModuleType("arcpy")
+    module.CheckOutExtension = lambda name: calls.append(("out", name))
+    module.CheckInExtension = lambda name: calls.append(("in", name))
+    monkeypatch.setitem(sys.modules, "arcpy", module)
+    monkeypatch.setattr(pipeline, "get_backend", lambda name, **options: types.SimpleNamespace(exists=os.path.exists))
+    monkeypatch.setattr(pipeline, "area_summary", lambda *args: None)
+    monkeypatch.setattr(pipeline, "build_pipeline", lambda *args: Pipeline([]))
+    return calls
+
+
+@pytest.mark.parametrize("steps,expected", [(["area_summary"], []),
+                                            (["model"], [("out", "Spatial"), ("in", "Spatial")])])
+def test_extension_only_when_used(arcpy, tmp_path, capsys, steps, expected):
+    settings = ProjectSettings(str(tmp_path))
+    pipeline.run(settings, steps)
+    assert arcpy == expected
+    out = capsys.readouterr().out
+    assert ("Spatial Extension Engaged!" in out) == bool(expected)
+    assert ("Spatial Extension Disengaged!" in out) == bool(expected)
+
+
+def test_extension_checked_in_after_failure(arcpy, tmp_path, monkeypatch):
+    def failing(*args):
+        raise RuntimeError("stage failed")
+    monkeypatch.setattr(pipeline, "build_pipeline", failing)
+    with pytest.raises(RuntimeError):
+        pipeline.run(ProjectSettings(str(tmp_path)), ["model"])
+    assert arcpy == [("out", "Spatial"), ("in", "Spatial")]
@@ -0,0 +1,132 @@
+#-------------------------------------------------------------------------------
+# Name:        test_projcache
+# Purpose:     the projection cache: a key changes with the source files and
+#              the boundary's content only, the least recently used entries go
+#              past the cap, and an ingest off the cache lands the same
+#              datasets in the gdb, copied straight from the cache entries.
+#-------------------------------------------------------------------------------
+import os
+
+import numpy as np
+
+from kananaskis.backends import get_backend
+from kananaskis.grid import build_overviews, read_raster
+from kananaskis.ingest import IngestSettings, run_ingest
+from kananaskis.profiling import Profiler
+from kananaskis.projcache import ProjectionCache
+
+
+def _dataset(folder, name, size):
+    os.makedirs(folder, exist_ok=True)
+    path = os.path.join(folder, name)
+    for ext in (".shp", ".dbf"):
+        with open(path + ext, "wb") as f:
+            f.write(b"x" * size)
+    return path + ".shp"
+
+
+def _bump(path, seconds=10):
+    stat = os.stat(path)
+    os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns + seconds * 10 ** 9))
+
+
+def test_key_follows_source_and_boundary(tmp_path):
+    cache = ProjectionCache(str(tmp_path / "cache"))
+    source = _dataset(str(tmp_path / "in"), "Road", 100)
+    boundary = _dataset(str(tmp_path / "in"), "Bound", 10)
+    key = cache.key(source, boundary, {"epsg": 26911})
+    assert cache.lookup(key) is None and cache.misses == 1
+    kept = _dataset(cache.part(key), "Road", 50)
+    cache.add(key, kept, source)
+    assert cache.lookup(key) == os.path.join(cache.folder, key, "Road.shp") and cache.hits == 1
+    assert not os.path.exists(cache.part(key))
+
+    #the boundary is rewritten with the same polygon: same key
+    with open(boundary, "wb") as f:
+        f.write(b"x" * 10)
+    _bump(boundary)
+    assert cache.key(source, boundary, {"epsg": 26911}) == key
+    #other settings, or a republished source, miss
+    assert cache.key(source, boundary, {"epsg": 3400}) != key
+    _bump(os.path.splitext(source)[0] + ".dbf")
+    assert cache.key(source, boundary, {"epsg": 26911}) != key
+    #the index outlives the instance
+    assert ProjectionCache(cache.folder).lookup(key) == os.path.join(cache.folder, key, "Road.shp")
+
+
+def test_evicts_least_recently_used(tmp_path):
+    #room for two entries of two 1 KB files
+    cache = ProjectionCache(str(tmp_path / "cache"), max_mb=5120 / 1024 / 1024)
+    keys = []
+    for i, name in enumerate(["A", "B", "C"]):
+        key = f"key{i}"
+        cache.add(key, _dataset(cache.part(key), name, 1024), name)
+        cache.index["entries"][key]["used"] = i
+        keys.append(key)
+    #A is the oldest until it's looked up again
+    assert cache.lookup(keys[0])
+    assert cache.evict() == 2 * 2048
+    assert sorted(cache.index["entries"]) == ["key0", "key2"]
+    assert not os.path.exists(os.path.join(cache.folder, "key1"))
+    #a .part folder left by a dead run goes too, one still being written stays
+    stale, live = cache.part("stale"), cache.part("live")
+    for part in (stale, live):
+        _dataset(part, "X", 1)
+    os.utime(stale, (0, 0))
+    cache.evict()
+    assert not os.path.exists(stale) and os.path.exists(live)
+    assert ProjectionCache(cache.folder).lookup("key1") is None
+
+
+def _ingest(study_area, tmp_path, gdb_name, projections):
+    backend = get_backend("local")
+    backend.create_file_gdb(str(tmp_path), gdb_name)
+    gdb = os.path.join(str(tmp_path), gdb_name)
+    temp = str(tmp_path / "temp")
+    profiler = Profiler()
+    settings = IngestSettings("local", temp, study_area.boundary)
+    run_ingest(study_area.folders, study_area.prefixes, gdb, settings, workers=1, profiler=profiler,
+               projections=projections)
+    return gdb, profiler.records
+
+
+def test_ingest_from_the_cache(study_area, tmp_path):
+    folder = str(tmp_path / "projection_cache")
+    first, records = _ingest(study_area, tmp_path, "First.gdb", ProjectionCache(folder))
+    assert any(r["stage"].endswith(":ProjectClip") for r in records)
+    entries = sorted(os.listdir(folder))
+
+    projections = ProjectionCache(folder)
+    second, records = _ingest(study_area, tmp_path, "Second.gdb", projections)
+    assert projections.misses == 0 and projections.hits == len(projections.index["entries"]) > 0
+    #nothing projected or staged: the gdb is written by the commits alone
+    assert {r["stage"].rsplit(":", 1)[1] for r in records} == {"commit"}
+    assert os.listdir(str(tmp_path / "temp")) == []
+    #the entries are copied, not moved out of the cache
+    assert sorted(os.listdir(folder)) == entries
+    assert all(os.path.isdir(os.path.join(folder, key)) for key in projections.index["entries"])
+
+    assert sorted(os.listdir(second)) == sorted(os.listdir(first))
+    for name in os.listdir(first):
+        stem, ext = os.path.splitext(name)
+        if ext == ".npy":
+            one, grid_one, _ = read_raster(os.path.join(first, stem))
+            two, grid_two, _ = read_raster(os.path.join(second, stem))
+            assert grid_one == grid_two
+            np.testing.assert_array_equal(one, two)
+        elif ext != ".json":
+            with open(os.path.join(first, name), "rb") as f, open(os.path.join(second, name), "rb") as g:
+                assert f.read() == g.read()
+
+
+def test_cached_raster_replaces_stale_overviews(study_area, tmp_path):
+    folder = str(tmp_path / "projection_cache")
+    #a cache entry copied over a raster that has overviews replaces them too
+    gdb, _ = _ingest(study_area, tmp_path, "Wildlife.gdb", ProjectionCache(folder))
+    dem = os.path.join(gdb, "D_ab_dem")
+    build_overviews(dem, (4,))
+    before = read_raster(dem)[0]
+    settings = IngestSettings("local", str(tmp_path / "temp"), study_area.boundary)
+    run_ingest(study_area.folders, study_area.prefixes, gdb, settings, workers=1, projections=ProjectionCache(folder))
+    assert not os.path.exists(dem + ".ovr4.npy")
+    np.testing.assert_array_equal(read_raster(dem)[0], before)
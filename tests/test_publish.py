@@ -0,0 +1,125 @@
+#-------------------------------------------------------------------------------
+# Name:        test_publish
+# Purpose:     the staging gdb on the local backend: it starts empty and reads
+#              through to the published gdb, publish() carries the untouched
+#              datasets over (as hard links) and swaps it in, and a failed
+#              swap or run leaves the published gdb as it was.
+#-------------------------------------------------------------------------------
+import os
+
+import numpy as np
+import pytest
+
+from kananaskis.backends import get_backend
+from kananaskis.cache import StageCache
+from kananaskis.grid import read_raster, write_raster
+from kananaskis.ingest import IngestSettings, run_ingest
+from kananaskis.publish import OutputManifest, checkout, discard, publish, staging_path
+
+RENAMES = (("D_ab_dem", "DEM"),)
+
+
+@pytest.fixture
+def published(gdb):
+    #the ingested gdb, published under the deliverable's names
+    backend = get_backend("local")
+    backend.rename(os.path.join(gdb, "D_ab_dem"), os.path.join(gdb, "DEM"))
+    return gdb
+
+
+def _listing(path):
+    return sorted(os.listdir(path))
+
+
+def test_checkout_starts_empty(published):
+    backend = get_backend("local")
+    staging = staging_path(published)
+    #a staging gdb left by a run that died goes first
+    os.makedirs(staging)
+    open(os.path.join(staging, "Leftover.geojson"), "w").close()
+    before = _listing(published)
+    assert checkout(backend, published) == staging
+    assert _listing(staging) == []
+    assert _listing(published) == before
+
+
+def test_source_reads_through(published):
+    backend = get_backend("local")
+    staging = checkout(backend, published)
+    names = OutputManifest(RENAMES).reading_through(published, "local")
+    assert names.source(staging, "D_ab_dem") == os.path.join(published, "DEM")
+    assert names.source(staging, "Combined_Rasters") == os.path.join(staging, "Combined_Rasters")
+    dem, grid, nodata = read_raster(os.path.join(published, "DEM"))
+    write_raster(os.path.join(staging, "DEM"), np.array(dem) + 1, grid, nodata)
+    assert names.source(staging, "D_ab_dem") == os.path.join(staging, "DEM")
+    #without a fallback it's the workspace, there or not
+    assert OutputManifest(RENAMES).source(staging, "K_Road") == os.path.join(staging, "K_Road")
+
+
+def test_publish_carries_unchanged_datasets(published):
+    backend = get_backend("local")
+    before = _listing(published)
+    inode = os.stat(os.path.join(published, "K_Road.geojson")).st_ino
+    staging = checkout(backend, published)
+    dem, grid, nodata = read_raster(os.path.join(published, "DEM"))
+    new_dem = np.array(dem) + 1
+    write_raster(os.path.join(staging, "DEM"), new_dem, grid, nodata)
+    write_raster(os.path.join(staging, "Combined_Rasters"), new_dem, grid, nodata)
+
+    assert publish(backend, staging, published) == published
+    assert not os.path.exists(staging)
+    assert not backend.exists(published.replace(".gdb", "_previous.gdb"))
+    assert _listing(published) == sorted(before + ["Combined_Rasters.json", "Combined_Rasters.npy"])
+    #the rewritten dataset wins, the rest are the very same files
+    np.testing.assert_array_equal(read_raster(os.path.join(published, "DEM"))[0], new_dem)
+    assert os.stat(os.path.join(published, "K_Road.geojson")).st_ino == inode
+
+
+def test_fresh_publish_carries_nothing(published):
+    backend = get_backend("local")
+    staging = checkout(backend, published)
+    write_raster(os.path.join(staging, "Combined_Rasters"), np.ones((3, 3), np.float32),
+                 read_raster(os.path.join(published, "DEM"))[1])
+    publish(backend, staging, published, fresh=True)
+    assert _listing(published) == ["Combined_Rasters.json", "Combined_Rasters.npy"]
+
+
+def test_failed_swap_restores_published(published, monkeypatch):
+    backend = get_backend("local")
+    before = _listing(published)
+    staging = checkout(backend, published)
+    write_raster(os.path.join(staging, "Combined_Rasters"), np.ones((3, 3), np.float32),
+                 read_raster(os.path.join(published, "DEM"))[1])
+    rename = backend.rename
+
+    def failing(old, new):
+        if old == staging:
+            raise OSError("gdb is locked")
+        rename(old, new)
+    monkeypatch.setattr(backend, "rename", failing)
+    with pytest.raises(OSError):
+        publish(backend, staging, published)
+    #the published gdb is back under its name, with exactly what it had
+    assert _listing(published) == before
+    assert not os.path.exists(published.replace(".gdb", "_previous.gdb"))
+    discard(backend, staging, published)
+    assert not os.path.exists(staging)
+    assert _listing(published) == before
+
+
+def test_ingest_reuses_published_outputs(study_area, published, tmp_path):
+    #a full run's ingest into an empty staging gdb finds every output it can
+    #reuse in the published gdb and writes nothing
+    backend = get_backend("local")
+    cache = StageCache(str(tmp_path / "cache.json"), exists=backend.exists)
+    names = OutputManifest(RENAMES)
+    settings = IngestSettings("local", str(tmp_path / "temp"), study_area.boundary)
+    run_ingest(study_area.folders, study_area.prefixes, published, settings, workers=1, cache=cache, names=names)
+
+    staging = checkout(backend, published)
+    before = _listing(published)
+    run_ingest(study_area.folders, study_area.prefixes, staging, settings, workers=1, cache=cache,
+               names=names.reading_through(published, "local"))
+    assert _listing(staging) == []
+    publish(backend, staging, published)
+    assert _listing(published) == before
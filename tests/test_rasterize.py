@@ -0,0 +1,86 @@
+#-------------------------------------------------------------------------------
+# Name:        test_rasterize
+# Purpose:     the landcover rasterizer checked against a brute-force
+#              reference on tiny random inputs: the area-weighted majority
+#              against 32x32 point sampling of each cell.
+#-------------------------------------------------------------------------------
+import math
+
+import numpy as np
+import pytest
+
+from kananaskis.grid import Grid
+from kananaskis.rasterize import rasterize_majority
+
+SEEDS = range(20)
+
+
+def _inside(ring, x, y):
+    #even-odd rule for points x, y against a closed ring
+    inside = np.zeros(x.shape, dtype=bool)
+    for (x1, y1), (x2, y2) in zip(ring[:-1], ring[1:]):
+        if y1 == y2:
+            continue
+        crosses = (y1 > y) != (y2 > y)
+        xc = x1 + (y - y1) * (x2 - x1) / (y2 - y1)
+        inside ^= crosses & (x < xc)
+    return inside
+
+
+def _random_polygon(rng, grid):
+    #a star-shaped ring around a random centre, so it never crosses itself
+    n = int(rng.integers(3, 9))
+    angles = np.sort(rng.uniform(0, 2 * math.pi, n))
+    radius = rng.uniform(0.5, 4, n)
+    cx, cy = rng.uniform(grid.xmin, grid.xmax), rng.uniform(grid.ymin, grid.ymax)
+    ring = np.column_stack([cx + radius * np.cos(angles), cy + radius * np.sin(angles)]).tolist()
+    return {"type": "Polygon", "coordinates": [ring + ring[:1]]}
+
+
+def _supersampled(shapes, grid, values, n=32):
+    #coverage of every class in every cell from n x n points at the centres
+    #of equal sub-cells; like rasterize_majority, overlaps count for each shape
+    offsets = (np.arange(n) + 0.5) / n
+    cover = np.zeros((len(values), grid.nrows, grid.ncols))
+    for r, c in np.ndindex(grid.shape):
+        x, y = np.meshgrid(grid.xmin + (c + offsets) * grid.cell, grid.ymax - (r + offsets) * grid.cell)
+        for geom, value in shapes:
+            cover[values.index(value), r, c] += _inside(geom["coordinates"][0], x, y).mean()
+    return cover
+
+
+@pytest.mark.parametrize("seed", SEEDS)
+def test_majority_matches_supersampling(seed):
+    rng = np.random.default_rng(seed)
+    grid = Grid(xmin=0.0, ymax=10.0, cell=1.0, nrows=10, ncols=10, epsg=3400)
+    shapes = [(_random_polygon(rng, grid), int(rng.integers(1, 4))) for _ in range(int(rng.integers(1, 6)))]
+    values = sorted({v for _, v in shapes})
+    fill = -1
+    out = rasterize_majority(shapes, grid, fill=fill, samples=32)
+
+    cover = _supersampled(shapes, grid, values)
+    ordered = np.sort(cover, axis=0)
+    covered = cover.sum(axis=0)
+    expected = np.where(covered >= 0.5, np.array(values)[cover.argmax(axis=0)], fill)
+    #point sampling is only good to about a sub-cell per edge, so cells that
+    #come close to a tie or to the half-covered cut are too close to call
+    margin = 0.1
+    clear = np.abs(covered - 0.5) > margin
+    if len(values) > 1:
+        clear &= (ordered[-1] - ordered[-2] > margin) | (covered < 0.5)
+    assert clear.sum() > grid.nrows * grid.ncols // 2
+    np.testing.assert_array_equal(out[clear], expected[clear])
+
+
+def test_bands_and_workers_change_nothing(monkeypatch):
+    rng = np.random.default_rng(3)
+    grid = Grid(xmin=0.0, ymax=40.0, cell=1.0, nrows=40, ncols=30, epsg=3400)
+    shapes = [(_random_polygon(rng, grid), int(rng.integers(1, 5))) for _ in range(30)]
+    lut = {1: 10, 2: None}
+    whole = rasterize_majority(shapes, grid, lut, fill=-1)
+    #the remap is applied to the winning class; NODATA and unmapped classes as the lut says
+    raw = rasterize_majority(shapes, grid, fill=-1)
+    np.testing.assert_array_equal(whole, np.select([raw == 1, raw == 2], [10, -1], raw))
+    monkeypatch.setattr("kananaskis.rasterize._band_rows", lambda *args: 7)
+    for workers in (1, 2):
+        np.testing.assert_array_equal(rasterize_majority(shapes, grid, lut, fill=-1, workers=workers), whole)
@@ -0,0 +1,196 @@
+#-------------------------------------------------------------------------------
+# Name:        test_routing
+# Purpose:     Dijkstra against plain relaxation until nothing changes, and the
+#              reuse of one cost graph: across weight scenarios it has to give
+#              what a graph built per scenario gives, and the local backend's
+#              cached graph must not outlive a rewritten cost raster. The
+#              coarse-to-fine pyramid: the local one against full resolution,
+#              the arcpy one against a stand-in recording its calls.
+#-------------------------------------------------------------------------------
+import contextlib
+import math
+import os
+import sys
+import types
+
+import numpy as np
+import pytest
+
+from kananaskis.backends import get_backend
+from kananaskis.features import FEATURE_EXT, read_features
+from kananaskis.grid import read_grid, write_raster
+from kananaskis.routing import NEIGHBOURS, CostGraph, _heap_dijkstra, connect_regions, scenario_connections
+
+SEEDS = range(20)
+
+
+def _relaxed(cost, cell, sources):
+    #Bellman-Ford over the 8-connected grid with ArcGIS's step cost: the mean
+    #of the two cells times the distance between their centres
+    nrows, ncols = cost.shape
+    dist = np.full(cost.size, np.inf)
+    dist[sources] = 0.0
+    changed = True
+    while changed:
+        changed = False
+        for r, c in np.ndindex(cost.shape):
+            if not np.isfinite(cost[r, c]):
+                continue
+            for dr, dc in NEIGHBOURS:
+                rr, cc = r + dr, c + dc
+                if not (0 <= rr < nrows and 0 <= cc < ncols) or not np.isfinite(cost[rr, cc]):
+                    continue
+                step = (cost[r, c] + cost[rr, cc]) / 2 * cell * (math.sqrt(2) if dr and dc else 1.0)
+                if dist[r * ncols + c] + step < dist[rr * ncols + cc] - 1e-12:
+                    dist[rr * ncols + cc] = dist[r * ncols + c] + step
+                    changed = True
+    return dist
+
+
+@pytest.mark.parametrize("seed", SEEDS)
+def test_dijkstra_matches_relaxation(seed):
+    rng = np.random.default_rng(seed)
+    cost = rng.uniform(0.1, 10, size=tuple(rng.integers(2, 10, size=2)))
+    cost[rng.random(cost.shape) < 0.15] = np.nan
+    valid = np.nonzero(np.isfinite(cost).ravel())[0]
+    if len(valid) == 0:
+        return
+    sources = rng.choice(valid, size=min(len(valid), int(rng.integers(1, 4))), replace=False)
+    graph = CostGraph.from_surface(cost, 25.0)
+    expected = _relaxed(cost, 25.0, sources)
+    for dist, _, _ in (graph.dijkstra(sources), _heap_dijkstra(graph.indptr, graph.indices, graph.weights, sources)):
+        np.testing.assert_allclose(dist, expected, rtol=1e-9)
+
+
+def _regions(rng, shape, n=4):
+    regions = np.zeros(shape, dtype=np.int32)
+    for region in range(1, n + 1):
+        r, c = rng.integers(0, shape[0] - 2), rng.integers(0, shape[1] - 2)
+        regions[r:r + 2, c:c + 2] = region
+    return regions
+
+
+@pytest.mark.parametrize("seed", range(5))
+def test_scenarios_match_a_graph_each(seed):
+    rng = np.random.default_rng(seed)
+    shape = (30, 40)
+    nodata = rng.random(shape) < 0.1
+    regions = _regions(rng, shape)
+    nodata &= regions == 0
+    surfaces = {}
+    for name in ("a", "b", "c"):
+        surfaces[name] = np.where(nodata, np.nan, rng.uniform(0.1, 10, shape))
+    #a different footprint has to get a graph of its own
+    surfaces["d"] = np.where(nodata | (rng.random(shape) < 0.05) & (regions == 0), np.nan, rng.uniform(0.1, 10, shape))
+    shared = scenario_connections(iter(surfaces.items()), regions, 25.0)
+    assert list(shared) == list(surfaces)
+    for name, cost in surfaces.items():
+        assert shared[name] == connect_regions(CostGraph.from_surface(cost, 25.0), regions)
+
+
+def _routes(path):
+    feats, _ = read_features(path + FEATURE_EXT)
+    return [(f["geometry"], f["properties"]) for f in feats]
+
+
+def _cost(rng, grid):
+    return rng.uniform(0.1, 10, grid.shape).astype(np.float32)
+
+
+def test_cached_graph_follows_rewritten_cost(gdb):
+    rng = np.random.default_rng(3)
+    path = lambda name: os.path.join(gdb, name)
+    grid, _ = read_grid(path("D_ab_dem"))
+    backend = get_backend("local")
+    write_raster(path("Cost"), _cost(rng, grid), grid)
+    backend.optimal_region_connections(path("W_Bear_Habita"), path("First"), path("Cost"))
+
+    #new values at the same path; the mtime is bumped in case the clock is coarse
+    write_raster(path("Cost"), _cost(rng, grid), grid)
+    stat = os.stat(path("Cost") + ".npy")
+    os.utime(path("Cost") + ".npy", ns=(stat.st_atime_ns, stat.st_mtime_ns + 10 ** 9))
+    backend.optimal_region_connections(path("W_Bear_Habita"), path("Cached"), path("Cost"))
+    get_backend("local").optimal_region_connections(path("W_Bear_Habita"), path("Fresh"), path("Cost"))
+    assert _routes(path("Cached")) == _routes(path("Fresh"))
+    assert _routes(path("Cached")) != _routes(path("First"))
+
+
+def test_scenario_routes_match_one_call_each(gdb):
+    rng = np.random.default_rng(5)
+    path = lambda name: os.path.join(gdb, name)
+    grid, _ = read_grid(path("D_ab_dem"))
+    backend = get_backend("local")
+    surfaces, outputs = {}, {}
+    for name in ("low", "high"):
+        surfaces[name] = path(f"Scenario_{name}")
+        outputs[name] = path(f"Paths_{name}")
+        write_raster(surfaces[name], _cost(rng, grid), grid)
+    backend.scenario_routes(path("W_Bear_Habita"), surfaces, outputs)
+    for name in surfaces:
+        get_backend("local").optimal_region_connections(path("W_Bear_Habita"), path("Single"), surfaces[name])
+        assert _routes(outputs[name]) == _routes(path("Single"))
+
+
+class FakeArcpy:
+    #arcpy.sa and friends as far as the pyramid goes: every call is logged
+    #with the cellSize environment it ran under
+    def __init__(self, cell):
+        self.calls = []
+        self.cell_size = 25
+        self.Raster = lambda path: types.SimpleNamespace(path=path, meanCellWidth=cell)
+        self.sa = types.SimpleNamespace(Aggregate=self._log("Aggregate"), ExtractByMask=self._log("ExtractByMask"),
+                                        OptimalRegionConnections=self._log("OptimalRegionConnections"))
+        self.analysis = types.SimpleNamespace(PairwiseBuffer=self._log("PairwiseBuffer"))
+        self.management = types.SimpleNamespace(Merge=self._log("Merge"))
+
+    def _log(self, tool):
+        def call(*args, **kwargs):
+            self.calls.append((tool, self.cell_size, args, kwargs))
+            return f"{tool}_{len(self.calls)}"
+        return call
+
+    @contextlib.contextmanager
+    def EnvManager(self, cellSize):
+        before, self.cell_size = self.cell_size, cellSize
+        try:
+            yield
+        finally:
+            self.cell_size = before
+
+
+def test_arcgis_pyramid_levels(monkeypatch):
+    fake = FakeArcpy(25.0)
+    monkeypatch.setitem(sys.modules, "arcpy", fake)
+    monkeypatch.delitem(sys.modules, "kananaskis.backends.arcgis", raising=False)
+    from kananaskis.backends.arcgis import ArcGISBackend
+    ArcGISBackend.__new__(ArcGISBackend).optimal_region_connections("Regions", "Out", "Cost", pyramid=(4, 16))
+    tools = [(tool, cell) for tool, cell, _, _ in fake.calls]
+    assert tools == [("Aggregate", 400), ("OptimalRegionConnections", 400),
+                     ("Aggregate", 100), ("PairwiseBuffer", 100), ("Merge", 100), ("ExtractByMask", 100),
+                     ("OptimalRegionConnections", 100),
+                     ("PairwiseBuffer", 25), ("Merge", 25), ("ExtractByMask", 25), ("OptimalRegionConnections", 25)]
+    assert fake.cell_size == 25
+    routes = [(args, kwargs) for tool, _, args, kwargs in fake.calls if tool == "OptimalRegionConnections"]
+    #the coarse levels hand their neighbour paths (not barriers) down
+    assert [kwargs.get("out_neighbor_paths") for _, kwargs in routes] == [r"memory\Neighbours_16",
+                                                                           r"memory\Neighbours_4", None]
+    assert all(len(args) == 2 for args, _ in routes) and routes[-1][0] == ("Regions", "Out")
+    buffers = [args for tool, _, args, _ in fake.calls if tool == "PairwiseBuffer"]
+    assert buffers == [(r"memory\Neighbours_16", r"memory\Corridor_4", "1200.0 Meters"),
+                       (r"memory\Neighbours_4", r"memory\Corridor_1", "300.0 Meters")]
+
+
+def test_local_pyramid_connects_the_same_regions(gdb):
+    rng = np.random.default_rng(7)
+    path = lambda name: os.path.join(gdb, name)
+    grid, _ = read_grid(path("D_ab_dem"))
+    write_raster(path("Cost"), _cost(rng, grid), grid)
+    backend = get_backend("local")
+    backend.optimal_region_connections(path("W_Bear_Habita"), path("Full"), path("Cost"))
+    backend.optimal_region_connections(path("W_Bear_Habita"), path("Pyramid"), path("Cost"), pyramid=(4,))
+    full, pyramid = _routes(path("Full")), _routes(path("Pyramid"))
+    #the corridors keep the full-resolution answer within reach
+    pairs = lambda routes: sorted((props["REGION_A"], props["REGION_B"]) for _, props in routes)
+    total = lambda routes: sum(props["PATH_COST"] for _, props in routes)
+    assert pairs(pyramid) == pairs(full) and full
+    assert total(pyramid) == pytest.approx(total(full))
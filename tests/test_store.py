@@ -0,0 +1,115 @@
+#-------------------------------------------------------------------------------
+# Name:        test_store
+# Purpose:     the local raster layout (grid.py, store.py): packed rasters
+#              come back bit for bit, whole or by window; overviews against a
+#              plain per-block reduction; and renames / moves carry every file
+#              of a raster along.
+#-------------------------------------------------------------------------------
+import os
+
+import numpy as np
+import pytest
+
+from kananaskis.grid import (Grid, build_overviews, pack_raster, read_meta, read_overview, read_raster, read_window,
+                             unpack_raster, write_raster)
+from kananaskis.store import RasterStore
+
+GRID = Grid(xmin=500000.0, ymax=5650000.0, cell=25.0, nrows=53, ncols=71, epsg=26911)
+
+
+def _random(rng, dtype):
+    if np.dtype(dtype).kind == "f":
+        values = rng.normal(1800, 50, GRID.shape).astype(dtype)
+        values[rng.random(GRID.shape) < 0.1] = np.nan
+        return values, float("nan")
+    return rng.integers(0, 9, GRID.shape).astype(dtype), -1
+
+
+@pytest.mark.parametrize("dtype", [np.float32, np.float64, np.int32, np.uint8])
+@pytest.mark.parametrize("tile", [16, 64, 256])
+def test_pack_round_trip(tmp_path, dtype, tile):
+    rng = np.random.default_rng(1)
+    values, nodata = _random(rng, dtype)
+    path = str(tmp_path / "raster")
+    write_raster(path, values, GRID, nodata)
+    pack_raster(path, tile)
+    assert not os.path.exists(path + ".npy")
+    #windows straddling tile edges, decompressed from the packed tiles only
+    for r0, r1, c0, c1 in [(0, 53, 0, 71), (3, 20, 5, 66), (15, 17, 14, 18), (52, 53, 70, 71)]:
+        window = read_window(path, r0, r1, c0, c1)
+        assert window.dtype == values.dtype
+        np.testing.assert_array_equal(window, values[r0:r1, c0:c1])
+    assert read_meta(path).get("packed")
+    #a full read unpacks it for good
+    data, grid, _ = read_raster(path)
+    assert grid == GRID and "packed" not in read_meta(path)
+    np.testing.assert_array_equal(data, values)
+    assert not os.path.exists(path + ".tiles")
+    pack_raster(path, tile)
+    assert "packed" not in unpack_raster(path)
+    np.testing.assert_array_equal(np.load(path + ".npy"), values)
+
+
+def _expected_overview(values, factor):
+    nrows, ncols = -(-GRID.nrows // factor), -(-GRID.ncols // factor)
+    out = np.empty((nrows, ncols), dtype=values.dtype)
+    for r, c in np.ndindex(nrows, ncols):
+        block = values[r * factor:(r + 1) * factor, c * factor:(c + 1) * factor]
+        if values.dtype.kind == "f":
+            valid = block[~np.isnan(block)]
+            out[r, c] = valid.mean() if len(valid) else np.nan
+        else:
+            out[r, c] = block[min(factor // 2, block.shape[0] - 1), min(factor // 2, block.shape[1] - 1)]
+    return out
+
+
+@pytest.mark.parametrize("dtype", [np.float32, np.int32])
+@pytest.mark.parametrize("rows_per_block", [4, 1024])
+def test_overviews(tmp_path, dtype, rows_per_block):
+    rng = np.random.default_rng(2)
+    values, nodata = _random(rng, dtype)
+    path = str(tmp_path / "raster")
+    write_raster(path, values, GRID, nodata)
+    assert build_overviews(path, (4, 16), rows_per_block) == [4, 16]
+    for factor in (4, 16):
+        overview, grid, _ = read_overview(path, factor)
+        assert grid.cell == GRID.cell * factor and grid.shape == overview.shape
+        np.testing.assert_allclose(overview, _expected_overview(values, factor), rtol=1e-6)
+    with pytest.raises(ValueError):
+        read_overview(path, 2)
+    #rewriting the raster drops the overviews of the old cells
+    write_raster(path, values, GRID, nodata)
+    assert not os.path.exists(path + ".ovr4.npy")
+    with pytest.raises(ValueError):
+        read_overview(path, 4)
+
+
+def test_move_carries_every_file(tmp_path):
+    rng = np.random.default_rng(3)
+    values, nodata = _random(rng, np.float32)
+    one, two = RasterStore(str(tmp_path / "one")), RasterStore(str(tmp_path / "two"))
+    one.put("Cost", values, GRID, nodata)
+    one.build_overviews("Cost", (4,))
+    one.put("Other", values, GRID, nodata)
+    one.pack("Other")
+    assert one.names() == ["Cost", "Other"]
+
+    one.rename("Cost", "Renamed")
+    assert one.names() == ["Other", "Renamed"]
+    assert sorted(os.listdir(one.root)) == ["Other.json", "Other.tiles", "Renamed.json", "Renamed.npy",
+                                            "Renamed.ovr4.npy"]
+    one.move("Renamed", two)
+    one.move("Other", two, "Packed")
+    assert one.names() == [] and os.listdir(one.root) == []
+    assert two.names() == ["Packed", "Renamed"]
+    np.testing.assert_array_equal(two.open("Renamed")[0], values)
+    np.testing.assert_array_equal(two.view("Packed", 0, 10, 0, 10), values[:10, :10])
+    assert two.overview("Renamed", 4)[0].shape == (14, 18)
+    #a move onto an existing name replaces it whole, overviews included
+    two.put("Target", values[::-1], GRID, nodata)
+    two.build_overviews("Target", (4, 16))
+    two.move("Renamed", two, "Target")
+    assert not os.path.exists(two.path("Target") + ".ovr16.npy")
+    np.testing.assert_array_equal(two.open("Target")[0], values)
+    with pytest.raises(FileNotFoundError):
+        one.move("Missing", two)
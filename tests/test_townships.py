@@ -0,0 +1,52 @@
+#-------------------------------------------------------------------------------
+# Name:        test_townships
+# Purpose:     the STR-tree against a scan of every box on tiny random inputs,
+#              and the NTS / township overlay it drives against testing every
+#              sheet with every township.
+#-------------------------------------------------------------------------------
+import os
+
+import numpy as np
+import pytest
+
+from kananaskis import geometry
+from kananaskis.backends import get_backend
+from kananaskis.strtree import STRtree
+from kananaskis.townships import nts_township_pairs
+
+SEEDS = range(20)
+
+
+def _random_boxes(rng, n):
+    lo = rng.uniform(0, 100, size=(n, 2))
+    size = rng.uniform(0, 15, size=(n, 2))
+    #some degenerate boxes (points and lines) as well
+    size[rng.random(n) < 0.1] = 0
+    return np.column_stack([lo, lo + size])
+
+
+@pytest.mark.parametrize("seed", SEEDS)
+def test_strtree_matches_brute_force(seed):
+    rng = np.random.default_rng(seed)
+    boxes = _random_boxes(rng, int(rng.integers(0, 200)))
+    tree = STRtree(boxes, capacity=int(rng.choice([2, 4, 16])))
+    #queries include the indexed boxes themselves, so edges that only touch count
+    queries = np.vstack([_random_boxes(rng, 50), boxes[:10]])
+    for box in queries:
+        x0, y0, x1, y1 = box
+        expected = np.nonzero((boxes[:, 0] <= x1) & (boxes[:, 2] >= x0) & (boxes[:, 1] <= y1)
+                              & (boxes[:, 3] >= y0))[0]
+        np.testing.assert_array_equal(tree.query(box), expected)
+
+
+def test_overlay_matches_every_pair(study_area):
+    backend = get_backend("local")
+    nts = os.path.join(study_area.gdb, "N_NTS50")
+    townships = os.path.join(study_area.gdb, "A_AB_Township")
+    sheets = list(backend.read_rows(nts, ["NAME", "SHAPE@"]))
+    rows = list(backend.read_rows(townships, ["TWP", "RGE", "M", "SHAPE@"]))
+    expected = sorted((name,) + tuple(row[:-1]) for name, shape in sheets for row in rows
+                      if shape and row[-1] and geometry.intersects(shape, row[-1]))
+    pairs = nts_township_pairs(backend, nts, townships)
+    assert pairs == expected
+    assert pairs
@@ -0,0 +1,93 @@
+#-------------------------------------------------------------------------------
+# Name:        test_zonal
+# Purpose:     the streamed zonal pass against numpy on the whole array: the
+#              per-zone mean and std merged tile by tile (Chan et al.) have to
+#              hold their digits on elevation-sized values, and the class
+#              counts and min/max have to add up the same in any tiling.
+#-------------------------------------------------------------------------------
+import numpy as np
+import pytest
+
+from kananaskis.grid import Grid, write_raster
+from kananaskis.rasterize import rasterize
+from kananaskis.zonal import ZonalAccumulator, zonal_summary
+
+
+def _expected(zones, values, nzones):
+    #{zone: (count, min, max, mean, std, sum)} straight from numpy
+    out = {}
+    for zone in range(1, nzones + 1):
+        v = values[(zones == zone) & ~np.isnan(values)]
+        if len(v):
+            out[zone] = (len(v), v.min(), v.max(), v.mean(), v.std(), v.sum())
+    return out
+
+
+def _check(table, expected):
+    assert list(table["ZONE"]) == list(expected)
+    for row in table:
+        count, low, high, mean, std, total = expected[int(row["ZONE"])]
+        assert row["COUNT"] == count
+        assert row["AREA"] == count * 625.0
+        assert row["MIN"] == low and row["MAX"] == high and row["RANGE"] == high - low
+        np.testing.assert_allclose(row["MEAN"], mean, rtol=1e-12)
+        np.testing.assert_allclose(row["STD"], std, rtol=1e-7, atol=1e-9)
+        np.testing.assert_allclose(row["SUM"], total, rtol=1e-12)
+
+
+@pytest.mark.parametrize("seed", range(10))
+def test_chunked_stats_match_numpy(seed):
+    rng = np.random.default_rng(seed)
+    nzones = int(rng.integers(1, 8))
+    zones = rng.integers(0, nzones + 1, size=5000)
+    #elevations around 2500 m that vary by centimetres: E[x^2] - mean^2 would
+    #leave nothing of the variance here
+    values = 2500.0 + rng.normal(0, 0.01, size=zones.size)
+    values[rng.random(zones.size) < 0.05] = np.nan
+    acc = ZonalAccumulator(nzones)
+    cuts = np.sort(rng.integers(0, zones.size, size=int(rng.integers(0, 12))))
+    for z, v in zip(np.split(zones, cuts), np.split(values, cuts)):
+        acc.add_values(z, v)
+    _check(acc.stats_table("ZONE", np.arange(1, nzones + 1), 625.0), _expected(zones, values, nzones))
+
+
+def test_class_counts_match_numpy():
+    rng = np.random.default_rng(4)
+    zones = rng.integers(0, 4, size=3000)
+    classes = rng.integers(1, 6, size=zones.size).astype(np.float64)
+    classes[rng.random(zones.size) < 0.1] = np.nan
+    acc = ZonalAccumulator(3)
+    for z, c in zip(np.array_split(zones, 7), np.array_split(classes, 7)):
+        acc.add_classes(z, c)
+    table = acc.area_table("ZONE", [1, 2, 3], 625.0)
+    for value in range(1, 6):
+        expected = [((zones == zone) & (classes == value)).sum() * 625.0 for zone in (1, 2, 3)]
+        np.testing.assert_array_equal(table[f"VALUE_{value}"], expected)
+    totals = acc.class_totals(625.0)
+    assert totals == {v: float(((zones > 0) & (classes == v)).sum() * 625.0) for v in range(1, 6)}
+
+
+@pytest.mark.parametrize("tile", [7, 32, 1024])
+def test_zonal_summary_any_tiling(tmp_path, tile):
+    rng = np.random.default_rng(9)
+    grid = Grid(xmin=500000.0, ymax=5650000.0, cell=25.0, nrows=45, ncols=61, epsg=26911)
+    boxes = [(500100.0, 5649000.0, 500900.0, 5649900.0), (500600.0, 5648900.0, 501500.0, 5649500.0),
+             (500000.0, 5648875.0, 500400.0, 5649300.0)]
+    zones = [(zone, {"type": "Polygon", "coordinates": [[(x0, y0), (x1, y0), (x1, y1), (x0, y1), (x0, y0)]]})
+             for zone, (x0, y0, x1, y1) in zip((11, 12, 13), boxes)]
+    dem = (1800.0 + rng.normal(0, 40, grid.shape)).astype(np.float64)
+    dem[rng.random(grid.shape) < 0.05] = np.nan
+    write_raster(str(tmp_path / "dem"), dem, grid, float("nan"))
+    landcover = rng.integers(1, 4, grid.shape).astype(np.int32)
+    write_raster(str(tmp_path / "landcover"), landcover, grid, -1)
+
+    zone_ids, acc = zonal_summary(zones, grid, str(tmp_path / "dem"), str(tmp_path / "landcover"), tile)
+    assert zone_ids == [11, 12, 13]
+    labels = rasterize([(geom, i) for i, (_, geom) in enumerate(zones, start=1)], grid, np.int32, 0)
+    expected = _expected(labels, dem, 3)
+    table = acc.stats_table("ZONE", zone_ids, 625.0)
+    _check(table, {zone_ids[i - 1]: stats for i, stats in expected.items()})
+    areas = acc.area_table("ZONE", zone_ids, 625.0)
+    for value in (1, 2, 3):
+        np.testing.assert_array_equal(areas[f"VALUE_{value}"],
+                                      [((labels == i) & (landcover == value)).sum() * 625.0 for i in (1, 2, 3)])